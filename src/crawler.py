@@ -9,18 +9,22 @@ containing privacy policies and a txt file containing an audit trail
 of links visited and decisions about those policies.
 """
 
-import argparse, datetime, json, matplotlib, os, pandas as pd, re, signal, sys
+import argparse, datetime, importlib, json, matplotlib, os, pandas as pd, re, signal, sys, threading, time
 from bs4 import BeautifulSoup
-from multiprocessing import Pool, Value, cpu_count, current_process, Manager
+from multiprocessing import Pool, Process, Queue, Value, cpu_count, current_process, Manager
 from sklearn.feature_extraction.text import TfidfVectorizer
 from sklearn.metrics.pairwise import cosine_similarity
 from utils.utils import print_progress_bar, request, get_driver, VerifyJsonExtension
-from verification.verify import get_ground_truth, is_duplicate_policy, is_english, mkdir_clean, strip_text
+from verification.batch import BatchScorer
+from verification.cascade import VerificationCascade
+from verification.client import ScoringClient
+from verification.progressive import ProgressiveScorer
+from verification.verify import get_ground_truth, is_duplicate_policy, is_english, mkdir_clean, set_strip_cache, strip_text
 
 PRIVACY_POLICY_KEYWORDS = ["privacy"]
 
 class DomainLink():
-    def __init__(self, link, sim_score, html_outfile, stripped_outfile, access_success, valid, duplicate):
+    def __init__(self, link, sim_score, html_outfile, stripped_outfile, access_success, valid, duplicate, class_scores=None):
         self.link = link
         self.sim_score = sim_score
         self.html_outfile = html_outfile
@@ -28,6 +32,7 @@ class DomainLink():
         self.access_success = access_success
         self.valid = valid
         self.duplicate = duplicate
+        self.class_scores = class_scores or {}
 
 class CrawlReturn():
     def __init__(self, domain, access_success):
@@ -35,8 +40,8 @@ class CrawlReturn():
         self.sim_avg = 0.0
         self.link_list = []
         self.access_success = access_success
-    def add_link(self, link, sim_score, html_outfile, stripped_outfile, access_success, valid, duplicate):
-        link = DomainLink(link, sim_score, html_outfile, stripped_outfile, access_success, valid, duplicate)
+    def add_link(self, link, sim_score, html_outfile, stripped_outfile, access_success, valid, duplicate, class_scores=None):
+        link = DomainLink(link, sim_score, html_outfile, stripped_outfile, access_success, valid, duplicate, class_scores)
         self.link_list.append(link)
         self.sim_avg = self.sim_avg + ((sim_score-self.sim_avg)/len(self.link_list))
 
@@ -74,6 +79,67 @@ def verify(html_contents, ground_truth):
     # return sim_score[0,1] >= cos_sim_threshold
     return sim_score[0,1]
 
+def score_link(link_contents):
+    """
+    Score a page through the verification server if the crawler was
+    started with --score_socket, otherwise locally with verify(), or
+    with a ProgressiveScorer (--progressive), which may stop reading
+    huge pages early and then returns the score of the prefix it read.
+
+    In:     stripped text of the page.
+    Out:    cosine similarity score of ground truth and policy document
+    """
+    if scoring_client is not None:
+        return scoring_client.score([link_contents])[0]
+    if progressive_scorer is not None:
+        if not is_english(dictionary, link_contents):
+            return 0
+        return progressive_scorer.score(link_contents).score
+    if class_scorer is not None:
+        if not is_english(dictionary, link_contents):
+            return 0
+        return score_classes(link_contents)["policy"]
+    return verify(link_contents, ground_truth)
+
+def score_classes(link_contents):
+    """
+    Score a page against the ground truth and every --reference corpus
+    with one vectorization.  The result is remembered so that crawl can
+    report the class scores of the page score_link just scored.
+
+    In:     stripped text of the page.
+    Out:    dict of label -> cosine similarity ("policy" is the ground
+            truth).
+    """
+    global last_class_scores
+    row = class_scorer.score_matrix([link_contents])[0]
+    last_class_scores = (link_contents, dict(zip(class_scorer.labels, map(float, row))))
+    return last_class_scores[1]
+
+def reference_scores(link_contents):
+    """
+    In:     stripped text of the page.
+    Out:    dict of --reference label -> cosine similarity if the page
+            went through full scoring, empty if it didn't (e.g. the
+            cascade or the english check rejected it first) or no
+            references were given.
+    """
+    if last_class_scores[0] is not link_contents:
+        return {}
+    return {label: score for label, score in last_class_scores[1].items() if label != "policy"}
+
+def is_duplicate(link_contents, domain):
+    """
+    Duplicate check through the verification server if one is in use,
+    otherwise against the crawler's shared policy_dict.
+
+    In:     stripped text of the page, domain it was found on.
+    Out:    boolean, True if this policy text was already seen.
+    """
+    if scoring_client is not None:
+        return scoring_client.is_duplicate([link_contents], [domain])[0]
+    return is_duplicate_policy(link_contents, domain, policy_dict)
+
 def clean_link(link):
     """
     Many links will direct you to a specific subheading of the page, or
@@ -181,6 +247,7 @@ def crawl(domain):
     output_count = 0
     for link in links:
         # link_html = request(link, driver)
+        fetched = time.time()
         link_html = request(link)
         link_contents = strip_text(link_html)
         # link_dict[link] = domain
@@ -201,31 +268,38 @@ def crawl(domain):
                     links.append(l)
         
         # get similarity score, check against the score threshold to see if policy
-        sim_score = verify(link_contents, ground_truth)
+        sim_score = cascade.run(link_contents) if cascade is not None else score_link(link_contents)
         is_policy = sim_score >= cos_sim_threshold
+        class_scores = reference_scores(link_contents)
 
         # if this page is a policy, check duplicate then write out to file
         if is_policy:
-            if is_duplicate_policy(link_contents, domain, policy_dict):
-                retobj.add_link(link, 0.0, "N/A", "N/A", True, True, True)
+            if is_duplicate(link_contents, domain):
+                retobj.add_link(link, 0.0, "N/A", "N/A", True, True, True, class_scores)
                 continue    # we've already seen this policy, skip
             domain_successful_links.append(link)
             output_count += 1
-            html_outfile = html_outfolder + domain[:-4] + "_" + str(output_count) + ".html"
-            with open(html_outfile, "a") as fp:
-                fp.write(link_html)
-            stripped_outfile = stripped_outfolder + domain[:-4] + "_" + str(output_count) + ".txt"
-            with open(stripped_outfile, "a") as fp:
-                fp.write(link_contents)
-            retobj.add_link(link, sim_score, html_outfile, stripped_outfile, True, True, False)
+            html_outfile = "N/A"
+            stripped_outfile = "N/A"
+            if write_intermediates:
+                html_outfile = html_outfolder + domain[:-4] + "_" + str(output_count) + ".html"
+                with open(html_outfile, "a") as fp:
+                    fp.write(link_html)
+                stripped_outfile = stripped_outfolder + domain[:-4] + "_" + str(output_count) + ".txt"
+                with open(stripped_outfile, "a") as fp:
+                    fp.write(link_contents)
+            if policy_queue is not None:
+                # blocks while the parse workers are queue_size policies behind
+                policy_queue.put((domain[:-4] + "_" + str(output_count) + ".html", link_html, link_contents, fetched))
+            retobj.add_link(link, sim_score, html_outfile, stripped_outfile, True, True, False, class_scores)
         
         # this isn't a policy, so just add it to the stats and continue
         else:
-            if is_duplicate_policy(link_contents, domain, policy_dict):
-                retobj.add_link(link, 0.0, "N/A", "N/A", True, False, True)
+            if is_duplicate(link_contents, domain):
+                retobj.add_link(link, 0.0, "N/A", "N/A", True, False, True, class_scores)
                 continue    # we've already seen this policy, skip
             domain_failed_links.append(link)
-            retobj.add_link(link, sim_score, "N/A", "N/A", True, False, False)
+            retobj.add_link(link, sim_score, "N/A", "N/A", True, False, False, class_scores)
     
     # check whether at least one link in the domain was successful
     successful_links.extend(domain_successful_links)
@@ -278,16 +352,77 @@ def produce_summary(all_links):
                     summary_string += ("=> (DUPLICATE) " + link.link + " -> ")
                 else:
                     summary_string += ("=> (" + sim_score + ") " + link.link + " -> ")
-                summary_string += (link.html_outfile + " & " + link.stripped_outfile + "\n")
+                summary_string += (link.html_outfile + " & " + link.stripped_outfile)
+                if link.class_scores:
+                    summary_string += " [" + ", ".join(label + " = " + str(round(score, 2)) for label, score in link.class_scores.items()) + "]"
+                summary_string += "\n"
             summary_string += "\n"
     return summary_string
 
-def start_process(i):
+def parse_worker(policy_queue, result_queue):
+    """
+    Pipeline mode: parse and tokenize accepted policies straight from
+    the crawl workers, in memory, until a None sentinel arrives.  The
+    latency reported for each policy runs from the start of its fetch
+    to its sentence output.
+
+    In:     bounded queue of (policy filename, html, stripped text,
+            fetch start time), queue of results.
+    Out:    (policy filename, PolicyResult or None, latency in seconds)
+            tuples on result_queue, then None.  The result is None if
+            the policy couldn't be read or parsing raised.
+    """
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    try:
+        while True:
+            item = policy_queue.get()
+            if item is None:
+                break
+            fname, html_contents, stripped_text, fetched = item
+            try:
+                result = parser_tokenizer.parse_policy(fname, html_contents, stripped_text)
+            except Exception as e:     # one bad policy must not take the worker (and its sentinel) down
+                print("Pipeline: failed to parse " + fname + ": " + type(e).__name__ + ": " + str(e))
+                result = None
+            result_queue.put((fname, result, time.time() - fetched))
+    finally:
+        result_queue.put(None)     # collect_results waits for one from every worker
+
+def collect_results(result_queue, num_workers, outfile):
+    """
+    Pipeline mode: gather the parse workers' results as they finish and
+    log each policy's end-to-end latency.  Runs on a thread of the main
+    process, so nothing piles up in result_queue while the crawl is
+    still going.
+
+    In:     queue of results, number of parse workers, csv file for the
+            per-policy latencies.
+    Out:    N/A (results are appended to pipeline_results, and their
+            status lines written by pipeline_status).
+    """
+    finished = 0
+    with open(outfile, "w") as fp:
+        fp.write("policy,success,latency_sec\n")
+        while finished < num_workers:
+            item = result_queue.get()
+            if item is None:
+                finished += 1
+                continue
+            fname, result, latency = item
+            pipeline_results.append((result, latency))
+            if result is not None:
+                pipeline_status.add(result)
+            fp.write(fname[:-5] + "," + str(result is not None and result.success) + "," + str(round(latency, 3)) + "\n")
+            fp.flush()
+
+def start_process(i, queue=None):
     """
     Set inter-process shared values to global so they can be accessed.
     Ignore SIGINT in child workers, will be handled to enable restart.
     """
     signal.signal(signal.SIGINT, signal.SIG_IGN)
+    global policy_queue
+    policy_queue = queue
     # global index
     # index = i
     # global driver
@@ -317,7 +452,70 @@ if __name__ == '__main__':
                             help="directory to dump HTML output of crawler.")
     argparse.add_argument(  "stripped_outfolder",
                             help="directory to dump stripped text output of crawler.")
+    argparse.add_argument(  "--strip_cache",
+                            default=None,
+                            required=False,
+                            help="sqlite file caching stripped text between runs.  Created if it does not exist.")
+    argparse.add_argument(  "--strip_cache_size",
+                            type=int,
+                            default=20000,
+                            required=False,
+                            help="maximum number of documents kept in the stripped text cache.")
+    argparse.add_argument(  "--score_socket",
+                            default=None,
+                            required=False,
+                            help="Unix socket of a running verification server (python -m verification.server) to score and dedup pages with instead of building the ground truth here.")
+    argparse.add_argument(  "--cascade",
+                            action="store_true",
+                            help="reject pages with cheap length/keyword/sampled-language checks before full scoring, and report per-stage statistics.")
+    argparse.add_argument(  "--min_length",
+                            type=int,
+                            default=250,
+                            required=False,
+                            help="cascade: minimum number of characters of stripped text.")
+    argparse.add_argument(  "--min_keyword_density",
+                            type=float,
+                            default=5.0,
+                            required=False,
+                            help="cascade: minimum privacy keyword hits per 1000 words.")
+    argparse.add_argument(  "--language_sample",
+                            type=int,
+                            default=200,
+                            required=False,
+                            help="cascade: number of words sampled for the cheap english check.")
+    argparse.add_argument(  "--progressive",
+                            action="store_true",
+                            help="score pages a chunk at a time and stop once the score is confidently above or below cos_sim_threshold.")
+    argparse.add_argument(  "--reference",
+                            action="append",
+                            default=[],
+                            required=False,
+                            metavar="NAME=DIR",
+                            help="extra reference corpus (a directory of html files like ground_truth_html) to score every page against, e.g. cookie=data/inputs/cookie_html/.  May be repeated.")
+    argparse.add_argument(  "--pipeline",
+                            nargs=3,
+                            default=None,
+                            required=False,
+                            metavar=("RULES", "PARSER_OUTPUT", "TOKENIZER_OUTPUT"),
+                            help="parse and tokenize accepted policies as soon as they are crawled, as parser-tokenizer.py would with these arguments, passing them through bounded queues instead of re-reading files.")
+    argparse.add_argument(  "--parse_workers",
+                            type=int,
+                            default=cpu_count(),
+                            required=False,
+                            help="pipeline: number of parse-tokenize processes.")
+    argparse.add_argument(  "--queue_size",
+                            type=int,
+                            default=None,
+                            required=False,
+                            help="pipeline: maximum number of crawled policies waiting to be parsed before crawl workers block (default: 2 per parse worker).")
+    argparse.add_argument(  "--no_intermediates",
+                            action="store_true",
+                            help="pipeline: don't write html and stripped text files for accepted policies.")
     args = argparse.parse_args()
+    if args.score_socket and (args.reference or args.progressive):
+        argparse.error("--reference and --progressive score locally and can't be combined with --score_socket")
+    if args.reference and args.progressive:
+        argparse.error("--reference needs every page fully scored and can't be combined with --progressive")
     domain_list_file = args.domain_list_file
     ground_truth_html_dir = args.ground_truth_html_dir
     dictionary = args.dictionary
@@ -326,17 +524,34 @@ if __name__ == '__main__':
     # output_folder = args.output_folder
     html_outfolder = args.html_outfolder
     stripped_outfolder = args.stripped_outfolder
+    write_intermediates = not (args.pipeline and args.no_intermediates)
     mkdir_clean(html_outfolder)
     mkdir_clean(stripped_outfolder)
     summary_outfile = args.html_outfolder + "../summary.txt"
     sys.setrecursionlimit(10**6)
+    strip_cache = set_strip_cache(args.strip_cache, args.strip_cache_size) if args.strip_cache else None
 
     # get domain list and verification ground truth
     with open(domain_list_file, "r") as fp:
         domain_list = list(json.load(fp).values())
     if args.num_domains != -1:
         domain_list = domain_list[:args.num_domains]
-    ground_truth = get_ground_truth(ground_truth_html_dir)
+    scoring_client = ScoringClient(args.score_socket) if args.score_socket else None
+    ground_truth = None if scoring_client is not None else get_ground_truth(ground_truth_html_dir)
+    class_scorer = None
+    last_class_scores = (None, {})
+    if args.reference:
+        references = {}
+        for reference in args.reference:
+            name, reference_dir = reference.split("=", 1)
+            references[name] = get_ground_truth(reference_dir)
+        class_scorer = BatchScorer(ground_truth, references=references)
+    progressive_scorer = None
+    if args.progressive:
+        progressive_scorer = ProgressiveScorer(BatchScorer(ground_truth), cos_sim_threshold)
+    cascade = None
+    if args.cascade:
+        cascade = VerificationCascade(dictionary, score_link, args.min_length, args.min_keyword_density, args.language_sample)
 
     # set up shared resources for subprocesses
     index = Value("i",0)        # shared val, index of current crawled domain
@@ -351,18 +566,64 @@ if __name__ == '__main__':
     link_dict = shared_manager.dict()              # hashmap of all links to detect duplicates without visiting them
     # driver = start_selenium()
 
+    # pipeline mode: parse workers fed by a bounded queue, so memory stays
+    # bounded however far ahead of them the crawl gets
+    policy_queue = None
+    if args.pipeline:
+        parser_tokenizer = importlib.import_module("parser-tokenizer")
+        rules, parser_output_folder, tokenizer_output_folder = args.pipeline
+        mkdir_clean(parser_output_folder)
+        mkdir_clean(tokenizer_output_folder)
+        parser_tokenizer.configure(rules, parser_output_folder, tokenizer_output_folder)
+        policy_queue = Queue(args.queue_size or args.parse_workers * 2)
+        result_queue = Queue()
+        pipeline_results = []
+        pipeline_status = parser_tokenizer.StatusWriter(parser_output_folder)
+        parse_workers = [Process(target=parse_worker, args=(policy_queue, result_queue), daemon=True) for i in range(args.parse_workers)]
+        for worker in parse_workers:
+            worker.start()
+        collector = threading.Thread(target=collect_results,
+                                     args=(result_queue, args.parse_workers, parser_output_folder + "pipeline_latency.csv"),
+                                     daemon=True)    # neither may keep a failed crawl from exiting
+        collector.start()
+
     # start process pool
     pool_size = cpu_count() * 2
     matplotlib.use("agg")   # don't know why this works, but allows matplotlib to execute in child procs
     pool = Pool(
         processes=pool_size,
         initializer=start_process,
-        initargs=[index]
+        initargs=[index, policy_queue]
     )
     all_links = pool.map(crawl, domain_list)    # map keeps domain_list order
     pool.close()  # no more tasks
     pool.join()   # merge all child processes
+    if args.pipeline:
+        for worker in parse_workers:
+            policy_queue.put(None)
+        collector.join()
+        for worker in parse_workers:
+            worker.join()
+        pipeline_status.flush()
+        results = [result for result, latency in pipeline_results if result is not None]
+        num_successful_policies = sum(1 for result, latency in pipeline_results if result is not None and result.success)
+        parser_tokenizer.finish_run(results, num_successful_policies, args.parse_workers)
+        latencies = [latency for result, latency in pipeline_results]
+        print("Pipeline: parsed " + str(num_successful_policies) + " of " + str(len(pipeline_results)) + " policies successfully.")
+        if latencies:
+            latencies.sort()
+            print("Pipeline: fetch to sentence output latency " + str(round(latencies[len(latencies) // 2], 2)) +
+                  " sec median, " + str(round(max(latencies), 2)) + " sec max (per policy in " +
+                  parser_output_folder + "pipeline_latency.csv).")
     # driver.close()  # close headless selenium browser
+    if strip_cache is not None:
+        print("Stripped text cache: " + strip_cache.stats())
+    if cascade is not None:
+        print(cascade.report())
+    if scoring_client is not None:
+        server_stats = scoring_client.stats()
+        print("Verification server: " + str(server_stats["requests"]) + " requests, " +
+              str(round(server_stats["latency_avg_ms"], 2)) + " ms average latency.")
 
     # produce summary output files
     print("Generating summary information...")
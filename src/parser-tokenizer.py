@@ -6,28 +6,47 @@ lists (<ul> and <ol>), and links (<a>), and dumps each into separate files.
 Preserves document structure and traceability in sentence outputs.
 """
 
-from bs4 import BeautifulSoup, Comment, NavigableString
-import argparse, csv, datetime, matplotlib, matplotlib.pyplot as plt, nltk, os, re, signal, sys, time
-from multiprocessing import Pool, Lock, Value, cpu_count
+from array import array
+from bs4 import BeautifulSoup, Comment, FeatureNotFound, NavigableString, Tag
+from lxml import etree
+import argparse, bisect, collections, csv, datetime, itertools, json, matplotlib, matplotlib.pyplot as plt, mmap, nltk, os, re, shutil, signal, sys, time
+import numpy as np
+from multiprocessing import Pool, Value, cpu_count, set_start_method
 from nltk.tokenize import sent_tokenize
+from utils.broadcast import Broadcast, attach
+from utils.cache import digest, file_digest
+from utils.memory import current_rss, peak_rss, reset_peak_rss
+from utils.scheduler import Scheduler, file_sizes
+from utils.store import OutputStore
 from utils.utils import mkdir_clean, print_progress_bar, VerifyJsonExtension
-from verification.verify import remove_bad_tags
-from statistics.sentences import apply_sentence_rules, build_rule_dict, generate_rule_bar_fig, generate_rule_hist_figs
+from verification.verify import BAD_TAGS, remove_bad_tags
+from statistics.figures import render_rule_bars
+from statistics.memo import SentenceMemo
+from statistics.segmenters import get_segmenter, SEGMENTERS
+from statistics.rules import RuleEngine
+from statistics.sentences import build_rule_dict, generate_rule_hist_figs
+
+PARSER_VERSION = 2  # bump whenever a change to parsing or tokenizing changes the outputs, so incremental runs redo everything
+memo = None         # optional SentenceMemo shared by every worker, see --memo
+OUTPUTS = ["sequential", "paragraphs", "headers", "lists", "compare", "sentences", "rule_bar", "rule_hists", "status"]
+TAG_HEADINGS = ("Sequential Index","Tag Index","Preceeded By","Proceeded By","Tag Text")
+SENTENCE_HEADINGS = ("Sequential Index","Tag Type-Index", "Tag Preceeded By", "Tag Proceeded By", "Sentence Index in Tag", "Sentence Text", "Number of Words in Sentence", "Rule Hits")
 
 class SequentialElement:
     """
     Class for elements of the sequential list to retain traceability.
+    The original one-object-per-element representation, kept as the
+    reference for --benchmark.
     """
     def __init__(self, content_string, tag_type, tag_index):
         self.content_string = content_string
         self.tag_type = tag_type
         self.tag_index = tag_index
 
-class ParserData:
+class ReferenceParserData:
     """
-    Class for data used during the parsing of a single policy.  This
-    data structure is initialized to be empty at start of every
-    parsing process.
+    The original ParserData, whose sequential list is a plain list of
+    SequentialElement objects, kept for walk_tree_recursive.
     """
     def __init__(self, rule_dict):
         self.seq_list = []
@@ -39,6 +58,108 @@ class ParserData:
         self.rule_hits = self.rule_hits.fromkeys(self.rule_hits, 0)
         self.rule_hits["GOOD"] = 0
 
+class SequentialList:
+    """
+    The sequential list of every element in the policy, stored by
+    column to retain traceability without an object per element: tag
+    types in a bytearray, tag indices in an int array.  While the tree
+    is walked the content strings are kept in a plain list, because the
+    last one can still change (see list prefixes in add_element).
+    freeze() then packs them into one UTF-8 buffer plus offsets (one
+    str would widen every character to 2 or 4 bytes as soon as the
+    policy contains a single non-latin-1 character) and builds every
+    element's "p3"-style label once, shared between all elements with
+    the same label, so neighbour lookups don't concatenate strings.
+    """
+    def __init__(self):
+        self.kinds = bytearray()        # "p", "h" or "l" of each element, as ascii
+        self.tag_indices = array("i")   # index of each element among its siblings of the same type
+        self.texts = []                 # content strings until frozen
+        self.buffer = None              # all content strings UTF-8 encoded and joined, once frozen
+        self.offsets = None             # byte offset of each content string in buffer, then its end
+        self.labels = None              # tag type + tag index of each element, once frozen
+
+    def __len__(self):
+        return len(self.kinds)
+
+    def append(self, text, kind, tag_index):
+        self.kinds.append(ord(kind))
+        self.tag_indices.append(tag_index)
+        self.texts.append(text)
+
+    def kind(self, i):
+        return chr(self.kinds[i])
+
+    def tag_index(self, i):
+        return self.tag_indices[i]
+
+    def text(self, i):
+        if self.buffer is None:
+            return self.texts[i]
+        if i < 0:
+            i += len(self)
+        return self.buffer[self.offsets[i]:self.offsets[i + 1]].decode("utf-8", "surrogatepass")
+
+    def set_text(self, i, text):
+        """
+        Only possible before the list is frozen.
+        """
+        self.texts[i] = text
+
+    def freeze(self):
+        """
+        Pack the content strings into one buffer and precompute the
+        labels.  Call once the tree walk is done.
+        """
+        encoded = [text.encode("utf-8", "surrogatepass") for text in self.texts]
+        self.offsets = array("q", [0])
+        position = 0
+        for text in encoded:
+            position += len(text)
+            self.offsets.append(position)
+        self.buffer = b"".join(encoded)
+        self.texts = None
+        labels = {}
+        self.labels = [labels.setdefault((kind, tag_index), chr(kind) + str(tag_index))
+                       for kind, tag_index in zip(self.kinds, self.tag_indices)]
+
+    def neighbours(self, i):
+        """
+        Type and index of the elements either side of an element, as
+        written to the tag and sentence outputs.  Like the original
+        list lookup, the first element is preceded by the last one.
+
+        In:     index into the list (once frozen).
+        Out:    tuple of (preceded by, proceeded by) strings, "None" past
+                the end of the list.
+        """
+        prec_by = self.labels[i - 1]
+        proc_by = self.labels[i + 1] if i + 1 < len(self.labels) else "None"
+        return prec_by, proc_by
+
+    def elements(self):
+        """
+        Out:    generator of (content string, tag type, tag index).
+        """
+        for i in range(len(self)):
+            yield self.text(i), self.kind(i), self.tag_indices[i]
+
+class ParserData:
+    """
+    Class for data used during the parsing of a single policy.  This
+    data structure is initialized to be empty at start of every
+    parsing process.
+    """
+    def __init__(self, rule_dict):
+        self.seq_list = SequentialList()
+        self.paragraph_list = array("i")    # sequential indices of every paragraph
+        self.header_list = array("i")
+        self.list_list = array("i")
+        self.sentence_lengths = []
+        self.rule_hits = rule_dict.copy()
+        self.rule_hits = self.rule_hits.fromkeys(self.rule_hits, 0)
+        self.rule_hits["GOOD"] = 0
+
 def skip_tag(element):
     """ Check if given tag is relevant to the parser.
     https://stackoverflow.com/questions/1936466/beautifulsoup-grab-visible-webpage-text
@@ -80,35 +201,121 @@ def write_tag_list_to_csv(parser, l, output_file):
     Out:    CSV file corresponding to list.
     """
     tag_list = []
-    headings = ("Sequential Index","Tag Index","Preceeded By","Proceeded By","Tag Text")
     for tag_index, seq_index in enumerate(l, start=0):
         # do the exceptions for edges of lists or for short lists
-        try:
-            prec_by = parser.seq_list[seq_index-1].tag_type + str(parser.seq_list[seq_index-1].tag_index)
-        except IndexError as e:
-            prec_by = "None"
-        try:
-            proc_by = str(parser.seq_list[seq_index+1].tag_type + str(parser.seq_list[seq_index+1].tag_index))
-        except IndexError as e:
-            proc_by = "None"
-
+        prec_by, proc_by = parser.seq_list.neighbours(seq_index)
         tag_tuple = (
             seq_index,
             tag_index,
             prec_by,
             proc_by,
-            parser.seq_list[seq_index].content_string)
+            parser.seq_list.text(seq_index))
         tag_list.append(tag_tuple)
 
     with open(output_file,"w") as fp:
         csv_writer = csv.writer(fp)
-        csv_writer.writerow(headings)
+        csv_writer.writerow(TAG_HEADINGS)
         csv_writer.writerows(tag_list)
 
+TAG_KINDS = {}  # tag name -> "p", "h", "l" or None, filled in lazily by tag_kind
+PATTERN_HEADER = re.compile("h\d")
+PATTERN_LIST = re.compile("[u|o]l")
+
+def tag_kind(element_name):
+    """
+    Classify a tag name as paragraph, header, list or none of those.
+    The regexes only run once per distinct tag name.
+
+    In:     tag name string.
+    Out:    "p", "h", "l" or None.
+    """
+    kind = TAG_KINDS.get(element_name, False)
+    if kind is False:
+        if element_name == "p":
+            kind = "p"
+        elif PATTERN_HEADER.match(element_name):
+            kind = "h"
+        elif PATTERN_LIST.match(element_name):
+            kind = "l"
+        else:
+            kind = None
+        TAG_KINDS[element_name] = kind
+    return kind
+
+def child_tags(element):
+    """
+    Same as element.find_all(recursive=False): the direct children of
+    the element that are tags, without building a ResultSet.
+    """
+    return (child for child in element.children if isinstance(child, Tag))
+
+def add_element(element, kind, parser, counters):
+    """
+    Append one paragraph/header/list element to the parser's lists.
+    counters holds the next p/h/l index among the element's siblings.
+
+    In:     bs4 tag, its tag_kind, ParserData, sibling counter dict.
+    Out:    N/A
+    """
+    if kind == "l":
+        # If the last thing in the sequence ends in a colon, move it to be part 
+        # of the list element rather than whatever it was previously because it is 
+        # probably a list prefix.
+        text = ""
+        if len(parser.seq_list) > 0:
+            prev_element = parser.seq_list.text(-1).strip()
+            if prev_element.endswith(":"):
+                text = segmenter.segment(prev_element)[-1] + "\n"
+                parser.seq_list.set_text(-1, parser.seq_list.text(-1).replace(text.strip(), ""))
+                if parser.seq_list.text(-1).strip() == "":
+                    parser.seq_list.set_text(-1, "<META: This element identified as list prefix -- moved to content string of that list./META>")
+        for descendant in element.children:
+            if skip_tag(descendant):
+                continue
+            text = text + descendant.get_text().strip() + "\n"
+        parser.list_list.append(len(parser.seq_list))
+    else:
+        text = element.get_text().strip() + "\n"
+        if kind == "p":
+            parser.paragraph_list.append(len(parser.seq_list))
+        else:
+            parser.header_list.append(len(parser.seq_list))
+    parser.seq_list.append(text, kind, counters[kind])
+    counters[kind] += 1
+
 def walk_tree(soup, parser):
+    """ DFS walk of bs4 html tree.  Only looks at specific tags, works on
+    theory that only these tags will contain important/visible text.
+    Uses an explicit stack instead of recursion, so deep documents don't
+    need a raised recursion limit.  Produces exactly the same seq_list
+    as the recursive walk: tag indices count siblings under the same
+    parent, paragraphs and headers are also descended into, and lists
+    are not (their whole contents become one element).
+    
+    In:     soup - bs4 instance of the html parser
+    Out:    N/A
+    """
+    stack = [(child_tags(soup), {"p": 0, "h": 0, "l": 0})]
+    while stack:
+        children, counters = stack[-1]
+        element = next(children, None)
+        if element is None:
+            stack.pop()
+            continue
+        kind = tag_kind(element.name)
+        if kind is not None:
+            add_element(element, kind, parser, counters)
+            if kind == "l":
+                continue    # the entire list and its descendants have already been parsed
+        stack.append((child_tags(element), {"p": 0, "h": 0, "l": 0}))
+
+def walk_tree_recursive(soup, parser):
     """ DFS walk of bs4 html tree.  Only looks at specific tags, works on
     theory that only these tags will contain important/visible text.
     https://stackoverflow.com/questions/4814317/depth-first-traversal-on-beautifulsoup-parse-tree
+
+    The original recursive walk, unchanged, kept as the reference for
+    --benchmark.  Takes a ReferenceParserData.
     
     In:     soup - bs4 instance of the html parser
     Out:    N/A
@@ -165,9 +372,392 @@ def walk_tree(soup, parser):
             # been parsed
             continue
 
-        walk_tree(element, parser)
+        walk_tree_recursive(element, parser)
+
+STREAM_CHUNK_SIZE = 1 << 16     # bytes of html handed to the stream parser at a time
+STREAM_SENTENCE_BATCH = 64      # elements segmented and checked against the rules together in stream mode
+
+def mapped_chunks(path, chunk_size=STREAM_CHUNK_SIZE):
+    """
+    Read a file through a read-only memory map, one chunk at a time,
+    with the newline translation open() does in text mode ("\\r\\n" and
+    "\\r" become "\\n"), so the stream parser sees the same characters
+    the tree parser does.  Only the current chunk is ever copied out
+    of the map, and the pages already handed over are dropped from the
+    process's resident set again.
+
+    In:     path to file.
+    Out:    generator of bytes chunks.
+    """
+    with open(path, "rb") as fp:
+        if os.fstat(fp.fileno()).st_size == 0:
+            return
+        with mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            carry = b""     # a trailing "\r" waits for the next chunk, which may start with "\n"
+            released = 0    # end of the pages already dropped
+            for start in range(0, len(mapped), chunk_size):
+                chunk = carry + mapped[start:start + chunk_size]
+                carry = b""
+                if chunk.endswith(b"\r"):
+                    chunk, carry = chunk[:-1], b"\r"
+                yield chunk.replace(b"\r\n", b"\n").replace(b"\r", b"\n")
+                done = min(start + chunk_size, len(mapped)) // mmap.PAGESIZE * mmap.PAGESIZE
+                if done > released and hasattr(mmap, "MADV_DONTNEED"):
+                    mapped.madvise(mmap.MADV_DONTNEED, released, done - released)
+                    released = done
+            if carry:
+                yield b"\n"
+
+STRING_CONTAINERS = {"script", "style", "template", "rt", "rp"}    # bs4 gives strings inside these their own classes, which get_text skips
+PRESERVE_WHITESPACE = {"pre", "textarea"}   # bs4 collapses whitespace-only strings everywhere else
+
+def element_text(element):
+    """
+    What bs4's get_text() returns for an element of the tree the lxml
+    backend builds, from the lxml element itself.  Every text and tail
+    of lxml is one string in bs4, which drops comments and processing
+    instructions, gives strings the class of their innermost string
+    container and only keeps those of the element's own class (plain
+    strings, unless the element is a container itself), and turns
+    strings of nothing but ASCII whitespace into a single newline or
+    space outside <pre>.  Bad tags count as removed, only the text
+    after them stays.
 
-def compare_parsed_text(seq_list, auto_stripped_text):
+    In:     lxml element.
+    Out:    string.
+    """
+    container = None    # name of the innermost string container around the element
+    preserve = False
+    ancestor = element.getparent()
+    while ancestor is not None:
+        if container is None and ancestor.tag in STRING_CONTAINERS:
+            container = ancestor.tag
+        preserve = preserve or ancestor.tag in PRESERVE_WHITESPACE
+        ancestor = ancestor.getparent()
+    wanted = element.tag if element.tag in STRING_CONTAINERS else None
+    pieces = []
+
+    def add(text, container, preserve):
+        if text and container == wanted:
+            if not preserve and text.strip(" \n\t\x0c\r") == "":
+                text = "\n" if "\n" in text else " "
+            pieces.append(text)
+
+    def enter(node, container, preserve):
+        if node.tag in STRING_CONTAINERS:
+            container = node.tag
+        add(node.text, container, preserve or node.tag in PRESERVE_WHITESPACE)
+        return node, iter(node), container, preserve or node.tag in PRESERVE_WHITESPACE
+
+    stack = [enter(element, container, preserve)]
+    while stack:
+        node, children, container, preserve = stack[-1]
+        child = next(children, None)
+        if child is None:
+            stack.pop()
+            if stack:
+                add(node.tail, stack[-1][2], stack[-1][3])
+        elif isinstance(child.tag, str) and child.tag not in BAD_TAGS:
+            stack.append(enter(child, container, preserve))
+        else:
+            add(child.tail, container, preserve)    # bad tag, comment or processing instruction
+    return "".join(pieces)
+
+def list_text(element):
+    """
+    Content string of a list element without its prefix, the lxml
+    version of the loop over the list's children in add_element.
+    Comments and removed bad tags are not children in the bs4 tree.
+    """
+    text = ""
+    for child in element:
+        if isinstance(child.tag, str) and child.tag not in BAD_TAGS:
+            text = text + element_text(child).strip() + "\n"
+    return text
+
+def stream_elements(chunks):
+    """
+    The streaming counterpart of remove_bad_tags, walk_tree and
+    add_element, on lxml's incremental HTML parser (the parser behind
+    the "lxml" backend).  Elements come out in sequential order as soon
+    as their text is final: a paragraph or header once it is closed,
+    and the element before a list once that list has taken its prefix.
+    Everything outside the paragraph, header or list being read is
+    cleared as soon as it is closed, so memory is bounded by the
+    largest such element instead of the whole document.
+
+    In:     iterable of chunks of html bytes (UTF-8).
+    Out:    generator of (content string, tag type, tag index), the
+            same sequential list walk_tree builds with the lxml backend.
+    """
+    pull_parser = etree.HTMLPullParser(events=("start", "end"), encoding="utf-8")
+    stack = [({"p": 0, "h": 0, "l": 0}, None)]  # sibling counters and pending record of the document and every walked, open element
+    pending = collections.deque()   # [tag type, tag index, text, list prefix] of elements not yet yielded, None until known
+    appended = 0        # number of elements found so far
+    open_records = 0    # open elements whose text is still needed
+    skipping = 0        # depth inside a bad tag or a list, whose contents aren't walked
+    skipped = None      # pending record of the list being skipped, None for a bad tag
+
+    def ready(final):
+        while pending:
+            first = pending[0]
+            if first[2] is None or first[3] is None:
+                return
+            if len(pending) > 1:
+                following = pending[1]
+                if following[0] == "l" and following[3] is None:
+                    # list prefix, see add_element
+                    text = first[3] + first[2]
+                    prefix = ""
+                    if text.strip().endswith(":"):
+                        prefix = segmenter.segment(text.strip())[-1] + "\n"
+                        text = text.replace(prefix.strip(), "")
+                        if text.strip() == "":
+                            text = "<META: This element identified as list prefix -- moved to content string of that list./META>"
+                    first[2], first[3] = text, ""
+                    following[3] = prefix
+            elif not final:
+                return
+            pending.popleft()
+            yield first[3] + first[2], first[0], first[1]
+
+    def release(element):
+        # nothing open needs this element's text any more, so drop it and its earlier siblings
+        if open_records == 0:
+            element.clear(keep_tail=True)
+            parent = element.getparent()
+            if parent is not None:
+                while element.getprevious() is not None:
+                    del parent[0]
+
+    for chunk in itertools.chain(chunks, [None]):
+        if chunk is None:
+            try:
+                pull_parser.close()
+            except etree.XMLSyntaxError:
+                pass    # no elements at all, an empty soup
+        else:
+            pull_parser.feed(chunk)
+        for event, element in pull_parser.read_events():
+            if skipping:
+                skipping += 1 if event == "start" else -1
+                if skipping > 0:
+                    continue
+                if skipped is None:
+                    element.clear(keep_tail=True)   # bad tag: its text is gone, the text after it stays
+                else:
+                    skipped[2] = list_text(element)
+                    open_records -= 1
+                    release(element)
+                    yield from ready(False)
+                continue
+            if event == "start":
+                if element.tag in BAD_TAGS:
+                    skipping, skipped = 1, None
+                    continue
+                counters = stack[-1][0]
+                kind = tag_kind(element.tag) if isinstance(element.tag, str) else None
+                record = None
+                if kind is not None:
+                    record = [kind, counters[kind], None, "" if kind != "l" or appended == 0 else None]
+                    counters[kind] += 1
+                    pending.append(record)
+                    appended += 1
+                    open_records += 1
+                if kind == "l":
+                    skipping, skipped = 1, record   # the entire list becomes one element
+                    continue
+                stack.append(({"p": 0, "h": 0, "l": 0}, record))
+            else:
+                counters, record = stack.pop()
+                if record is not None:
+                    record[2] = element_text(element).strip() + "\n"
+                    open_records -= 1
+                release(element)
+                yield from ready(False)
+    yield from ready(True)
+
+def measure_seq_lists(elements):
+    """
+    Memory retained by one policy's sequential list (and its paragraph,
+    header and list indices) as SequentialElement objects and as a
+    SequentialList, each built from fresh copies of the same texts.
+
+    In:     list of (content string, tag type, tag index).
+    Out:    dict of representation name -> (bytes, allocated blocks).
+    """
+    import tracemalloc
+    def objects():
+        seq_list = []
+        kind_lists = {"p": [], "h": [], "l": []}
+        for text, kind, tag_index in elements:
+            kind_lists[kind].append(len(seq_list))
+            seq_list.append(SequentialElement(text.encode().decode(), kind, tag_index))
+        return seq_list, kind_lists
+    def columns():
+        seq_list = SequentialList()
+        kind_lists = {"p": array("i"), "h": array("i"), "l": array("i")}
+        for text, kind, tag_index in elements:
+            kind_lists[kind].append(len(seq_list))
+            seq_list.append(text.encode().decode(), kind, tag_index)
+        seq_list.freeze()
+        return seq_list, kind_lists
+    measurements = {}
+    for name, build in (("SequentialElement", objects), ("SequentialList", columns)):
+        tracemalloc.start()
+        structure = build()
+        statistics = tracemalloc.take_snapshot().statistics("filename")
+        tracemalloc.stop()
+        measurements[name] = (sum(stat.size for stat in statistics), sum(stat.count for stat in statistics))
+        del structure
+    return measurements
+
+def benchmark(files, backends):
+    """
+    Time the recursive and iterative walks over every file with every
+    available backend, measure peak traced memory, and check both walks
+    produce the same sequential list.  Each configuration includes
+    building the soup and remove_bad_tags, as in process_policy.  With
+    lxml installed, the stream parser is timed and checked against the
+    lxml tree too.  Also times parse_coverage against the original
+    str.replace comparison and measures the memory of the sequential
+    list representations.
+
+    In:     list of html filenames in dataset_html, list of bs4 backends.
+    Out:    N/A, prints a table.
+    """
+    import tracemalloc
+    sys.setrecursionlimit(10**6)    # only the recursive reference walk needs this
+    contents = []
+    for fname in files:
+        with open(dataset_html + fname, "r") as fp:
+            contents.append(fp.read())
+    print("Benchmarking " + str(len(contents)) + " pages (" + str(round(sum(map(len, contents)) / 1e6, 2)) + " MB).")
+    print("backend".ljust(14) + "walker".ljust(11) + "pages/sec".rjust(10) + "peak MB".rjust(10) + "  same seq_list")
+    lxml_seq_lists = None
+    for backend in backends:
+        try:
+            BeautifulSoup("", backend)
+        except FeatureNotFound:
+            print(backend.ljust(14) + "not installed, skipping")
+            continue
+        results = {}
+        for name, walker, parser_data in (("recursive", walk_tree_recursive, ReferenceParserData), ("iterative", walk_tree, ParserData)):
+            start = time.perf_counter()
+            seq_lists = []
+            for html_contents in contents:
+                parser = parser_data(rule_dict)
+                walker(remove_bad_tags(BeautifulSoup(html_contents, backend)), parser)
+                if parser_data is ReferenceParserData:
+                    seq_lists.append([(element.content_string, element.tag_type, element.tag_index) for element in parser.seq_list])
+                else:
+                    parser.seq_list.freeze()
+                    seq_lists.append(list(parser.seq_list.elements()))
+            elapsed = time.perf_counter() - start
+            peak = 0
+            for html_contents in contents:
+                tracemalloc.start()
+                walker(remove_bad_tags(BeautifulSoup(html_contents, backend)), parser_data(rule_dict))
+                peak = max(peak, tracemalloc.get_traced_memory()[1])
+                tracemalloc.stop()
+            results[name] = seq_lists
+            same = "" if name == "recursive" else ("yes" if seq_lists == results["recursive"] else "NO")
+            print(backend.ljust(14) + name.ljust(11) + str(round(len(contents) / elapsed, 2)).rjust(10) +
+                  str(round(peak / 1e6, 1)).rjust(10) + "  " + same)
+        if backend == "lxml":
+            lxml_seq_lists = seq_lists
+
+    # the stream parser, checked against the lxml tree
+    if lxml_seq_lists is not None:
+        start = time.perf_counter()
+        seq_lists = [list(stream_elements(mapped_chunks(dataset_html + fname))) for fname in files]
+        elapsed = time.perf_counter() - start
+        peak = 0
+        for fname in files:
+            tracemalloc.start()
+            for element in stream_elements(mapped_chunks(dataset_html + fname)):
+                pass
+            peak = max(peak, tracemalloc.get_traced_memory()[1])
+            tracemalloc.stop()
+        print("lxml".ljust(14) + "stream".ljust(11) + str(round(len(contents) / elapsed, 2)).rjust(10) +
+              str(round(peak / 1e6, 1)).rjust(10) + "  " + ("yes" if seq_lists == lxml_seq_lists else "NO"))
+
+    # parse coverage check against the original str.replace version
+    replace_time = 0.0
+    coverage_time = 0.0
+    mismatches = []
+    memory = {"SequentialElement": [0, 0, 0], "SequentialList": [0, 0, 0]}     # total bytes, total blocks, largest policy bytes
+    for fname, html_contents in zip(files, contents):
+        text_file = dataset_text + fname[:-5] + ".txt"
+        if not os.path.isfile(text_file):
+            continue
+        with open(text_file, "r") as fp:
+            auto_stripped_text = fp.read()
+        parser = ParserData(rule_dict)
+        walk_tree(remove_bad_tags(BeautifulSoup(html_contents, "html.parser")), parser)
+        parser.seq_list.freeze()
+        for name, (size, blocks) in measure_seq_lists(list(parser.seq_list.elements())).items():
+            memory[name][0] += size
+            memory[name][1] += blocks
+            memory[name][2] = max(memory[name][2], size)
+        start = time.perf_counter()
+        remaining_text = compare_parsed_text_replace(parser.seq_list, auto_stripped_text)
+        failed = len(segmenter.segment(remaining_text)) > 5
+        replace_time += time.perf_counter() - start
+        start = time.perf_counter()
+        coverage = parse_coverage(parser.seq_list, auto_stripped_text)
+        coverage_failed = coverage.failed()
+        coverage_time += time.perf_counter() - start
+        if failed != coverage_failed or remaining_text != coverage.remaining_text:
+            mismatches.append(fname)
+    print("Parse coverage: str.replace " + str(round(replace_time, 3)) + " sec, offsets " + str(round(coverage_time, 3)) + " sec")
+    if mismatches:
+        print("Remaining text differs for: " + ", ".join(mismatches))
+    else:
+        print("Remaining text and pass/fail decisions identical for every file.")
+    for name, (size, blocks, largest) in memory.items():
+        print("Sequential list as " + name.ljust(18) + str(round(size / 1e6, 2)).rjust(8) + " MB in " + str(blocks).rjust(8) +
+              " blocks, largest policy " + str(round(largest / 1e6, 2)) + " MB")
+
+class ParseCoverage:
+    """
+    Which parts of the automatically stripped text the parsed elements
+    account for.  covered is a numpy boolean array with one entry per
+    character of the stripped text, True where a parsed segment was
+    matched.  There is usually an unmatched run between every two
+    matched lines (if only a newline), so the remaining text is picked
+    out of the text's code points with the mask in one go rather than
+    joined from thousands of slices.
+    """
+    SENTENCE_END = re.compile("[.?!]")
+
+    def __init__(self, auto_stripped_text, covered):
+        characters = np.frombuffer(auto_stripped_text.encode("utf-32-le", "surrogatepass"), dtype=np.uint32)
+        self.remaining_text = characters[~covered].tobytes().decode("utf-32-le", "surrogatepass")
+        total = len(auto_stripped_text) - sum(map(auto_stripped_text.count, " \t\n\r\f\v"))
+        remaining = len(self.remaining_text) - sum(map(self.remaining_text.count, " \t\n\r\f\v"))
+        self.ratio = 1.0 if total == 0 else 1.0 - remaining / total    # of non-whitespace characters
+
+    def remaining_sentences(self):
+        """
+        Out:    sentence-tokenized version of the unmatched text.
+        """
+        return segmenter.segment(self.remaining_text)
+
+    def failed(self, max_sentences=5):
+        """
+        Parsing failed if more than max_sentences sentences of the text
+        were not matched.  Punkt only ends sentences on . ? or !, so when
+        there are too few of those to reach the limit the remainder
+        doesn't need to be tokenized at all.
+
+        Out:    Boolean: True if parsing failed.
+        """
+        if len(self.SENTENCE_END.findall(self.remaining_text)) + 1 <= max_sentences:
+            return False
+        return len(self.remaining_sentences()) > max_sentences
+
+class CoverageTracker:
     """
     This is a stupid workaround to the fact that bs4 parsers generally suck.
     Tries to measure whether parsing was "successful" by looking at the 
@@ -175,19 +765,120 @@ def compare_parsed_text(seq_list, auto_stripped_text):
     Note: can't match/replace entire elements at a time because of 
     weirdness in how certain things get scraped by bs4.
 
+    Every line of every element claims the first occurrence in the text
+    that doesn't overlap an earlier match, without copying and
+    rescanning the whole document for every line.  This is close to, but
+    not the same as, removing each one in turn with
+    str.replace(segment, "", 1): removing text can join its neighbours
+    into a new occurrence, which str.replace would then match but which
+    isn't in the original text, so isn't matched here.  --benchmark
+    reports any file where the two differ.  Everything after the
+    furthest match (the cursor) is untouched; the text left unmatched
+    behind it is kept joined by newlines in hole_text, which no segment
+    can span because segments come from splitlines.  Matches that move
+    the cursor are only recorded as spans, in order; matches in
+    hole_text are marked in covered, to check later ones for overlaps,
+    and coverage() merges the two into one mask.  Since parsed elements
+    are mostly in document order, hole_text stays small and the search
+    after the cursor rarely goes far.  hole_text is only ever appended
+    to, so the search for a segment there resumes after its previous
+    match.
+
+    Elements are added one at a time in sequential order, so --stream
+    can check coverage while the policy is still being parsed.
+    """
+    def __init__(self, auto_stripped_text):
+        self.auto_stripped_text = auto_stripped_text
+        self.covered = bytearray(len(auto_stripped_text))
+        self.hole_starts = []   # start of each run of unmatched text skipped over by the cursor
+        self.hole_offsets = []  # where each of those runs starts in hole_text
+        self.hole_text = ""
+        self.resume = {}        # where to continue searching hole_text for each segment
+        self.cursor = 0
+        self.starts = array("q")    # start and end of each match that moved the cursor, in order
+        self.ends = array("q")
+        self.missing = set()    # segments that can no longer match anywhere
+
+    def add(self, text):
+        """
+        In:     content string of the next element.
+        Out:    N/A
+        """
+        covered, hole_starts, hole_offsets, resume, missing = self.covered, self.hole_starts, self.hole_offsets, self.resume, self.missing
+        starts, ends = self.starts, self.ends
+        find, cursor, hole_text = self.auto_stripped_text.find, self.cursor, self.hole_text
+        for segment in text.splitlines():
+            segment = segment.strip()
+            if segment == "" or segment in missing:
+                continue
+            length = len(segment)
+            start = resume.get(segment, 0)
+            found = hole_text.find(segment, start) if start < len(hole_text) else -1
+            while found != -1:
+                i = bisect.bisect_right(hole_offsets, found) - 1
+                position = hole_starts[i] + found - hole_offsets[i]
+                overlap = covered.find(1, position, position + length)
+                if overlap == -1:
+                    break
+                # skip the covered run, but not past the end of this hole
+                hole_end = hole_offsets[i + 1] - 1 if i + 1 < len(hole_offsets) else len(hole_text)
+                uncovered = covered.find(0, overlap)
+                found = hole_text.find(segment, hole_end if uncovered == -1 else min(hole_end, found + uncovered - position))
+            if found != -1:
+                resume[segment] = found + length
+                covered[position:position + length] = b"\x01" * length
+            else:
+                if start < len(hole_text):
+                    resume[segment] = len(hole_text)    # nothing before the end of hole_text can match any more
+                position = find(segment, cursor)
+                if position == -1:
+                    missing.add(segment)
+                    continue
+                if position != cursor:
+                    skipped = self.auto_stripped_text[cursor:position]
+                    if not skipped.isspace():
+                        hole_starts.append(cursor)
+                        hole_offsets.append(len(hole_text) + 1)
+                        hole_text += "\n" + skipped
+                cursor = position + length
+                starts.append(position)
+                ends.append(cursor)
+        self.cursor, self.hole_text = cursor, hole_text
+
+    def coverage(self):
+        """
+        Out:    ParseCoverage of every element added so far.
+        """
+        delta = np.zeros(len(self.covered) + 1, dtype=np.int8)
+        delta[np.frombuffer(self.starts, dtype=np.int64)] = 1
+        delta[np.frombuffer(self.ends, dtype=np.int64)] -= 1
+        covered = np.frombuffer(self.covered, dtype=bool) | (np.cumsum(delta[:-1]) > 0)
+        return ParseCoverage(self.auto_stripped_text, covered)
+
+def parse_coverage(seq_list, auto_stripped_text):
+    """
     In:     sequential list of elements, stripped text of policy HTML doc.
-    Out:    sentence-tokenized version of remaining text.
+    Out:    ParseCoverage, see CoverageTracker.
+    """
+    tracker = CoverageTracker(auto_stripped_text)
+    for text, kind, tag_index in seq_list.elements():
+        tracker.add(text)
+    return tracker.coverage()
+
+def compare_parsed_text_replace(seq_list, auto_stripped_text):
     """
-    for element in seq_list:
-        element_segment_list = element.content_string.splitlines()
+    The original quadratic implementation, kept as the reference for
+    --benchmark.
+
+    Out:    remaining text (not sentence-tokenized).
+    """
+    for text, kind, tag_index in seq_list.elements():
+        element_segment_list = text.splitlines()
         for segment in element_segment_list:
-            try:
-                auto_stripped_text = auto_stripped_text.replace(segment.strip(), "", 1)
-            except ValueError:
-                pass  # do nothing!
-    return sent_tokenize(auto_stripped_text)
+            auto_stripped_text = auto_stripped_text.replace(segment.strip(), "", 1)
+    return auto_stripped_text
 
-def extract_sentences(parser, outfile_sentences, outfile_rule_bar):
+def extract_sentences(parser, outfile_sentences):
     """ 
     Takes readable text from the parser's list outputs and attempts to
     tokenize the strings into sentences.
@@ -197,60 +888,143 @@ def extract_sentences(parser, outfile_sentences, outfile_rule_bar):
     the sequential list:
     (sequential index, tag type, tag index, sentence index in tag, sentence text, rule hits)
 
+    Only numeric rule hits are collected here; the rule bar graphs are
+    drawn after parsing has finished (see statistics/figures.py).
+
     In:     all element lists, including sequential list.
-    Out:    csv file containing all sentence tokens with rule hits if applicable
-            bar graph showing numbers of rule hits on sentences in policy.
+    Out:    csv file containing all sentence tokens with rule hits if
+            applicable (if selected in outputs), and the list of tuples.
     """
     # parser.rule_hits.update({rule:0 for rule in parser.rule_hits})
     processed_tags = ["p","h"]
     sentences_list = []
 
-    # loop through sequential list to build sentences/tuple list
-    for i, element in enumerate(parser.seq_list, start=0): # for every tag in the sequential list
-        if any(tag in element.tag_type for tag in processed_tags):
-            try:
-                prec_by = parser.seq_list[i-1].tag_type + str(parser.seq_list[i-1].tag_index)
-            except IndexError as e:
-                prec_by = "None"
-            try:
-                proc_by = str(parser.seq_list[i+1].tag_type + str(parser.seq_list[i+1].tag_index))
-            except IndexError as e:
-                proc_by = "None"
-            sentences = sent_tokenize(element.content_string)
-            for j, sentence in enumerate(sentences, start=0): # for every sentence in each tag
-                rule_hits = apply_sentence_rules(sentence, rule_dict)
-                for name in parser.rule_hits.keys(): # check every rule in the dict
-                    if name in rule_hits: # and increment the parser dict if that key is in the sentence's keys
-                        parser.rule_hits[name] += 1
-                sentence_tuple = (i, element.tag_type + str(element.tag_index), prec_by, proc_by, j, sentence, len(sentence.split()), "-".join(map(str, rule_hits)))
-                sentences_list.append(sentence_tuple)
-                parser.sentence_lengths.append(len(sentence.split()))
+    # segment every processed element in one batch, then loop through sequential list to build sentences/tuple list
+    processed = [i for i in range(len(parser.seq_list)) if parser.seq_list.kind(i) in processed_tags]
+    texts = [parser.seq_list.text(i) for i in processed]
+    if memo is not None:
+        # elements seen before, in any policy, come straight from the memo
+        segmented, masks = memo.segment_and_evaluate(texts)
+    else:
+        segmented = segmenter.segment_many(texts)
+        # evaluate the sentence rules on the whole policy at once, as bitmasks
+        masks = rule_engine.evaluate_batch([sentence for sentences in segmented for sentence in sentences])
+    for name, count in rule_engine.count(masks).items():
+        parser.rule_hits[name] += count
+    masks = iter(masks)
+    for i, sentences in zip(processed, segmented): # for every processed tag in the sequential list
+        prec_by, proc_by = parser.seq_list.neighbours(i)
+        for j, sentence in enumerate(sentences, start=0): # for every sentence in each tag
+            rule_hits = rule_engine.names_for(next(masks))
+            sentence_tuple = (i, parser.seq_list.labels[i], prec_by, proc_by, j, sentence, len(sentence.split()), "-".join(rule_hits))
+            sentences_list.append(sentence_tuple)
+            parser.sentence_lengths.append(len(sentence.split()))
 
     # write all sentences to single csv file
-    headings = ("Sequential Index","Tag Type-Index", "Tag Preceeded By", "Tag Proceeded By", "Sentence Index in Tag", "Sentence Text", "Number of Words in Sentence", "Rule Hits")
-    with open(outfile_sentences,"w") as fp:
-        csv_writer = csv.writer(fp)
-        csv_writer.writerow(headings)
-        csv_writer.writerows(sentences_list)
+    if "sentences" in outputs:
+        with open(outfile_sentences,"w") as fp:
+            csv_writer = csv.writer(fp)
+            csv_writer.writerow(SENTENCE_HEADINGS)
+            csv_writer.writerows(sentences_list)
+    return sentences_list
 
-    # create bar graphs of policy's sentence rule hits
-    generate_rule_bar_fig(parser.rule_hits, outfile_rule_bar)
+def element_rows(parser):
+    """
+    Every element of the sequential list as a row for the output store.
+
+    In:     parser to access sequential list.
+    Out:    list of (sequential index, tag type, tag index, preceded by,
+            proceeded by, text) tuples.
+    """
+    rows = []
+    for seq_index, (text, kind, tag_index) in enumerate(parser.seq_list.elements()):
+        prec_by, proc_by = parser.seq_list.neighbours(seq_index)
+        rows.append((seq_index, kind, tag_index, prec_by, proc_by, text))
+    return rows
+
+class PolicyResult:
+    """
+    What process_policy hands back to the parent for one policy, and
+    what the incremental manifest remembers about it.
+    """
+    def __init__(self, fname, key, suffix, success, rule_hits, sentence_lengths, status, output_files, reused=False):
+        self.fname = fname
+        self.key = key                      # digest of everything that went into the outputs (None if not incremental)
+        self.suffix = suffix                # appended to the policy name in output filenames
+        self.success = success
+        self.rule_hits = rule_hits
+        self.sentence_lengths = sentence_lengths
+        self.status = status                # line for err.txt/success.txt
+        self.output_files = output_files    # every per-policy file written
+        self.reused = reused                # True if taken from the manifest without parsing
+        self.rss = None                     # (RSS before, peak RSS while parsing) in bytes, None if reused
+
+    def to_manifest(self):
+        return {"key": self.key, "suffix": self.suffix, "success": self.success, "rule_hits": self.rule_hits,
+                "sentence_lengths": self.sentence_lengths, "status": self.status, "output_files": self.output_files}
+
+    @classmethod
+    def from_manifest(cls, fname, entry):
+        return cls(fname, entry["key"], entry["suffix"], entry["success"], entry["rule_hits"],
+                   entry["sentence_lengths"], entry["status"], entry["output_files"], reused=True)
+
+def load_manifest(path):
+    """
+    Read the incremental manifest: for every policy, the digest of the
+    inputs that produced its outputs and the results of that run.  A
+    manifest written by a different PARSER_VERSION is ignored.
+
+    In:     path to manifest json file.
+    Out:    dict of policy filename -> manifest entry.
+    """
+    if not os.path.isfile(path):
+        return {}
+    with open(path, "r") as fp:
+        manifest = json.load(fp)
+    if manifest.get("version") != PARSER_VERSION:
+        return {}
+    return manifest["policies"]
+
+def save_manifest(path, policies):
+    """
+    Write the manifest atomically, so an interrupted run never leaves
+    a half-written one behind.
+    """
+    with open(path + ".tmp", "w") as fp:
+        json.dump({"version": PARSER_VERSION, "policies": policies}, fp)
+    os.replace(path + ".tmp", path)
+
+def remove_files(paths):
+    for path in paths:
+        if os.path.isfile(path):
+            os.remove(path)
 
 def process_policy(fname):
     """
     Entry function for each subprocess.  Reads in the HTML contents and
-    stripped text of the input policy filename, creates all the output
-    files needed for this policy, instantiates a bs4 object and an
-    object to hold statistics about the policy, walks the bs4 tree,
-    outputs each tag-type's list to its own CSV file, then builds
-    the sequential list of all elements in the HTML file, then hands
-    everything off to the sentence extraction phase.
+    stripped text of the input policy filename and hands them off to
+    parse_policy, then updates the progress bar.
+
+    In incremental mode the outputs are named after a digest of the
+    inputs, the rules and the parser settings instead of the run
+    timestamp, and if the manifest already has outputs for that digest
+    they are reused without parsing anything.
+
+    With --stream the html isn't read here at all, stream_policy maps
+    the file instead, and the digest is taken of its bytes.  The peak
+    RSS of the worker while it parses the policy also goes back with
+    the result.
 
     In:     policy filename.
-    Out:    tuple containing policy rule_hits dict and the filename.
+    Out:    PolicyResult, or None if the policy was skipped.
     """
-    with open(dataset_html + fname, "r") as fp:
-        html_contents = fp.read()
+    if stream:
+        reset_peak_rss()
+        rss_before = current_rss()
+        html_contents = None if os.path.getsize(dataset_html + fname) > 0 else ""
+    else:
+        with open(dataset_html + fname, "r") as fp:
+            html_contents = fp.read()
     with open(dataset_text + fname[:-5] + ".txt", "r") as fp:
         auto_stripped_text = fp.read()
     if html_contents == "":
@@ -262,79 +1036,446 @@ def process_policy(fname):
         # this isn't considered failure because if the whole text is empty, there's no way to compare
         return None
 
+    key = None
+    suffix = timestamp
+    result = None
+    if manifest is not None:
+        key = digest(file_digest(dataset_html + fname) if stream else html_contents, auto_stripped_text, settings_key)
+        suffix = "_" + key[:16]
+        entry = manifest.get(fname)
+        if entry is not None:
+            if entry["key"] == key and all(os.path.isfile(path) for path in entry["output_files"]):
+                result = PolicyResult.from_manifest(fname, entry)
+            else:
+                remove_files(entry["output_files"])     # outputs of an older version of this policy
+    if result is None:
+        if stream:
+            result = stream_policy(fname, dataset_html + fname, auto_stripped_text, key, suffix)
+            if result is not None:
+                result.rss = (rss_before, peak_rss())
+        else:
+            result = parse_policy(fname, html_contents, auto_stripped_text, key, suffix)
+
+    # Update progress bar
+    with index.get_lock():
+        index.value += 1
+        print_progress_bar(index.value, len(files), prefix = "Parsing-Tokenizing Progress:", suffix = "Complete", length = 50)
+    return result
+
+def parse_policy(fname, html_contents, auto_stripped_text, key=None, suffix=None):
+    """
+    Creates all the output files needed for this policy, instantiates a
+    bs4 object and an object to hold statistics about the policy, walks
+    the bs4 tree, outputs each tag-type's list to its own CSV file, then
+    builds the sequential list of all elements in the HTML file, then
+    hands everything off to the sentence extraction phase.  Works on
+    contents already in memory, so the crawler's pipeline mode can call
+    it without the html ever touching the disk.
+
+    In:     policy filename, html contents, stripped text, optional
+            incremental digest and filename suffix (default: the run
+            timestamp).
+    Out:    PolicyResult, or None if bs4 can't read the html.
+    """
+    if suffix is None:
+        suffix = timestamp
+
     # build all the output files
-    outfile_sequential = parser_output_folder + fname[:-5] + timestamp + "_sequential.txt"
-    outfile_paragraphs = parser_output_folder + fname[:-5] + timestamp + "_paragraphs.csv"
-    outfile_headers = parser_output_folder + fname[:-5] + timestamp + "_headers.csv"
-    outfile_lists = parser_output_folder + fname[:-5] + timestamp + "_lists.csv"
-    outfile_compare = parser_output_folder + fname[:-5] + timestamp + "_compare.txt"
-    outfile_rule_bar = tokenizer_output_folder + fname[:-5] + timestamp + "_rule_bar.png"
-    outfile_sentences = tokenizer_output_folder + fname[:-5] + timestamp + "_sentences.csv"
+    outfile_sequential = parser_output_folder + fname[:-5] + suffix + "_sequential.txt"
+    outfile_paragraphs = parser_output_folder + fname[:-5] + suffix + "_paragraphs.csv"
+    outfile_headers = parser_output_folder + fname[:-5] + suffix + "_headers.csv"
+    outfile_lists = parser_output_folder + fname[:-5] + suffix + "_lists.csv"
+    outfile_compare = parser_output_folder + fname[:-5] + suffix + "_compare.txt"
+    outfile_sentences = tokenizer_output_folder + fname[:-5] + suffix + "_sentences.csv"
+    output_files = []
 
     # walk tree to parse all the beautiful soup tags and build comparison text
     try:
-        soup = BeautifulSoup(html_contents, "html.parser")
+        soup = BeautifulSoup(html_contents, backend)
     except Exception as e:
         print("Skipping " + fname + " because it can't be read by BeautifulSoup.")
         return None   # if there's no soup, we don't care
     parser = ParserData(rule_dict)
     walk_tree(remove_bad_tags(soup), parser)
+    parser.seq_list.freeze()
 
     # output the parsed tags to their appropriate files
-    if len(parser.paragraph_list) > 0:
+    if len(parser.paragraph_list) > 0 and "paragraphs" in outputs:
         write_tag_list_to_csv(parser, parser.paragraph_list, outfile_paragraphs)
-    if len(parser.header_list) > 0:
+        output_files.append(outfile_paragraphs)
+    if len(parser.header_list) > 0 and "headers" in outputs:
         write_tag_list_to_csv(parser, parser.header_list, outfile_headers)
-    if len(parser.list_list) > 0:
+        output_files.append(outfile_headers)
+    if len(parser.list_list) > 0 and "lists" in outputs:
         write_tag_list_to_csv(parser, parser.list_list, outfile_lists)
+        output_files.append(outfile_lists)
 
     # go through entire sequential list to build sequential file
-    out_string = ""
-    for element in parser.seq_list:
-        out_string = out_string + element.tag_type + str(element.tag_index) + "\n" + element.content_string + "\n"
-    with open(outfile_sequential, "a") as fp:
-        fp.write(out_string)
-
-    # Update progress bar
-    with index.get_lock():
-        index.value += 1
-        print_progress_bar(index.value, len(files), prefix = "Parsing-Tokenizing Progress:", suffix = "Complete", length = 50)
+    if "sequential" in outputs:
+        out_string = "".join(label + "\n" + text + "\n" for label, (text, kind, tag_index) in zip(parser.seq_list.labels, parser.seq_list.elements()))
+        with open(outfile_sequential, "a") as fp:
+            fp.write(out_string)
+        output_files.append(outfile_sequential)
 
     # Decide whether the parsing was successful
-    remaining_sentences = compare_parsed_text(parser.seq_list,auto_stripped_text)
-    lock = Lock()   # do full lock here because err.txt & success.txt are shared files
-    if len(remaining_sentences) > 5:
+    # the status line goes back to the parent with the result, see StatusWriter
+    coverage = parse_coverage(parser.seq_list, auto_stripped_text)
+    if coverage.failed():
         # parsing failed --> don't bother doing anything else to this policy
-        lock.acquire()
-        try:
-            num_failed_policies.value += 1
+        remaining_sentences = coverage.remaining_sentences()
+        if "compare" in outputs:
             with open(outfile_compare, "a") as fp:
                 fp.write("\n\n".join(remaining_sentences) + "\n")
-            with open(parser_output_folder + "err.txt", "a") as fp:
-                fp.write(fname[:-5] + " has " + str(len(remaining_sentences)) + " left.\n")
-        finally:
-            lock.release()
-        return None
+            output_files.append(outfile_compare)
+        status = fname[:-5] + " has " + str(len(remaining_sentences)) + " left.\n"
+        if store is not None:
+            store.write_policy(fname[:-5], False, coverage.ratio, coverage.remaining_text, parser.rule_hits,
+                               parser.sentence_lengths, element_rows(parser), [])
+        return PolicyResult(fname, key, suffix, False, parser.rule_hits.copy(), parser.sentence_lengths, status, output_files)
     else:
         # parsing succeeded --> sentence tokenize as much as possible from
-        extract_sentences(parser, outfile_sentences, outfile_rule_bar)
-        lock.acquire()
-        try:
-            with open(parser_output_folder + "success.txt", "a") as fp:
-                fp.write(fname[:-5] + " has " + str(parser.rule_hits["GOOD"]) + " good sentences.\n")
-        finally:
-            lock.release()
-        return (parser.rule_hits.copy(), fname, parser.sentence_lengths)
+        sentences_list = extract_sentences(parser, outfile_sentences)
+        if "sentences" in outputs:
+            output_files.append(outfile_sentences)
+        status = fname[:-5] + " has " + str(parser.rule_hits["GOOD"]) + " good sentences.\n"
+        if store is not None:
+            store.write_policy(fname[:-5], True, coverage.ratio, coverage.remaining_text, parser.rule_hits,
+                               parser.sentence_lengths, element_rows(parser), sentences_list)
+        return PolicyResult(fname, key, suffix, True, parser.rule_hits.copy(), parser.sentence_lengths, status, output_files)
+
+class StreamingCsv:
+    """
+    A CSV output written row by row while a policy is streamed.  The
+    rows of the first element name the last element as the one before
+    it (see SequentialList.neighbours), which is only known at the end,
+    so they are held back and every later row goes to a temporary
+    .part file that close() copies in behind them.
+    """
+    def __init__(self, path, headings):
+        self.path = path
+        self.headings = headings
+        self.first_rows = []    # rows of the first element, their preceded by column still unknown
+        self.fp = None          # the .part file, opened with the first later row
+        self.writer = None
+        self.rows = 0
+
+    def write(self, row, first=False):
+        if first:
+            self.first_rows.append(row)
+        else:
+            if self.fp is None:
+                self.fp = open(self.path + ".part", "w")
+                self.writer = csv.writer(self.fp)
+            self.writer.writerow(row)
+        self.rows += 1
+
+    def close(self, first_prec_by):
+        """
+        Write the finished file: headings, the held rows with the label
+        of the last element filled in, then the rest.
+
+        In:     label of the last element of the policy.
+        Out:    N/A
+        """
+        with open(self.path, "w") as fp:
+            csv_writer = csv.writer(fp)
+            csv_writer.writerow(self.headings)
+            csv_writer.writerows(row[:2] + (first_prec_by,) + row[3:] for row in self.first_rows)
+        if self.fp is not None:
+            self.fp.close()
+            with open(self.path + ".part", "rb") as part, open(self.path, "ab") as fp:
+                shutil.copyfileobj(part, fp)
+            os.remove(self.path + ".part")
+
+    def discard(self):
+        if self.fp is not None:
+            self.fp.close()
+            os.remove(self.path + ".part")
+
+def with_neighbours(elements):
+    """
+    In:     iterable of (content string, tag type, tag index) in
+            sequential order.
+    Out:    generator of (sequential index, content string, tag type,
+            tag index, label, preceded by, proceeded by), one element
+            behind the input.  The first element is preceded by None,
+            because that is the last element's label.
+    """
+    previous = None
+    prec_by = None
+    for i, (text, kind, tag_index) in enumerate(elements):
+        label = kind + str(tag_index)
+        if previous is not None:
+            yield previous + (prec_by, label)
+            prec_by = previous[4]
+        previous = (i, text, kind, tag_index, label)
+    if previous is not None:
+        yield previous + (prec_by, "None")
+
+def stream_policy(fname, html_file, auto_stripped_text, key=None, suffix=None):
+    """
+    parse_policy for --stream.  The html is read from a memory map by
+    stream_elements, and every element goes straight to the sequential
+    and tag outputs, the coverage check and, in batches of
+    STREAM_SENTENCE_BATCH elements, the sentence outputs, so the policy
+    never exists in memory as a whole.  Because coverage is only known
+    at the end, sentences are extracted on the assumption that parsing
+    succeeds and thrown away if it doesn't.  The outputs are identical
+    to parse_policy with the lxml backend.  With a store, elements and
+    sentences are also collected for it, as parse_policy does.
 
-def start_process(i, failed):
+    In:     policy filename, path to its html file, stripped text,
+            optional incremental digest and filename suffix (default:
+            the run timestamp).
+    Out:    PolicyResult, or None if lxml can't read the html.
     """
-    Set inter-process shared values to global so they can be accessed.
+    if suffix is None:
+        suffix = timestamp
+
+    # build all the output files
+    outfile_sequential = parser_output_folder + fname[:-5] + suffix + "_sequential.txt"
+    outfile_paragraphs = parser_output_folder + fname[:-5] + suffix + "_paragraphs.csv"
+    outfile_headers = parser_output_folder + fname[:-5] + suffix + "_headers.csv"
+    outfile_lists = parser_output_folder + fname[:-5] + suffix + "_lists.csv"
+    outfile_compare = parser_output_folder + fname[:-5] + suffix + "_compare.txt"
+    outfile_sentences = tokenizer_output_folder + fname[:-5] + suffix + "_sentences.csv"
+    output_files = []
+
+    tag_outputs = [("p", "paragraphs", outfile_paragraphs), ("h", "headers", outfile_headers), ("l", "lists", outfile_lists)]
+    tag_writers = {kind: StreamingCsv(path, TAG_HEADINGS) for kind, name, path in tag_outputs if name in outputs}
+    sentence_writer = StreamingCsv(outfile_sentences, SENTENCE_HEADINGS) if "sentences" in outputs else None
+    kind_counts = {"p": 0, "h": 0, "l": 0}  # position of each element in its tag list
+    rule_hits = dict.fromkeys(list(rule_dict) + ["GOOD"], 0)
+    sentence_lengths = []
+    rows = [] if store is not None else None
+    sentences_list = [] if store is not None else None
+    tracker = CoverageTracker(auto_stripped_text)
+    batch = []
+    last_label = None
+
+    def extract_batch():
+        # extract_sentences for the elements in batch
+        texts = [element[1] for element in batch]
+        if memo is not None:
+            segmented, masks = memo.segment_and_evaluate(texts)
+        else:
+            segmented = segmenter.segment_many(texts)
+            masks = rule_engine.evaluate_batch([sentence for sentences in segmented for sentence in sentences])
+        for name, count in rule_engine.count(masks).items():
+            rule_hits[name] += count
+        masks = iter(masks)
+        for (i, text, kind, tag_index, label, prec_by, proc_by), sentences in zip(batch, segmented):
+            for j, sentence in enumerate(sentences, start=0):
+                sentence_tuple = (i, label, prec_by, proc_by, j, sentence, len(sentence.split()),
+                                  "-".join(rule_engine.names_for(next(masks))))
+                if sentence_writer is not None:
+                    sentence_writer.write(sentence_tuple, first=i == 0)
+                if sentences_list is not None:
+                    sentences_list.append(sentence_tuple)
+                sentence_lengths.append(len(sentence.split()))
+        batch.clear()
+
+    sequential_fp = open(outfile_sequential, "a") if "sequential" in outputs else None
+    try:
+        for element in with_neighbours(stream_elements(mapped_chunks(html_file))):
+            i, text, kind, tag_index, label, prec_by, proc_by = element
+            last_label = label
+            if sequential_fp is not None:
+                sequential_fp.write(label + "\n" + text + "\n")
+            if kind in tag_writers:
+                tag_writers[kind].write((i, kind_counts[kind], prec_by, proc_by, text), first=i == 0)
+            kind_counts[kind] += 1
+            if rows is not None:
+                rows.append((i, kind, tag_index, prec_by, proc_by, text))
+            tracker.add(text)
+            if kind in ("p", "h"):
+                batch.append(element)
+                if len(batch) >= STREAM_SENTENCE_BATCH:
+                    extract_batch()
+        if batch:
+            extract_batch()
+    except etree.LxmlError as e:
+        print("Skipping " + fname + " because it can't be read by lxml.")
+        for writer in list(tag_writers.values()) + [sentence_writer]:
+            if writer is not None:
+                writer.discard()
+        if sequential_fp is not None:
+            sequential_fp.close()
+            os.remove(outfile_sequential)
+        return None
+    if sequential_fp is not None:
+        sequential_fp.close()
+
+    # the first element is preceded by the last one
+    if rows:
+        rows[0] = rows[0][:3] + (last_label,) + rows[0][4:]
+    if sentences_list:
+        sentences_list[:] = [row[:2] + (last_label,) + row[3:] if row[0] == 0 else row for row in sentences_list]
+    for kind, name, path in tag_outputs:
+        if kind in tag_writers and tag_writers[kind].rows > 0:
+            tag_writers[kind].close(last_label)
+            output_files.append(path)
+    if sequential_fp is not None:
+        output_files.append(outfile_sequential)
+
+    # Decide whether the parsing was successful
+    coverage = tracker.coverage()
+    if coverage.failed():
+        # parsing failed --> the sentences were extracted for nothing
+        if sentence_writer is not None:
+            sentence_writer.discard()
+        rule_hits = dict.fromkeys(rule_hits, 0)
+        sentence_lengths = []
+        remaining_sentences = coverage.remaining_sentences()
+        if "compare" in outputs:
+            with open(outfile_compare, "a") as fp:
+                fp.write("\n\n".join(remaining_sentences) + "\n")
+            output_files.append(outfile_compare)
+        status = fname[:-5] + " has " + str(len(remaining_sentences)) + " left.\n"
+        if store is not None:
+            store.write_policy(fname[:-5], False, coverage.ratio, coverage.remaining_text, rule_hits,
+                               sentence_lengths, rows, [])
+        return PolicyResult(fname, key, suffix, False, rule_hits, sentence_lengths, status, output_files)
+    else:
+        if sentence_writer is not None:
+            sentence_writer.close(last_label)
+            output_files.append(outfile_sentences)
+        status = fname[:-5] + " has " + str(rule_hits["GOOD"]) + " good sentences.\n"
+        if store is not None:
+            store.write_policy(fname[:-5], True, coverage.ratio, coverage.remaining_text, rule_hits,
+                               sentence_lengths, rows, sentences_list)
+        return PolicyResult(fname, key, suffix, True, rule_hits, sentence_lengths, status, output_files)
+
+def configure(rules, parser_output, tokenizer_output, backend_name="html.parser", segmenter_name="punkt",
+              store_path=None, output_names=None, run_timestamp=None, streaming=False):
+    """
+    Set the module globals every parsing function reads.  Called from
+    __main__ below, from every pool worker in start_process, and by
+    anything else that imports this script to parse policies (e.g. the
+    crawler's pipeline mode) before it forks its workers.
+
+    In:     rules json file, parser and tokenizer output folders (with
+            trailing slash), BeautifulSoup backend, segmenter name,
+            optional SQLite store file, optional list of OUTPUTS to
+            write (default: all of them, or none with a store),
+            optional timestamp suffix (default: now), whether
+            process_policy streams the html (see stream_policy).
+    Out:    N/A
+    """
+    global rule_dict, rule_engine, backend, segmenter, store, outputs, parser_output_folder, tokenizer_output_folder, timestamp, stream
+    rule_dict = build_rule_dict(rules)
+    rule_engine = RuleEngine(rule_dict)
+    backend = backend_name
+    segmenter = get_segmenter(segmenter_name)   # loaded once here, inherited by every worker
+    store = OutputStore(store_path) if store_path else None
+    if output_names is not None:
+        outputs = set(output_names)
+    else:
+        outputs = set() if store is not None else set(OUTPUTS)
+    parser_output_folder = parser_output
+    tokenizer_output_folder = tokenizer_output
+    timestamp = run_timestamp or "_{0:%Y%m%d-%H%M%S}".format(datetime.datetime.now())
+    stream = streaming
+
+class StatusWriter:
+    """
+    Parent-side sink for the outcome of every policy.  Workers only
+    return their status line with the PolicyResult; the parent hands
+    each result to add() as it arrives, so err.txt and success.txt are
+    only ever opened by one process, batch_size lines at a time, and
+    the failure count needs no shared Value.
+    """
+    def __init__(self, folder, batch_size=100):
+        self.folder = folder
+        self.batch_size = batch_size
+        self.lines = {"success.txt": [], "err.txt": []}
+        self.num_failed_policies = 0
+
+    def add(self, result):
+        if not result.success:
+            self.num_failed_policies += 1
+        if "status" in outputs:
+            name = "success.txt" if result.success else "err.txt"
+            self.lines[name].append(result.status)
+            if len(self.lines[name]) >= self.batch_size:
+                self.flush(name)
+
+    def flush(self, name=None):
+        """
+        Append the buffered lines of one status file, or of both.
+        """
+        for name in [name] if name is not None else list(self.lines):
+            if self.lines[name]:
+                with open(self.folder + name, "a") as fp:
+                    fp.write("".join(self.lines[name]))
+                self.lines[name] = []
+
+def finish_run(results, num_successful_policies, processes):
+    """
+    Everything done once all policies are parsed: the rule bar and rule
+    histogram figures drawn from the numbers the workers returned.
+
+    In:     list of PolicyResults (skipped policies already removed),
+            number of successfully parsed policies, number of processes
+            for the figures.
+    Out:    N/A
+    """
+    policy_sentence_stats = [(result.rule_hits, result.fname, result.sentence_lengths) for result in results if result.success]
+
+    if "rule_bar" in outputs:
+        rendered = [result for result in results if result.success and not result.reused]
+        for result in rendered:
+            result.output_files.append(tokenizer_output_folder + result.fname[:-5] + result.suffix + "_rule_bar.png")
+        render_rule_bars([(result.rule_hits, result.output_files[-1]) for result in rendered], processes)
+    if "rule_hists" in outputs:
+        print("Generating last rule histogram...")
+        rule_hits_list = [rule_hits for rule_hits,fname,sentence_lengths in policy_sentence_stats]
+        lengths_list = [sentence_lengths for rule_hits,fname,sentence_lengths in policy_sentence_stats]
+        generate_rule_hist_figs([fname for rule_hits,fname,sentence_lengths in policy_sentence_stats], rule_hits_list,
+                                lengths_list, num_successful_policies, rule_dict, tokenizer_output_folder + "rule_hists.png")
+
+def report_rss(results, outfile=None):
+    """
+    Peak RSS of the worker while it parsed each policy, and how far it
+    grew over what the worker already held before that policy.
+
+    In:     list of PolicyResults, optional csv file to write every
+            policy's numbers to.
+    Out:    summary string.
+    """
+    measured = sorted((result for result in results if result.rss is not None), key=lambda result: result.rss[1])
+    if not measured:
+        return "Peak RSS: no policies were parsed."
+    if outfile is not None:
+        with open(outfile, "w") as fp:
+            csv_writer = csv.writer(fp)
+            csv_writer.writerow(("Policy", "RSS Before (bytes)", "Peak RSS (bytes)"))
+            csv_writer.writerows((result.fname, result.rss[0], result.rss[1]) for result in measured)
+    summary = ("Peak RSS per policy: median " + str(round(measured[len(measured) // 2].rss[1] / 1e6, 1)) + " MB, max " +
+               str(round(measured[-1].rss[1] / 1e6, 1)) + " MB (" + measured[-1].fname + ")")
+    growth = sorted(result.rss[1] - result.rss[0] for result in measured if result.rss[0] is not None)
+    if growth:
+        summary += ", growth while parsing: median " + str(round(growth[len(growth) // 2] / 1e6, 1)) + " MB, max " + str(round(growth[-1] / 1e6, 1)) + " MB"
+    return summary
+
+def start_process(i, handles, sentence_memo):
+    """
+    Set inter-process shared values to global so they can be accessed,
+    and set up the parser from the settings broadcast by the parent, so
+    the workers don't depend on globals inherited through fork.
     Ignore SIGINT in child workers, will be handled to enable restart.
     """
     signal.signal(signal.SIGINT, signal.SIG_IGN)
-    global index, num_failed_policies
+    global index, dataset_html, dataset_text, files, manifest, settings_key, memo
     index = i
-    num_failed_policies = failed
+    artifacts = attach(handles)
+    dataset_html, dataset_text, files, settings_key = artifacts["settings"]
+    manifest = artifacts["manifest"]
+    configure(*artifacts["configuration"])
+    memo = sentence_memo
+    if memo is not None:
+        memo.segmenter = segmenter
+        memo.rule_engine = rule_engine
 
 if __name__ == '__main__':
     argparse = argparse.ArgumentParser(description="Parse input HTML documents and tokenize sentences from each policy.")
@@ -349,17 +1490,85 @@ if __name__ == '__main__':
                             help="directory to dump outputs from the parser (paragraph/header/sequential.csv files, etc.).")
     argparse.add_argument(  "tokenizer_output_folder",
                             help="directory to dump outputs from the tokenizer (sentences.csv, statistics, etc.")
+    argparse.add_argument(  "-b", "--backend",
+                            default="html.parser",
+                            choices=["html.parser", "lxml", "html5lib"],
+                            required=False,
+                            help="BeautifulSoup tree builder.  lxml is much faster than the default pure-Python html.parser but may build a slightly different tree for malformed html.")
+    argparse.add_argument(  "--segmenter",
+                            default="punkt",
+                            choices=list(SEGMENTERS),
+                            required=False,
+                            help="sentence segmenter.  punkt (the same as sent_tokenize) is the accurate reference; punkt_policy adds privacy policy abbreviations such as \"Inc.\" and \"e.g.\"; regex is roughly 3x faster for bulk runs.  See python -m statistics.segmenters.")
+    argparse.add_argument(  "-s", "--store",
+                            default=None,
+                            required=False,
+                            help="SQLite file to write every policy's elements, sentences and statistics to, in one transaction per policy.  When given, no per-policy files are written unless also selected with --outputs.")
+    argparse.add_argument(  "-o", "--outputs",
+                            nargs="*",
+                            default=None,
+                            choices=OUTPUTS,
+                            required=False,
+                            help="files to write (default: all of them, or none with --store).  status is err.txt/success.txt; rule_bar and rule_hists figures are drawn after parsing has finished.")
+    argparse.add_argument(  "-i", "--incremental",
+                            action="store_true",
+                            help="don't clear the output folders; name outputs after a digest of each policy's inputs and the parser settings, record them in parser_output_folder/manifest.json, and only parse policies that are new or changed since the last incremental run.")
+    argparse.add_argument(  "-c", "--chunksize",
+                            type=int,
+                            default=1,
+                            required=False,
+                            help="policies handed to a worker at a time.  Policies are dispatched largest first, so small chunks keep every worker busy until the end.")
+    argparse.add_argument(  "--start_method",
+                            default="fork",
+                            choices=["fork", "spawn", "forkserver"],
+                            required=False,
+                            help="multiprocessing start method for the worker pool.")
+    argparse.add_argument(  "-m", "--memo",
+                            default=None,
+                            required=False,
+                            help="sqlite file memoizing the sentences and rule hits of every element, shared by all workers and kept between runs, so boilerplate repeated across policies is only tokenized once.  Created if it does not exist.")
+    argparse.add_argument(  "--memo_size",
+                            type=int,
+                            default=200000,
+                            required=False,
+                            help="maximum number of elements kept in the sentence memo.")
+    argparse.add_argument(  "--stream",
+                            action="store_true",
+                            help="parse every policy straight from a memory map of its file with lxml's incremental parser, writing elements and sentences as they are found, so memory doesn't grow with the size of the policy.  Outputs are identical to -b lxml, which it requires.  Also writes every policy's peak RSS to parser_output_folder/peak_rss.csv.")
+    argparse.add_argument(  "--benchmark",
+                            action="store_true",
+                            help="instead of parsing, time the recursive and iterative tree walks with every backend over dataset_html and report pages/sec and peak memory, then time the parse coverage check.")
     args = argparse.parse_args()
+    if args.stream and args.backend != "lxml":
+        argparse.error("--stream parses with lxml, so its outputs match -b lxml; use the two together.")
+    set_start_method(args.start_method, force=True)    # before any shared Value or Lock is created
     dataset_html = args.dataset_html
     dataset_text = args.dataset_text
-    parser_output_folder = args.parser_output_folder
-    tokenizer_output_folder = args.tokenizer_output_folder
-    rule_dict = build_rule_dict(args.rules)
-    mkdir_clean(parser_output_folder)
-    mkdir_clean(tokenizer_output_folder)
-    timestamp = "_{0:%Y%m%d-%H%M%S}".format(datetime.datetime.now())
+    configuration = (args.rules, args.parser_output_folder, args.tokenizer_output_folder, args.backend, args.segmenter,
+                     args.store, args.outputs, "_{0:%Y%m%d-%H%M%S}".format(datetime.datetime.now()), args.stream)
+    configure(*configuration)
+    if args.benchmark:
+        files = [name for name in os.listdir(dataset_html) if os.path.isfile(os.path.join(dataset_html, name))]
+        benchmark(files, ["html.parser", "lxml", "html5lib"])
+        sys.exit(0)
+    if args.incremental:
+        # keep the previous outputs, they are reused wherever the inputs haven't changed
+        os.makedirs(parser_output_folder, exist_ok=True)
+        os.makedirs(tokenizer_output_folder, exist_ok=True)
+        remove_files([parser_output_folder + "err.txt", parser_output_folder + "success.txt"])
+        manifest_file = parser_output_folder + "manifest.json"
+        manifest = load_manifest(manifest_file)
+        with open(args.rules, "r") as fp:
+            settings_key = digest(fp.read(), PARSER_VERSION, backend, segmenter.name, sorted(outputs), args.store or "")
+    else:
+        mkdir_clean(parser_output_folder)
+        mkdir_clean(tokenizer_output_folder)
+        manifest = None
+        settings_key = None
     parse_index = Value("i",0)          # shared val, index of current parsed file
-    num_failed_policies = Value("i",0)  # shared val, number of policies on which parsing failed at some point
+    if args.memo:
+        with open(args.rules, "r") as fp:
+            memo = SentenceMemo(args.memo, segmenter, rule_engine, digest(fp.read(), PARSER_VERSION), args.memo_size)
 
     # use this for the entire dataset
     files = [name for name in os.listdir(dataset_html) if os.path.isfile(os.path.join(dataset_html, name))]
@@ -373,25 +1582,46 @@ if __name__ == '__main__':
     # https://docs.python.org/3.7/library/multiprocessing.html#sharing-state-between-processes
     # https://docs.python.org/3/library/multiprocessing.html#multiprocessing.Value
     # https://stackoverflow.com/questions/44774853/exit-multiprocesses-gracefully-in-python3
-    pool_size = cpu_count() * 2
-    matplotlib.use("agg")   # don't know why this works, but allows matplotlib to execute in child procs
-    pool = Pool(
-        processes=pool_size,
-        initializer=start_process,
-        initargs=(parse_index, num_failed_policies)
-    )
-    policy_sentence_stats = pool.map(process_policy, files) # map keeps domain_list order
-    pool.close()  # no more tasks
-    pool.join()   # merge all child processes
-
-    # remove policies that failed parsing
-    policy_sentence_stats = list(filter(None, policy_sentence_stats))
-    num_successful_policies = total_files - num_failed_policies.value
-
-    print("Generating last rule histogram...")
-    rule_hits_list = [rule_hits for rule_hits,fname,sentence_lengths in policy_sentence_stats]
-    lengths_list = [sentence_lengths for rule_hits,fname,sentence_lengths in policy_sentence_stats]
-    generate_rule_hist_figs(files, rule_hits_list, lengths_list, num_successful_policies, rule_dict, tokenizer_output_folder + "rule_hists.png")
+    # the settings and manifest are published once, tasks only carry a filename
+    broadcast = Broadcast()
+    try:
+        broadcast.publish("settings", (dataset_html, dataset_text, files, settings_key))
+        broadcast.publish("manifest", manifest)
+        broadcast.publish("configuration", configuration)
+        pool_size = cpu_count() * 2
+        matplotlib.use("agg")   # don't know why this works, but allows matplotlib to execute in child procs
+        pool = Pool(
+            processes=pool_size,
+            initializer=start_process,
+            initargs=(parse_index, broadcast.handles(), memo)
+        )
+        scheduler = Scheduler(args.chunksize)
+        status = StatusWriter(parser_output_folder)
+        results = []
+        for i, result in scheduler.imap(pool, process_policy, files, file_sizes(dataset_html, files)):
+            if result is not None:  # skip policies that had no contents
+                results.append(result)
+                status.add(result)
+        status.flush()
+        pool.close()  # no more tasks
+        pool.join()   # merge all child processes
+    finally:
+        broadcast.close()   # the shared memory blocks would outlive a failed run otherwise
+    print(scheduler.report())
+    if memo is not None:
+        print("Sentence memo: " + memo.stats())
+    if stream:
+        print(report_rss(results, parser_output_folder + "peak_rss.csv"))
+
+    # draw the figures
+    num_successful_policies = total_files - status.num_failed_policies
+    finish_run(results, num_successful_policies, pool_size)
+    if manifest is not None:
+        for fname in set(manifest) - set(result.fname for result in results):
+            remove_files(manifest[fname]["output_files"])   # policy removed from (or now skipped in) the dataset
+        save_manifest(manifest_file, {result.fname: result.to_manifest() for result in results})
+        print("Reused " + str(sum(1 for result in results if result.reused)) + " and parsed " +
+              str(sum(1 for result in results if not result.reused)) + " policies.")
 
     print("Successfully parsed " + str(round((num_successful_policies / total_files) * 100, 2)) + "% of the " + str(total_files) + " files.")
     print("Done")
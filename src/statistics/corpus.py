@@ -0,0 +1,320 @@
+"""
+Privacy Policy Project
+corpus.py
+Domain, paragraph, header, list and sentence statistics of a whole
+corpus of parser and tokenizer outputs, in one streaming pass.
+domains.py, lists.py, sentences.py and paragraph_sampler.py each list
+and re-read the output folders on their own, and sentences.py even
+tokenizes paragraphs.csv again.  CorpusStats reads every
+*_paragraphs.csv, *_headers.csv, *_lists.csv and *_sentences.csv once,
+row by row, and keeps only a small summary of each file (counts and
+histograms, never text), together with the file's size and
+modification time.  Saved summaries let update() read only the files
+that are new or have changed since the last run and forget the ones
+that are gone, so the statistics follow the output folders as new
+outputs arrive.  Runnable as a standalone script.
+"""
+
+import argparse, json, os, re, signal, time
+from collections import Counter
+from csv import reader, writer
+from multiprocessing import Pool, cpu_count
+from operator import itemgetter, methodcaller
+from utils.scheduler import Scheduler
+
+STATS_VERSION = 1   # bump whenever summarize_file changes what it counts, so saved summaries are thrown away
+KINDS = ["paragraphs", "headers", "lists", "sentences"]
+OUTPUT_FILE = re.compile(r"^(?P<policy>.+)_(?:\d{8}-\d{6}|[0-9a-f]{16})_(?P<kind>" + "|".join(KINDS) + r")\.csv$")
+
+def summarize_file(task):
+    """
+    Summarize one parser or tokenizer output file.  Paragraphs and
+    headers are counted by words, lists by items (one line per item,
+    plus one for a list prefix), and sentences by the word count and
+    rule hits the tokenizer already wrote down.
+
+    In:     (path to the csv file, its kind).
+    Out:    dict of "rows" -> number of rows, "sizes" -> histogram of
+            words or items per row as {str(size): count}, and for
+            sentences "rule_hits" -> {"-"-joined rule names: count}.
+    """
+    path, kind = task
+    rule_hits = Counter()
+    with open(path, "r", newline="") as fp:
+        csv_reader = reader(fp)
+        next(csv_reader, None)  # headings
+        if kind == "sentences":
+            pairs = Counter(map(itemgetter(6, 7), csv_reader))
+            sizes = Counter()
+            for (words, names), n in pairs.items():
+                sizes[words] += n
+                rule_hits[names] += n
+        elif kind == "lists":
+            sizes = Counter(map(methodcaller("count", "\n"), map(itemgetter(4), csv_reader)))
+        else:
+            sizes = Counter(map(len, map(str.split, map(itemgetter(4), csv_reader))))
+    summary = {"rows": sum(sizes.values()), "sizes": {str(size): n for size, n in sizes.items()}}
+    if kind == "sentences":
+        summary["rule_hits"] = dict(rule_hits)
+    return summary
+
+def histogram_stats(histogram):
+    """
+    In:     Counter of value -> number of times it occurs.
+    Out:    (total count, mean, median) of the values, zeros if empty.
+    """
+    count = sum(histogram.values())
+    if count == 0:
+        return 0, 0.0, 0
+    seen = 0
+    for value in sorted(histogram):
+        seen += histogram[value]
+        if seen * 2 >= count:
+            median = value
+            break
+    return count, sum(value * n for value, n in histogram.items()) / count, median
+
+class CorpusStats():
+    """
+    Per-file summaries of every output file seen, keyed by path, and
+    the statistics derived from them.  Every aggregate is recomputed
+    from the summaries when asked for, so a changed or removed file
+    never leaves stale counts behind.
+    """
+    def __init__(self):
+        self.files = {}     # path -> {"policy", "kind", "size", "mtime", "summary"}
+        self.aggregates = None  # policies() until the files change
+
+    def load(self, path):
+        """
+        Read summaries saved by save().  Summaries from a different
+        STATS_VERSION are ignored.
+        """
+        if not os.path.isfile(path):
+            return
+        with open(path, "r") as fp:
+            state = json.load(fp)
+        if state.get("version") == STATS_VERSION:
+            self.files = state["files"]
+            self.aggregates = None
+
+    def save(self, path):
+        """
+        Write the summaries atomically, like the parser's manifest.
+        """
+        with open(path + ".tmp", "w") as fp:
+            fp.write(json.dumps({"version": STATS_VERSION, "files": self.files}))   # dumps() is much faster than dump()
+        os.replace(path + ".tmp", path)
+
+    def update(self, folders, processes=1):
+        """
+        Scan the folders, summarize every output file that is new or
+        has a different size or modification time than when it was
+        last summarized, and drop the summaries of files that are gone.
+        With more than one process and more than one file to read, the
+        files are spread over a pool, largest first.
+
+        In:     list of folders (with trailing slash), number of
+                processes.
+        Out:    (number of files read, number of files dropped).
+        """
+        found = {}      # path -> (policy, kind, size, mtime)
+        for folder in folders:
+            with os.scandir(folder) as entries:
+                for entry in entries:
+                    match = OUTPUT_FILE.match(entry.name)
+                    if match is not None and entry.is_file():
+                        stat = entry.stat()
+                        found[folder + entry.name] = (match.group("policy"), match.group("kind"), stat.st_size, stat.st_mtime_ns)
+        self.aggregates = None
+        removed = [path for path in self.files if path not in found]
+        for path in removed:
+            del self.files[path]
+        changed = [path for path, (policy, kind, size, mtime) in found.items()
+                   if path not in self.files or (self.files[path]["size"], self.files[path]["mtime"]) != (size, mtime)]
+        tasks = [(path, found[path][1]) for path in changed]
+        if processes > 1 and len(tasks) > 1:
+            pool = Pool(processes=processes, initializer=signal.signal, initargs=(signal.SIGINT, signal.SIG_IGN))
+            summaries = Scheduler(chunksize=16).imap(pool, summarize_file, tasks, [found[path][2] for path in changed])
+        else:
+            pool = None
+            summaries = enumerate(map(summarize_file, tasks))
+        try:
+            for i, summary in summaries:
+                policy, kind, size, mtime = found[changed[i]]
+                self.files[changed[i]] = {"policy": policy, "kind": kind, "size": size, "mtime": mtime, "summary": summary}
+        finally:
+            if pool is not None:
+                pool.close()
+                pool.join()
+        return len(changed), len(removed)
+
+    def policies(self):
+        """
+        Out:    dict of policy name -> {"paragraphs", "headers", "lists",
+                "sentences": number of each, "paragraph_words",
+                "header_words", "list_items", "sentence_words": totals,
+                "rule_hits": Counter of rule name -> sentences hit}.
+                Computed once per update() and shared by the callers.
+        """
+        if self.aggregates is not None:
+            return self.aggregates
+        totals = {"paragraphs": "paragraph_words", "headers": "header_words", "lists": "list_items", "sentences": "sentence_words"}
+        policies = {}
+        for entry in self.files.values():
+            policy = policies.setdefault(entry["policy"], dict({kind: 0 for kind in KINDS}, **{total: 0 for total in totals.values()},
+                                                               rule_hits=Counter()))
+            summary = entry["summary"]
+            policy[entry["kind"]] += summary["rows"]
+            policy[totals[entry["kind"]]] += sum(int(size) * n for size, n in summary["sizes"].items())
+            for names, n in summary.get("rule_hits", {}).items():
+                for name in names.split("-"):
+                    policy["rule_hits"][name] += n
+        self.aggregates = policies
+        return policies
+
+    def domains(self):
+        """
+        Out:    Counter of domain -> number of its policies, the domain
+                being the policy name up to the first underscore (as in
+                domains.py).
+        """
+        return Counter(policy.split("_", 1)[0] for policy in self.policies())
+
+    def histogram(self, kind):
+        """
+        In:     one of KINDS.
+        Out:    Counter of words (items for lists) per row -> number of
+                rows, over the whole corpus.
+        """
+        histogram = Counter()
+        for entry in self.files.values():
+            if entry["kind"] == kind:
+                for size, n in entry["summary"]["sizes"].items():
+                    histogram[int(size)] += n
+        return histogram
+
+    def report(self):
+        """
+        Out:    multi-line string summarizing the corpus.
+        """
+        policies = self.policies()
+        if not policies:
+            return "No parser or tokenizer outputs found."
+        domains = self.domains()
+        domain, most = domains.most_common(1)[0]
+        lines = ["Policies: " + str(len(policies)) + " from " + str(len(domains)) + " domains (at most " + str(most) +
+                 ", from " + domain + ")"]
+        for kind, unit in (("paragraphs", "words"), ("headers", "words"), ("lists", "items"), ("sentences", "words")):
+            count, mean, median = histogram_stats(self.histogram(kind))
+            per_policy = sorted(policy[kind] for policy in policies.values())
+            lines.append(kind.capitalize().ljust(11) + str(count).rjust(10) + " total, median " + str(per_policy[len(per_policy) // 2]) +
+                         " per policy, " + unit + " per " + kind[:-1] + ": median " + str(median) + ", mean " + str(round(mean, 1)))
+        rule_hits = Counter()
+        for policy in policies.values():
+            rule_hits.update(policy["rule_hits"])
+        sentences = sum(policy["sentences"] for policy in policies.values())
+        if sentences:
+            lines.append("Rule hits: " + ", ".join(name + " " + str(n) + " (" + str(round(n / sentences * 100, 1)) + "%)"
+                                                   for name, n in rule_hits.most_common()))
+        return "\n".join(lines)
+
+    def write_policies(self, outfile):
+        """
+        Write one row of statistics per policy to a csv file.
+        """
+        policies = self.policies()
+        names = sorted(set(name for policy in policies.values() for name in policy["rule_hits"]))
+        headings = ["Policy", "Paragraphs", "Paragraph Words", "Headers", "Header Words", "Lists", "List Items",
+                    "Sentences", "Sentence Words"] + names
+        with open(outfile, "w") as fp:
+            csv_writer = writer(fp)
+            csv_writer.writerow(headings)
+            for name in sorted(policies):
+                policy = policies[name]
+                csv_writer.writerow([name, policy["paragraphs"], policy["paragraph_words"], policy["headers"], policy["header_words"],
+                                     policy["lists"], policy["list_items"], policy["sentences"], policy["sentence_words"]] +
+                                    [policy["rule_hits"][rule] for rule in names])
+
+    def draw_figures(self, output_folder, rules=None):
+        """
+        The figures of domains.py and lists.py for the whole corpus, and
+        with a rules file the rule histograms of sentences.py, drawn
+        from the summaries.
+        """
+        import matplotlib
+        matplotlib.use("agg")
+        from statistics.domains import generate_domain_hist
+        from statistics.lists import generate_boxplots
+        from statistics.sentences import build_rule_dict, generate_rule_hist_figs
+        generate_domain_hist(self.domains(), output_folder + "domain_hist.pdf")
+        policies = [policy for policy in self.policies().values() if policy["lists"] > 0]
+        if policies:
+            generate_boxplots([policy["lists"] for policy in policies],
+                              [policy["list_items"] / policy["lists"] for policy in policies], output_folder)
+        if rules is not None:
+            by_policy = {}
+            for entry in self.files.values():
+                if entry["kind"] == "sentences":
+                    lengths = by_policy.setdefault(entry["policy"], [])
+                    for size, n in entry["summary"]["sizes"].items():
+                        lengths.extend([int(size)] * n)
+            policies = self.policies()
+            names = sorted(by_policy)
+            generate_rule_hist_figs(names, [policies[name]["rule_hits"] for name in names], [by_policy[name] for name in names],
+                                    len(names), build_rule_dict(rules), output_folder + "rule_hists.pdf")
+
+if __name__ == '__main__':
+    argparse = argparse.ArgumentParser(description="Corpus statistics of parser and tokenizer outputs in one pass, updated incrementally.")
+    argparse.add_argument(  "output_dirs",
+                            nargs="+",
+                            help="parser and/or tokenizer output directories.")
+    argparse.add_argument(  "-o", "--output_folder",
+                            default="./corpus_stats_output/",
+                            required=False,
+                            help="directory for the saved summaries, corpus_stats.csv and figures.  Created if it does not exist and kept between runs, so only new or changed outputs are read again.")
+    argparse.add_argument(  "-p", "--processes",
+                            type=int,
+                            default=cpu_count(),
+                            required=False,
+                            help="number of processes reading output files.")
+    argparse.add_argument(  "-f", "--figures",
+                            action="store_true",
+                            help="also draw the domain histogram and list boxplots.")
+    argparse.add_argument(  "-r", "--rules",
+                            default=None,
+                            required=False,
+                            help="json file containing list of sentence rules, to also draw the rule histograms with --figures.")
+    argparse.add_argument(  "-w", "--watch",
+                            type=float,
+                            default=0,
+                            required=False,
+                            help="keep watching the output directories, updating the statistics every WATCH seconds until interrupted.")
+    args = argparse.parse_args()
+    folders = [os.path.join(folder, "") for folder in args.output_dirs]
+    output_folder = os.path.join(args.output_folder, "")
+    os.makedirs(output_folder, exist_ok=True)
+    state_file = output_folder + "corpus_stats.json"
+
+    stats = CorpusStats()
+    stats.load(state_file)
+    first = True
+    while True:
+        start = time.perf_counter()
+        read, dropped = stats.update(folders, args.processes)
+        print("Read " + str(read) + " new or changed files and dropped " + str(dropped) + " in " +
+              str(round(time.perf_counter() - start, 2)) + " sec, " + str(len(stats.files)) + " files summarized.")
+        if read or dropped or first:
+            stats.save(state_file)
+            stats.write_policies(output_folder + "corpus_stats.csv")
+            print(stats.report())
+            if args.figures:
+                stats.draw_figures(output_folder, args.rules)
+        if args.watch <= 0:
+            break
+        first = False
+        try:
+            time.sleep(args.watch)
+        except KeyboardInterrupt:
+            break
+    print("Done")
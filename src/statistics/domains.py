@@ -8,16 +8,14 @@ domain were parsed.
 """
 
 import argparse, datetime, matplotlib, matplotlib.pyplot as plt, os
+from collections import Counter
 from utils.utils import mkdir_clean
 
 def count_list_freq(l): 
     """
     Find the frequency of elements in a list
     """
-    freq = {}
-    for items in l:
-        freq[items] = l.count(items)
-    return freq
+    return dict(Counter(l))
 
 def generate_domain_hist(files, outfile):
     # plt.bar(list(files.keys()), files.values(), width=.5)
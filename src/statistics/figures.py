@@ -0,0 +1,84 @@
+"""
+Privacy Policy Project
+figures.py
+Figure rendering, kept off the parsing hot path.  The parser-tokenizer
+only collects numeric rule hits and sentence lengths; the per-policy
+rule bar charts and the aggregate rule histograms are drawn afterwards,
+either by the parser-tokenizer once parsing has finished or by this
+script from an output store (see utils/store.py), in parallel and only
+for the policies asked for.
+"""
+
+import argparse, matplotlib, os
+from multiprocessing import Pool, cpu_count
+from statistics.sentences import build_rule_dict, generate_rule_bar_fig, generate_rule_hist_figs
+from utils.store import OutputStore
+from utils.utils import print_progress_bar, VerifyJsonExtension
+
+def render_rule_bar(job):
+    """
+    Pool entry point for one rule bar chart.
+
+    In:     tuple of (rule_hits dict, output file).
+    Out:    output file.
+    """
+    rule_hits, outfile = job
+    generate_rule_bar_fig(rule_hits, outfile)
+    return outfile
+
+def render_rule_bars(jobs, processes=None):
+    """
+    Draw rule bar charts in a pool of worker processes.
+
+    In:     list of (rule_hits dict, output file) tuples, optional
+            number of processes (default: one per cpu).
+    Out:    N/A
+    """
+    if len(jobs) == 0:
+        return
+    matplotlib.use("agg")
+    with Pool(processes=processes or cpu_count()) as pool:
+        for i, outfile in enumerate(pool.imap_unordered(render_rule_bar, jobs), start=1):
+            print_progress_bar(i, len(jobs), prefix = "Rule Bar Figures Progress:", suffix = "Complete", length = 50)
+
+if __name__ == '__main__':
+    argparse = argparse.ArgumentParser(description="Render rule figures from a parser-tokenizer output store.")
+    argparse.add_argument(  "store",
+                            help="SQLite file written by parser-tokenizer.py -s/--store.")
+    argparse.add_argument(  "rules",
+                            help="json file containing list of sentence rules.",
+                            action=VerifyJsonExtension)
+    argparse.add_argument(  "output_folder",
+                            help="directory to write figures to.  Will be created if does not exist.")
+    argparse.add_argument(  "-p", "--policies",
+                            nargs="+",
+                            default=None,
+                            required=False,
+                            help="only draw rule bar charts for these policies (default: every successfully parsed policy).")
+    argparse.add_argument(  "--no_bars",
+                            action="store_true",
+                            help="skip the per-policy rule bar charts.")
+    argparse.add_argument(  "--hists",
+                            action="store_true",
+                            help="also draw the aggregate rule histograms over every successfully parsed policy.")
+    argparse.add_argument(  "-n", "--processes",
+                            type=int,
+                            default=None,
+                            required=False,
+                            help="number of rendering processes (default: one per cpu).")
+    args = argparse.parse_args()
+
+    if not os.path.exists(args.output_folder):
+        os.makedirs(args.output_folder)
+    store = OutputStore(args.store)
+    if not args.no_bars:
+        stats = store.policy_stats(args.policies)
+        render_rule_bars([(rule_hits, os.path.join(args.output_folder, policy + "_rule_bar.png")) for policy, rule_hits, lengths in stats],
+                         args.processes)
+    if args.hists:
+        stats = store.policy_stats()
+        generate_rule_hist_figs([policy for policy, rule_hits, lengths in stats],
+                                [rule_hits for policy, rule_hits, lengths in stats],
+                                [lengths for policy, rule_hits, lengths in stats],
+                                len(stats), build_rule_dict(args.rules), os.path.join(args.output_folder, "rule_hists.png"))
+    print("Done")
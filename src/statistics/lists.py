@@ -3,15 +3,17 @@
 """
 Privacy Policy Project
 List Statistics
-Randomly samples policy list output files to get the number of
-lists per file.  Outputs boxplots with statistics about number of lists
-per file and the average length of the lists in the files.
+Randomly samples policy list output files (or single lists from all of
+them) to get the number of lists per file.  Outputs boxplots with
+statistics about number of lists per file and the average length of the
+lists in the files.
 """
 
 import argparse, datetime, matplotlib, matplotlib.pyplot as plt, os, signal
 from csv import reader, writer
 from multiprocessing import Pool, Value, cpu_count
-from random import sample
+from random import Random
+from statistics.sampler import CorpusIndex, read_rows
 from utils.utils import mkdir_clean, print_progress_bar
 
 class Policy:
@@ -21,27 +23,37 @@ class Policy:
         self.avg_list_len = 0
         self.lists = []
 
-def get_list_statistics(file):
+def get_list_statistics(task):
     """
     For every policy, open ip the list.csv file.  Read the number of
     entries to get the number of lists per file, then count the number
     of \n characters per list entry to figure out how many items are in
-    each list.  Get average of the items per list, report back.
+    each list.  Get average of the items per list, report back.  When
+    lists are sampled, only the sampled lists are read and the number
+    of lists comes from the index.
 
-    In:     list CSV file to read.
+    In:     (list CSV file, byte spans of the sampled lists from
+            CorpusIndex.spans() and the file's number of lists, or
+            None and None to read the whole file).
     Out:    Policy object to return to the Pool list at the end.
     """
-    with open(parser_output_dir + file, "r") as fp:
-        csv_reader = reader(fp)
-        elements = list(csv_reader)
-    
-    policy_stats = Policy(file, len(elements))
+    file, spans, num_lists = task
+    if spans is None:
+        with open(parser_output_dir + file, "r") as fp:
+            csv_reader = reader(fp)
+            next(csv_reader, None)  # headings
+            elements = list(csv_reader)
+        num_lists = len(elements)
+    else:
+        elements = read_rows(parser_output_dir + file, spans)
+
+    policy_stats = Policy(file, num_lists)
     num_items = []
     for l in elements:
         content_string = l[4]
         policy_stats.lists.append(content_string)
         num_items.append(content_string.count("\n") + 1)
-    policy_stats.avg_list_len = sum(num_items)/len(num_items)
+    policy_stats.avg_list_len = sum(num_items)/len(num_items) if num_items else 0
 
     # Update progress bar
     with index.get_lock():
@@ -92,6 +104,16 @@ if __name__ == '__main__':
                             default=0,
                             required=False,
                             help="number of files this program should read from the directory.")
+    argparse.add_argument(  "-i", "--sample_items",
+                            type=int,
+                            default=0,
+                            required=False,
+                            help="number of lists to sample from the whole directory instead of whole files.  Overrides -n.")
+    argparse.add_argument(  "-s", "--seed",
+                            type=int,
+                            default=None,
+                            required=False,
+                            help="random seed, for a reproducible sample of files or lists.")
     argparse.add_argument(  "parser_output_dir",
                             help="directory containing html files to verify.")
     argparse.add_argument(  "-o", "--output_folder",
@@ -103,14 +125,20 @@ if __name__ == '__main__':
     output_folder = args.output_folder
     mkdir_clean(output_folder)
 
-    files = [name for name in os.listdir(parser_output_dir) if name.endswith("lists.csv")]
-    try:
-        random_files = sample(files, args.num_samples)
-    except ValueError:
-        print("ValueError: args.num_samples > # files in parser_output_dir, defaulting to all files in that directory.")
-        random_files = files
-    if args.num_samples == 0:
-        random_files = files
+    if args.sample_items > 0:
+        corpus_index = CorpusIndex(["lists"])
+        corpus_index.update([parser_output_dir])
+        spans = corpus_index.spans(corpus_index.sample(args.sample_items, args.seed))
+        counts = dict(zip(corpus_index.paths, corpus_index.counts().tolist()))
+        random_files = [(os.path.basename(path), spans[path], counts[path]) for path in spans]
+    else:
+        files = sorted(name for name in os.listdir(parser_output_dir) if name.endswith("lists.csv"))
+        if args.num_samples > 0:
+            try:
+                files = Random(args.seed).sample(files, args.num_samples)
+            except ValueError:
+                print("ValueError: args.num_samples > # files in parser_output_dir, defaulting to all files in that directory.")
+        random_files = [(name, None, None) for name in files]
 
     index = Value("i",0)          # shared val, index of current parsed file
     pool_size = cpu_count() * 2
@@ -0,0 +1,135 @@
+"""
+Privacy Policy Project
+memo.py
+Corpus-wide memo of tokenized elements.  Big parts of privacy policies
+are boilerplate: the same legal templates show up on many sites, and a
+domain's _1, _2, ... policies repeat each other.  SentenceMemo keeps the
+sentences of every element together with their rule bitmasks in a
+DigestCache keyed by a digest of the element text, the segmenter and
+the rules, so repeated elements are neither segmented nor checked
+against the rules again, by any worker of this run or of later runs.
+Runnable as a standalone script to measure how much of a corpus of
+parser outputs is duplicated and how much time the memo saves.
+"""
+
+import argparse, csv, os, time
+import numpy as np
+from multiprocessing import Value
+from utils.cache import DigestCache, digest
+
+class SentenceMemo():
+    """
+    Segmentation plus rule evaluation of whole elements, memoized.
+    settings_key must change whenever the rules do.  Besides the cache's
+    own hit/miss counts, shared counters record how many characters of
+    element text were looked up and how many were served from the memo,
+    which is the corpus' boilerplate share.
+    """
+    def __init__(self, path, segmenter, rule_engine, settings_key, max_entries=200000):
+        self.cache = DigestCache(path, max_entries)
+        self.segmenter = segmenter
+        self.rule_engine = rule_engine
+        self.prefix = digest("sentences", segmenter.name, settings_key)
+        self.characters = Value("q", 0)
+        self.memo_characters = Value("q", 0)
+
+    def __getstate__(self):
+        """
+        Sent to spawned workers without the segmenter and rule engine;
+        they set their own (see start_process in parser-tokenizer.py).
+        """
+        state = self.__dict__.copy()
+        state["segmenter"] = None
+        state["rule_engine"] = None
+        return state
+
+    def segment_and_evaluate(self, texts):
+        """
+        In:     list of element texts.
+        Out:    (list of lists of sentence strings, numpy int64 array of
+                bitmasks with one entry per sentence in order), the same
+                as segment_many plus evaluate_batch.
+        """
+        keys = [digest(self.prefix, text) for text in texts]
+        found = self.cache.get_many(keys)
+        missing = {}    # key -> text, each repeated element only once
+        for key, text in zip(keys, texts):
+            if key not in found:
+                missing[key] = text
+        if missing:
+            segmented = self.segmenter.segment_many(list(missing.values()))
+            masks = self.rule_engine.evaluate_batch([sentence for sentences in segmented for sentence in sentences]).tolist()
+            computed = {}
+            position = 0
+            for key, sentences in zip(missing, segmented):
+                computed[key] = (sentences, masks[position:position + len(sentences)])
+                position += len(sentences)
+            self.cache.put_many(computed)
+            found.update(computed)
+        with self.characters.get_lock():
+            self.characters.value += sum(map(len, texts))
+        with self.memo_characters.get_lock():
+            self.memo_characters.value += sum(len(text) for key, text in zip(keys, texts) if key not in missing)
+        results = [found[key] for key in keys]
+        masks = np.fromiter((mask for sentences, element_masks in results for mask in element_masks), dtype=np.int64)
+        return [sentences for sentences, element_masks in results], masks
+
+    def stats(self):
+        """
+        Human readable hit rate and duplication summary.
+        """
+        share = self.memo_characters.value / max(self.characters.value, 1) * 100
+        return (self.cache.stats() + " of elements, " + str(round(share, 2)) + "% of " +
+                str(self.characters.value) + " characters of element text served from the memo")
+
+if __name__ == '__main__':
+    from statistics.rules import RuleEngine
+    from statistics.segmenters import get_segmenter, SEGMENTERS
+    from statistics.sentences import build_rule_dict
+    argparse = argparse.ArgumentParser(description="Measure element duplication across parser outputs and the time a sentence memo saves.")
+    argparse.add_argument(  "rules",
+                            help="json file containing list of sentence rules.")
+    argparse.add_argument(  "parser_output_dir",
+                            help="directory of parser *_paragraphs.csv and *_headers.csv files.")
+    argparse.add_argument(  "--segmenter",
+                            default="punkt",
+                            choices=list(SEGMENTERS),
+                            required=False,
+                            help="sentence segmenter.")
+    argparse.add_argument(  "--memo",
+                            default="/tmp/sentence_memo_benchmark.db",
+                            required=False,
+                            help="sqlite file for the memo.  Deleted first so the run starts cold.")
+    args = argparse.parse_args()
+
+    policies = {}
+    for fname in sorted(os.listdir(args.parser_output_dir)):
+        if fname.endswith(("_paragraphs.csv", "_headers.csv")):
+            with open(os.path.join(args.parser_output_dir, fname), "r") as fp:
+                policies.setdefault(fname.rsplit("_", 1)[0], []).extend(row[-1] for row in list(csv.reader(fp))[1:])
+    elements = [text for texts in policies.values() for text in texts]
+    print("Policies: " + str(len(policies)) + ", elements: " + str(len(elements)) + ", distinct elements: " +
+          str(len(set(elements))) + " (" + str(round((1 - len(set(elements)) / max(len(elements), 1)) * 100, 2)) + "% repeated)")
+
+    rule_engine = RuleEngine(build_rule_dict(args.rules))
+    segmenter = get_segmenter(args.segmenter)
+    start = time.perf_counter()
+    reference = []
+    for texts in policies.values():
+        segmented = segmenter.segment_many(texts)
+        reference.append((segmented, rule_engine.evaluate_batch([sentence for sentences in segmented for sentence in sentences])))
+    reference_time = time.perf_counter() - start
+
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(args.memo + suffix):
+            os.remove(args.memo + suffix)
+    with open(args.rules, "r") as fp:
+        memo = SentenceMemo(args.memo, segmenter, rule_engine, fp.read())
+    for run in ("cold", "warm"):
+        start = time.perf_counter()
+        results = [memo.segment_and_evaluate(texts) for texts in policies.values()]
+        elapsed = time.perf_counter() - start
+        same = all(a[0] == b[0] and np.array_equal(a[1], b[1]) for a, b in zip(reference, results))
+        print(run.ljust(5) + " memo: " + str(round(elapsed, 3)) + " sec vs " + str(round(reference_time, 3)) +
+              " sec without, results identical: " + str(same))
+        print("      " + memo.stats())
@@ -2,30 +2,25 @@
 
 """
 Privacy Policy Project
-Randomly take one paragraph from a random place in 200 different files.
+Randomly take 200 paragraphs from the whole corpus of parser outputs.
 """
 
-import matplotlib.pyplot as plt
-from os import listdir
-from os.path import isfile, join
-import random, datetime
-import pandas
-import numpy as np
-from collections import Counter
-from nltk.tokenize import sent_tokenize
+import argparse, datetime, matplotlib.pyplot as plt, os
+from statistics.sampler import CorpusIndex
 
 
 class TextSampler:
-    """ Gather one random line from N random files. """
+    """ Gather N random paragraphs from the parser outputs. """
 
-    def __init__(self, input_folder, output_file, num_samples):
-        """ Specify the files parsed and compare with text equivalents. """
+    def __init__(self, input_folder, output_file, num_samples, seed=None):
+        """ Specify the parser outputs to sample and where to write them. """
         super(TextSampler, self).__init__()
 
         self.timestamp = '{0:%Y%m%d-%H%M%S}'.format(datetime.datetime.now())
-        self.input_folder = input_folder
+        self.input_folder = os.path.join(input_folder, "")
         self.output_file = output_file + self.timestamp + '.txt'
         self.num_samples = num_samples
+        self.seed = seed
 
     def count_elements(self, seq) -> dict:
         """Tally elements from `seq`."""
@@ -36,44 +31,54 @@ class TextSampler:
 
     def ascii_histogram(self, seq) -> None:
         """A horizontal frequency-table/histogram plot."""
-        counted = count_elements(seq)
+        counted = self.count_elements(seq)
         for k in sorted(counted):
             print('{0:5d} {1}'.format(k, '+' * counted[k]))
 
     # use this version of run to count words in sentences from paragraphs
     def run(self):
-        files = [f for f in listdir(self.input_folder) if isfile(join(self.input_folder, f))]
-        paragraph_files = [file for file in files if "paragraph" in file]
+        index = CorpusIndex(["paragraphs"])
+        index.update([self.input_folder])
 
-        print("Sampling from " + str(len(paragraph_files)) + "files.")
+        print("Sampling from " + str(len(index)) + " paragraphs in " + str(len(index.paths)) + " files.")
 
-        samples = random.sample(paragraph_files, self.num_samples)
-        error_num = 0
+        samples = index.rows(index.sample(self.num_samples, self.seed))
         word_count = []
-        for f in samples:
-            try:
-                lines = open(input_folder + f).read().splitlines()
-            except EnvironmentError as e: # parent of IOError, OSError *and* WindowsError where available
-                print("Error" + str(error_num) + str(e))
-                error_num = error_num + 1
-                continue
-            random_paragraph = random.choice(lines)
-
-            word_count.append(len(random_paragraph.split()))
-            # if len(random_paragraph.split()) > 5:
-            with open(self.output_file, "a") as f:
+        os.makedirs(os.path.dirname(self.output_file) or ".", exist_ok=True)
+        with open(self.output_file, "a") as f:
+            for path, row in samples:
+                random_paragraph = row[-1]
+                word_count.append(len(random_paragraph.split()))
                 f.write(random_paragraph + '\n' + '\n' + '\n')
 
+        self.ascii_histogram(word_count)
         plt.xlabel('Words per paragraph')
         plt.ylabel('frequency in sample')
         plt.hist(word_count, self.num_samples)
         plt.show()
-            
 
 
 if __name__ == '__main__':
-    input_folder = "../scraper/output/"
-    output_file = "paragraph_sampler_out/"
-
-    sampler = TextSampler(input_folder, output_file, 200)
-    sampler.run()
\ No newline at end of file
+    argparse = argparse.ArgumentParser(description="Write a random sample of paragraphs from the parser output.")
+    argparse.add_argument(  "parser_output_dir",
+                            nargs="?",
+                            default="../data/parser_output/",
+                            help="directory containing *_paragraphs.csv files to sample.")
+    argparse.add_argument(  "-n", "--num_samples",
+                            type=int,
+                            default=200,
+                            required=False,
+                            help="number of paragraphs to sample.")
+    argparse.add_argument(  "-s", "--seed",
+                            type=int,
+                            default=None,
+                            required=False,
+                            help="random seed, for a reproducible sample.")
+    argparse.add_argument(  "-o", "--output_file",
+                            default="paragraph_sampler_out/",
+                            required=False,
+                            help="prefix of the text file the sample is written to.")
+    args = argparse.parse_args()
+
+    sampler = TextSampler(args.parser_output_dir, args.output_file, args.num_samples, args.seed)
+    sampler.run()
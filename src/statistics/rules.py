@@ -0,0 +1,213 @@
+"""
+Privacy Policy Project
+rules.py
+Compiled sentence rule engine.  apply_sentence_rules() re-reads the rule
+dict for every sentence, branching on rule names and the "True"/"False"
+strings, and returns a list of names.  RuleEngine turns the rule dict
+into an evaluation plan once, evaluates each sentence into an integer
+bitmask (one bit per rule, plus one for GOOD) and counts the hits per
+rule over a whole batch of masks with a vectorized sum.  Runnable as a standalone script
+to check exact parity with apply_sentence_rules, on a fixed set of
+sentences and rules (--check) or on tokenizer outputs, and compare
+speed.
+"""
+
+import argparse, os, re, sys, time
+import numpy as np
+from statistics.sentences import apply_sentence_rules, build_rule_dict
+
+class RuleEngine():
+    """
+    Bit i of a mask is set when rule names[i] hits; the last name is
+    GOOD, which is set only when no other rule does.  SHORT and
+    HEAD_FRAG always count as hits when their test passes, and the
+    other rules hit on a regex match ("True") or on no match ("False"),
+    exactly as in apply_sentence_rules.  Masks are int64, so at most
+    MAX_RULES rules (plus GOOD) fit.
+    """
+    MAX_RULES = 62
+
+    def __init__(self, rule_dict):
+        if len(rule_dict) > self.MAX_RULES:
+            raise ValueError("RuleEngine supports at most " + str(self.MAX_RULES) + " rules, got " + str(len(rule_dict)))
+        self.names = [name for name in rule_dict] + ["GOOD"]
+        self.good = 1 << (len(self.names) - 1)
+        self.short = None           # (bit, threshold)
+        self.header_fragment = None # (bit, threshold)
+        self.patterns = []          # (bit, compiled regex match method, hits on match?)
+        for bit, (name, rule) in enumerate(rule_dict.items()):
+            if name == "SHORT":
+                self.short = (1 << bit, rule[0])
+            elif name == "HEAD_FRAG":
+                self.header_fragment = (1 << bit, rule[0])
+            elif rule[1] in ("True", "False"):
+                self.patterns.append((1 << bit, rule[0].match, rule[1] == "True"))
+
+    def evaluate(self, sentence):
+        """
+        In:     sentence string.
+        Out:    integer bitmask of rule hits.
+        """
+        mask = 0
+        words = sentence.split()
+        if self.short is not None and len(words) < self.short[1]:
+            mask |= self.short[0]
+        if self.header_fragment is not None:
+            # a word counts as capitalized if any of its letters is upper case
+            ncaps = sum(1 for word in words if not word.islower() and any(map(str.isupper, word)))
+            if ncaps / len(words) > self.header_fragment[1]:
+                mask |= self.header_fragment[0]
+        for bit, match, on_match in self.patterns:
+            if (match(sentence) is not None) == on_match:
+                mask |= bit
+        return mask or self.good
+
+    def evaluate_batch(self, sentences):
+        """
+        Evaluate every sentence in turn, straight into a numpy array
+        for count().
+
+        In:     list of sentence strings.
+        Out:    numpy int64 array of bitmasks, one per sentence.
+        """
+        return np.fromiter((self.evaluate(sentence) for sentence in sentences), dtype=np.int64, count=len(sentences))
+
+    def count(self, masks):
+        """
+        Number of sentences each rule hit.
+
+        In:     numpy array of bitmasks.
+        Out:    dict of rule name -> count, in rule order (GOOD last).
+        """
+        bits = (masks[:, None] >> np.arange(len(self.names))) & 1
+        return dict(zip(self.names, bits.sum(axis=0).tolist()))
+
+    def names_for(self, mask):
+        """
+        In:     bitmask.
+        Out:    list of rule names, in the order apply_sentence_rules
+                returns them.
+        """
+        return [name for bit, name in enumerate(self.names) if mask >> bit & 1]
+
+# every kind of rule apply_sentence_rules knows: SHORT and HEAD_FRAG tests, regexes hitting on a match ("True") or
+# on no match ("False"), ones that always or never hit, and a flag it ignores; compiled like build_rule_dict does
+PARITY_RULES = {"SHORT": [5, "True"],
+                "START_CAP": [re.compile(r"^[A-Z].*"), "False"],
+                "PRE_NOISE": [re.compile(r"^((\d+)|(\d(\.|\-)\d)|(\d(\.|\-)\d(\.|\-)\d))(:|\.)?\s([A-Z]\w+.*?)"), "True"],
+                "END_PUNC": [re.compile(r".*[!?.]"), "False"],
+                "HEAD_FRAG": [0.6, "True"],
+                "META": [re.compile(r"<META:.*/META>"), "True"],
+                "ALWAYS": [re.compile(r""), "True"],
+                "NEVER": [re.compile(r""), "False"],
+                "IGNORED": [re.compile(r".*"), "Maybe"]}
+
+PARITY_SENTENCES = ["We collect the information you provide when you create an account.",
+                    "Privacy Policy",
+                    "Last updated: May 2020",
+                    "we may share your data with service providers who process it on our behalf.",
+                    "1. Information We Collect And How We Use It",
+                    "2.3 Cookies and similar technologies are used on this site",
+                    "Contact Us At Privacy@Example.com For Any Questions",
+                    "Do you sell my personal information?",
+                    "Opt out!",
+                    "<META:HEADER>Your Choices</META>",
+                    "   Leading and trailing whitespace is kept in the sentence.   ",
+                    "iPhone and eBay users can change these settings at any time.",
+                    "ALL CAPS NOTICE: THE SERVICE IS PROVIDED AS IS",
+                    "Four words, no period",
+                    "One",
+                    "5",
+                    "Données personnelles et vie privée des utilisateurs.",
+                    "Text with\nan embedded newline and tab\tcharacters."]
+
+def parity_check(rule_dict, sentences):
+    """
+    Compare RuleEngine with apply_sentence_rules sentence by sentence,
+    and their per-rule counts.
+
+    In:     rule dict (as built by build_rule_dict), list of sentences.
+    Out:    list of (sentence, apply_sentence_rules hits, RuleEngine
+            hits) that differ, plus ("counts", reference, engine) if
+            the counts differ.
+    """
+    engine = RuleEngine(rule_dict)
+    masks = engine.evaluate_batch(sentences)
+    mismatches = []
+    reference_counts = {name: 0 for name in engine.names}
+    for sentence, mask in zip(sentences, masks):
+        hits = apply_sentence_rules(sentence, rule_dict)
+        for name in hits:
+            reference_counts[name] += 1
+        if engine.names_for(mask) != hits:
+            mismatches.append((sentence, hits, engine.names_for(mask)))
+    counts = engine.count(masks)
+    if counts != reference_counts:
+        mismatches.append(("counts", reference_counts, counts))
+    return mismatches
+
+if __name__ == '__main__':
+    import csv
+    argparse = argparse.ArgumentParser(description="Check the compiled rule engine against apply_sentence_rules.")
+    argparse.add_argument(  "rules",
+                            nargs="?",
+                            help="json file containing list of sentence rules.")
+    argparse.add_argument(  "sentences_dir",
+                            nargs="?",
+                            help="directory of tokenizer *_sentences.csv files (or any text files, one sentence per line).")
+    argparse.add_argument(  "--check",
+                            action="store_true",
+                            help="only check parity on the built-in sentences, with the built-in rules and the rules file if given, and exit 1 on any difference.")
+    argparse.add_argument(  "-r", "--repeat",
+                            type=int,
+                            default=3,
+                            required=False,
+                            help="number of passes over the sentences for each implementation.")
+    args = argparse.parse_args()
+    if args.check:
+        rule_dicts = [("built-in rules", PARITY_RULES)] + ([(args.rules, build_rule_dict(args.rules))] if args.rules else [])
+        failed = False
+        for name, rule_dict in rule_dicts:
+            mismatches = parity_check(rule_dict, PARITY_SENTENCES)
+            print(name + ": " + str(len(PARITY_SENTENCES)) + " sentences, " + str(len(mismatches)) + " differences")
+            for mismatch in mismatches:
+                print("   " + repr(mismatch))
+            failed = failed or bool(mismatches)
+        sys.exit(1 if failed else 0)
+    if args.rules is None or args.sentences_dir is None:
+        argparse.error("rules and sentences_dir are required unless --check is given")
+
+    rule_dict = build_rule_dict(args.rules)
+    sentences = []
+    for fname in sorted(os.listdir(args.sentences_dir)):
+        with open(os.path.join(args.sentences_dir, fname), "r") as fp:
+            if fname.endswith("_sentences.csv"):
+                sentences.extend(row[5] for row in list(csv.reader(fp))[1:])
+            elif not fname.endswith((".png", ".pdf")):
+                sentences.extend(line for line in fp.read().splitlines() if line.strip())
+
+    start = time.perf_counter()
+    for i in range(args.repeat):
+        reference = [apply_sentence_rules(sentence, rule_dict) for sentence in sentences]
+        reference_counts = {name: 0 for name in list(rule_dict) + ["GOOD"]}
+        for hits in reference:
+            for name in reference_counts:
+                if name in hits:
+                    reference_counts[name] += 1
+    reference_time = time.perf_counter() - start
+    start = time.perf_counter()
+    engine = RuleEngine(rule_dict)
+    for i in range(args.repeat):
+        masks = engine.evaluate_batch(sentences)
+        counts = engine.count(masks)
+    engine_time = time.perf_counter() - start
+
+    mismatches = [sentence for sentence, hits, mask in zip(sentences, reference, masks) if engine.names_for(mask) != hits]
+    print("Sentences:             " + str(len(sentences)))
+    print("apply_sentence_rules:  " + str(round(len(sentences) * args.repeat / reference_time)) + " sentences/sec")
+    print("RuleEngine:            " + str(round(len(sentences) * args.repeat / engine_time)) + " sentences/sec")
+    print("Counts identical:      " + str(counts == reference_counts))
+    if mismatches:
+        print(str(len(mismatches)) + " sentences differ, e.g. " + repr(mismatches[0]))
+    else:
+        print("Rule hits identical for every sentence.")
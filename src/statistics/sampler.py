@@ -0,0 +1,305 @@
+"""
+Privacy Policy Project
+sampler.py
+Seeded, reproducible samples of paragraphs, headers, lists or sentences
+drawn from the whole corpus of parser and tokenizer outputs, item by
+item rather than file by file.  CorpusIndex records the byte offset of
+every row of every output csv (found with numpy from the positions of
+newlines and quotes, without parsing the csv), so any item can be read
+on its own with one seek, and a sample of k items out of millions reads
+only those k rows.  The index can be saved and is brought up to date by
+re-indexing only new or changed files.  reservoir_sample draws a sample
+in one streaming pass over any iterable when there is no index.
+Runnable as a standalone script.
+"""
+
+import argparse, io, math, os, random, time
+import numpy as np
+from csv import reader, writer
+from statistics.corpus import OUTPUT_FILE
+
+WEIGHTINGS = ["uniform", "policy", "length"]
+
+def reservoir_sample(items, k, rng):
+    """
+    Uniform sample of k items in one pass (Li's Algorithm L), which
+    draws a few random numbers per item kept rather than per item seen.
+
+    In:     iterable of items, sample size, random.Random.
+    Out:    list of up to k items, in the order they were kept.
+    """
+    reservoir = []
+    if k == 0:
+        return reservoir
+    items = iter(items)
+    for item in items:
+        reservoir.append(item)
+        if len(reservoir) == k:
+            break
+    if len(reservoir) < k:
+        return reservoir
+    w = math.exp(math.log(rng.random()) / k)
+    while True:
+        skip = math.floor(math.log(rng.random()) / math.log(1 - w))
+        for item in items:
+            if skip == 0:
+                reservoir[rng.randrange(k)] = item
+                w *= math.exp(math.log(rng.random()) / k)
+                break
+            skip -= 1
+        else:
+            return reservoir
+
+def row_bounds(path):
+    """
+    Byte offsets of the rows of a csv file written by the parser or
+    tokenizer, after its heading row.  A newline ends a row unless it
+    is inside a quoted field, i.e. unless an odd number of quotes comes
+    before it.
+
+    In:     path to the csv file.
+    Out:    numpy int64 array b, where row i is the bytes b[i]:b[i + 1].
+    """
+    with open(path, "rb") as fp:
+        data = np.frombuffer(fp.read(), dtype=np.uint8)
+    newlines = np.flatnonzero(data == ord("\n"))
+    quotes = np.flatnonzero(data == ord('"'))
+    ends = newlines[np.searchsorted(quotes, newlines) % 2 == 0] + 1
+    ends = ends[ends < len(data)]
+    return np.append(ends, len(data)).astype(np.int64)
+
+def output_files(folders, kinds):
+    """
+    In:     list of folders (with trailing slash), list of kinds.
+    Out:    sorted list of (path, (size, mtime)) of the output files of
+            those kinds.
+    """
+    found = []
+    for folder in folders:
+        with os.scandir(folder) as entries:
+            for entry in entries:
+                match = OUTPUT_FILE.match(entry.name)
+                if match is not None and match.group("kind") in kinds and entry.is_file():
+                    stat = entry.stat()
+                    found.append((folder + entry.name, (stat.st_size, stat.st_mtime_ns)))
+    return sorted(found)
+
+def read_rows(path, spans):
+    """
+    In:     path to the csv file, list of (start, end) byte spans of
+            rows, as returned by CorpusIndex.spans().
+    Out:    list of rows, each a list of fields.
+    """
+    rows = []
+    with open(path, "rb") as fp:
+        for start, end in spans:
+            fp.seek(start)
+            rows.append(next(reader(io.StringIO(fp.read(end - start).decode("utf-8"), newline=""))))
+    return rows
+
+class CorpusIndex():
+    """
+    Row offsets of every output file of the given kinds, in sorted path
+    order so that the same corpus and seed always give the same sample.
+    Item i of the corpus is row i - starts[f] of file f.
+    """
+    def __init__(self, kinds):
+        self.kinds = kinds
+        self.paths = []
+        self.stats = []     # (size, mtime) of every file when indexed
+        self.bounds = []    # row_bounds() of every file
+        self.starts = np.zeros(1, dtype=np.int64)
+
+    def __len__(self):
+        return int(self.starts[-1])
+
+    def update(self, folders):
+        """
+        Index every matching file in the folders, reusing the offsets
+        of files whose size and modification time haven't changed.
+
+        In:     list of folders (with trailing slash).
+        Out:    number of files indexed.
+        """
+        known = {path: (stat, bounds) for path, stat, bounds in zip(self.paths, self.stats, self.bounds)}
+        indexed = 0
+        self.paths, self.stats, self.bounds = [], [], []
+        for path, stat in output_files(folders, self.kinds):
+            if path in known and known[path][0] == stat:
+                bounds = known[path][1]
+            else:
+                bounds = row_bounds(path)
+                indexed += 1
+            self.paths.append(path)
+            self.stats.append(stat)
+            self.bounds.append(bounds)
+        self.starts = np.concatenate(([0], np.cumsum([len(bounds) - 1 for bounds in self.bounds], dtype=np.int64)))
+        return indexed
+
+    def load(self, path):
+        """
+        Read an index saved by save() for the same kinds, if there is one.
+        """
+        if not os.path.isfile(path):
+            return
+        with np.load(path) as saved:
+            if list(saved["kinds"]) != list(self.kinds):
+                return
+            counts = saved["counts"]
+            offsets = np.split(saved["offsets"], np.cumsum(counts)[:-1])
+            self.paths = list(saved["paths"])
+            self.stats = [tuple(stat) for stat in saved["stats"].tolist()]
+            self.bounds = offsets if len(counts) else []
+        self.starts = np.concatenate(([0], np.cumsum([len(bounds) - 1 for bounds in self.bounds], dtype=np.int64)))
+
+    def save(self, path):
+        """
+        Write the index to a numpy .npz file, atomically.
+        """
+        with open(path + ".tmp", "wb") as fp:
+            np.savez(fp, kinds=np.array(self.kinds), paths=np.array(self.paths, dtype=str),
+                     stats=np.array(self.stats, dtype=np.int64).reshape(-1, 2),
+                     counts=np.array([len(bounds) for bounds in self.bounds], dtype=np.int64),
+                     offsets=np.concatenate(self.bounds) if self.bounds else np.zeros(0, dtype=np.int64))
+        os.replace(path + ".tmp", path)
+
+    def counts(self):
+        """
+        Out:    numpy array of the number of rows in every file.
+        """
+        return np.diff(self.starts)
+
+    def weights(self, weighting):
+        """
+        In:     "uniform", "policy" (every file equally likely, whatever
+                its number of rows) or "length" (rows in proportion to
+                their length in bytes).
+        Out:    numpy array of one weight per item, None for uniform.
+        """
+        if weighting == "uniform":
+            return None
+        if weighting == "policy":
+            counts = self.counts()
+            return np.repeat(1 / np.maximum(counts, 1), counts)
+        if weighting == "length":
+            return np.concatenate([np.diff(bounds) for bounds in self.bounds]).astype(np.float64)
+        raise ValueError("unknown weighting " + weighting)
+
+    def sample(self, k, seed=None, weighting="uniform"):
+        """
+        Draw k distinct items.  Weighted samples take the k items with
+        the smallest exponential keys divided by their weight
+        (Efraimidis and Spirakis), all in a few numpy passes.
+
+        In:     sample size, seed, one of WEIGHTINGS.
+        Out:    sorted numpy array of item indices.
+        """
+        rng = np.random.default_rng(seed)
+        n = len(self)
+        if k >= n:
+            return np.arange(n)
+        weights = self.weights(weighting)
+        if weights is None:
+            return np.sort(rng.choice(n, k, replace=False))
+        keys = rng.exponential(size=n) / weights
+        return np.sort(np.argpartition(keys, k)[:k])
+
+    def spans(self, items):
+        """
+        In:     sorted item indices.
+        Out:    dict of path -> list of (start, end) byte spans of the
+                items' rows, for read_rows().
+        """
+        files = np.searchsorted(self.starts, items, side="right") - 1
+        spans = {}
+        for item, f in zip(items.tolist(), files.tolist()):
+            row = item - int(self.starts[f])
+            spans.setdefault(self.paths[f], []).append((int(self.bounds[f][row]), int(self.bounds[f][row + 1])))
+        return spans
+
+    def rows(self, items):
+        """
+        In:     sorted item indices.
+        Out:    list of (path, row) in item order.
+        """
+        return [(path, row) for path, spans in self.spans(items).items() for row in read_rows(path, spans)]
+
+    def __getitem__(self, item):
+        """
+        Out:    (path, row) of a single item.
+        """
+        return self.rows(np.array([item]))[0]
+
+def stream_rows(paths):
+    """
+    In:     list of csv paths.
+    Out:    generator of (path, row) over every row after the headings.
+    """
+    for path in paths:
+        with open(path, "r", newline="") as fp:
+            csv_reader = reader(fp)
+            next(csv_reader, None)
+            for row in csv_reader:
+                yield path, row
+
+if __name__ == '__main__':
+    argparse = argparse.ArgumentParser(description="Draw a reproducible sample of items from parser and tokenizer outputs.")
+    argparse.add_argument(  "output_dirs",
+                            nargs="+",
+                            help="parser and/or tokenizer output directories.")
+    argparse.add_argument(  "-k", "--kind",
+                            default="sentences",
+                            choices=["paragraphs", "headers", "lists", "sentences"],
+                            required=False,
+                            help="kind of item to sample.")
+    argparse.add_argument(  "-n", "--num_samples",
+                            type=int,
+                            default=1000,
+                            required=False,
+                            help="number of items to sample.")
+    argparse.add_argument(  "-s", "--seed",
+                            type=int,
+                            default=0,
+                            required=False,
+                            help="random seed; the same seed and corpus always give the same sample.")
+    argparse.add_argument(  "-w", "--weighting",
+                            default="uniform",
+                            choices=WEIGHTINGS,
+                            required=False,
+                            help="uniform over items, every policy equally likely, or items in proportion to their length.")
+    argparse.add_argument(  "-i", "--index",
+                            default=None,
+                            required=False,
+                            help="file to keep the row index in between runs (.npz).  Only new or changed outputs are indexed again.")
+    argparse.add_argument(  "--stream",
+                            action="store_true",
+                            help="sample in one pass over every row with a reservoir instead of an index (uniform only).")
+    argparse.add_argument(  "-o", "--outfile",
+                            default="./sample.csv",
+                            required=False,
+                            help="csv file to write the sampled items to.")
+    args = argparse.parse_args()
+    if args.stream and args.weighting != "uniform":
+        argparse.error("--stream only samples uniformly")
+    folders = [os.path.join(folder, "") for folder in args.output_dirs]
+
+    start = time.perf_counter()
+    if args.stream:
+        paths = [path for path, stat in output_files(folders, [args.kind])]
+        sample = reservoir_sample(stream_rows(paths), args.num_samples, random.Random(args.seed))
+    else:
+        index = CorpusIndex([args.kind])
+        if args.index is not None:
+            index.load(args.index)
+        indexed = index.update(folders)
+        if args.index is not None and indexed:
+            index.save(args.index)
+        print("Indexed " + str(indexed) + " of " + str(len(index.paths)) + " files, " + str(len(index)) + " " + args.kind + " in " +
+              str(round(time.perf_counter() - start, 3)) + " sec.")
+        start = time.perf_counter()
+        sample = index.rows(index.sample(args.num_samples, args.seed, args.weighting))
+    print("Sampled " + str(len(sample)) + " " + args.kind + " in " + str(round(time.perf_counter() - start, 3)) + " sec.")
+    with open(args.outfile, "w") as fp:
+        csv_writer = writer(fp)
+        for path, row in sample:
+            csv_writer.writerow([os.path.basename(path)] + row)
@@ -0,0 +1,212 @@
+"""
+Privacy Policy Project
+segmenters.py
+Pluggable sentence segmentation for the Tokenizer.  Every segmenter has
+segment(text) for one string and segment_many(texts) for a batch of
+elements at once.  "punkt" is NLTK's punkt model loaded once per
+process, exactly what sent_tokenize does, and is the default and the
+accuracy reference.  "punkt_policy" is the same model with
+privacy-policy abbreviations ("e.g.", "Inc.", "No.", ...) added, which
+keeps those from ending sentences but also merges some real sentence
+breaks after them.  "regex" is a single compiled regular expression plus
+a few punkt-style rules for abbreviations, initials and numbered items,
+meant for bulk runs.  Runnable as a standalone script to measure how
+often the two agree with plain sent_tokenize on a corpus and how fast
+each one is.
+"""
+
+import argparse, copy, nltk, os, re, time
+from abc import ABC, abstractmethod
+from nltk.tokenize import sent_tokenize
+
+# lowercase, without the final period (the format of punkt's abbrev_types)
+POLICY_ABBREVIATIONS = ["e.g", "i.e", "etc", "inc", "llc", "l.l.c", "ltd", "corp", "co", "plc", "u.s", "u.s.a",
+                        "u.k", "e.u", "no", "nos", "sec", "secs", "art", "para", "fig", "vs", "cf", "approx",
+                        "dept", "mr", "mrs", "ms", "dr", "st", "jr", "sr", "p.o", "a.m", "p.m", "jan", "feb",
+                        "mar", "apr", "jun", "jul", "aug", "sep", "sept", "oct", "nov", "dec"]
+
+# abbreviations that never end a sentence, even before a capitalized word
+JOINING_ABBREVIATIONS = frozenset(["e.g", "i.e", "no", "nos", "sec", "secs", "art", "para", "fig", "vs", "cf",
+                                   "approx", "mr", "mrs", "ms", "dr", "st", "p.o"])
+
+class Segmenter(ABC):
+    """
+    Interface every segmenter implements.
+    """
+    name = None
+
+    @abstractmethod
+    def segment(self, text):
+        """
+        In:     string of text.
+        Out:    list of sentence strings.
+        """
+
+    def segment_many(self, texts):
+        """
+        In:     list of strings (e.g. every element of a policy).
+        Out:    list of lists of sentence strings, in input order.
+        """
+        return [self.segment(text) for text in texts]
+
+def load_punkt(language="english"):
+    """
+    Load the punkt model the way this version of NLTK stores it.
+    """
+    try:
+        from nltk.tokenize import PunktTokenizer    # punkt_tab, NLTK >= 3.8.2
+        return PunktTokenizer(language)
+    except ImportError:
+        return nltk.data.load("tokenizers/punkt/" + language + ".pickle")
+
+class PunktSegmenter(Segmenter):
+    """
+    The punkt model behind sent_tokenize, loaded once.  Its output is
+    identical to sent_tokenize's.
+    """
+    name = "punkt"
+
+    def __init__(self, language="english"):
+        self.tokenizer = load_punkt(language)
+
+    def segment(self, text):
+        return self.tokenizer.tokenize(text)
+
+class PolicyPunktSegmenter(PunktSegmenter):
+    """
+    punkt extended with extra abbreviations so "e.g." or "Inc." don't
+    end sentences.  nltk.data.load hands out one shared tokenizer (the
+    one sent_tokenize uses), so the abbreviations go into a copy of its
+    parameters.
+    """
+    name = "punkt_policy"
+
+    def __init__(self, abbreviations=POLICY_ABBREVIATIONS, language="english"):
+        self.tokenizer = copy.copy(load_punkt(language))
+        self.tokenizer._params = copy.deepcopy(self.tokenizer._params)
+        self.tokenizer._params.abbrev_types.update(abbreviations)
+
+    def segment(self, text):
+        return self.tokenizer.tokenize(text)
+
+class RegexSegmenter(Segmenter):
+    """
+    Splits after runs of . ? or ! (plus any closing quotes or brackets)
+    that are followed by whitespace.  A period doesn't end the sentence
+    after a known abbreviation (unless a capitalized word follows one
+    that can also end a sentence, like "Inc."), a single-letter initial,
+    or a number followed by a lowercase word; an ellipsis only does
+    before a capitalized word.  These mirror the decisions punkt makes.
+    """
+    name = "regex"
+    BOUNDARY = re.compile(r"""([.?!]+)["'”’)\]]*(?=\s+(\S))""")
+
+    def __init__(self, abbreviations=POLICY_ABBREVIATIONS):
+        self.abbreviations = frozenset(abbreviations)
+
+    def is_boundary(self, text, match):
+        punctuation = match.group(1)
+        if "?" in punctuation or "!" in punctuation:
+            return True
+        next_char = match.group(2)
+        if len(punctuation) > 1:
+            return next_char.isupper()
+        start = match.start(1)
+        word_start = max(text.rfind(" ", 0, start), text.rfind("\n", 0, start), text.rfind("\t", 0, start)) + 1
+        word = text[word_start:start].lstrip("\"'(“‘[").lower()
+        if word in self.abbreviations:
+            return next_char.isupper() and word not in JOINING_ABBREVIATIONS
+        if len(word) == 1 and word.isalpha():
+            return False
+        if word.isdigit():
+            return not next_char.islower()
+        return True
+
+    def segment(self, text):
+        """
+        Like punkt, only the first sentence keeps its leading whitespace.
+        """
+        sentences = []
+        start = 0
+        for match in self.BOUNDARY.finditer(text):
+            if self.is_boundary(text, match):
+                sentences.append(text[start:match.end()])
+                start = match.end()
+        sentences.append(text[start:])
+        sentences = [sentence.rstrip() if i == 0 else sentence.strip() for i, sentence in enumerate(sentences)]
+        return [sentence for sentence in sentences if sentence.strip()]
+
+SEGMENTERS = {"punkt": PunktSegmenter, "punkt_policy": PolicyPunktSegmenter, "regex": RegexSegmenter}
+segmenters = {}     # name -> instance, one per process (inherited by forked workers)
+
+def get_segmenter(name="punkt"):
+    """
+    In:     segmenter name, one of SEGMENTERS.
+    Out:    the process's instance of that segmenter.
+    """
+    if name not in segmenters:
+        segmenters[name] = SEGMENTERS[name]()
+    return segmenters[name]
+
+def boundaries(text, sentences):
+    """
+    Character offsets where each sentence ends, for comparing two
+    segmentations of the same text.
+    """
+    ends = set()
+    position = 0
+    for sentence in sentences:
+        found = text.find(sentence, position)
+        if found == -1:
+            continue
+        position = found + len(sentence)
+        ends.add(position)
+    return ends
+
+if __name__ == '__main__':
+    argparse = argparse.ArgumentParser(description="Compare sentence segmenters with sent_tokenize for agreement and throughput.")
+    argparse.add_argument(  "text_dir",
+                            help="directory of stripped text (.txt) or html files, e.g. the ground truth.")
+    argparse.add_argument(  "-r", "--repeat",
+                            type=int,
+                            default=3,
+                            required=False,
+                            help="number of passes over the corpus for each segmenter.")
+    args = argparse.parse_args()
+
+    texts = []
+    for fname in sorted(os.listdir(args.text_dir)):
+        with open(os.path.join(args.text_dir, fname), "r") as fp:
+            contents = fp.read()
+        if fname.endswith(".html"):
+            from verification.verify import strip_text
+            contents = strip_text(contents)
+        # one "element" per non-empty line, like the parser's content strings
+        texts.extend(line for line in contents.splitlines() if line.strip())
+    total_mb = sum(map(len, texts)) / 1e6
+
+    start = time.perf_counter()
+    for i in range(args.repeat):
+        reference = [sent_tokenize(text) for text in texts]
+    reference_time = time.perf_counter() - start
+    print("Elements: " + str(len(texts)) + " (" + str(round(total_mb, 2)) + " MB), " +
+          str(sum(map(len, reference))) + " sentences from sent_tokenize")
+    print("sent_tokenize".ljust(14) + str(round(total_mb * args.repeat / reference_time, 2)).rjust(8) + " MB/sec")
+    for name in SEGMENTERS:
+        segmenter = get_segmenter(name)
+        start = time.perf_counter()
+        for i in range(args.repeat):
+            results = segmenter.segment_many(texts)
+        elapsed = time.perf_counter() - start
+        identical = sum(1 for a, b in zip(reference, results) if a == b)
+        true_pos = false_pos = false_neg = 0
+        for text, a, b in zip(texts, reference, results):
+            expected, found = boundaries(text, a), boundaries(text, b)
+            true_pos += len(expected & found)
+            false_pos += len(found - expected)
+            false_neg += len(expected - found)
+        precision = true_pos / (true_pos + false_pos) if true_pos + false_pos else 1.0
+        recall = true_pos / (true_pos + false_neg) if true_pos + false_neg else 1.0
+        print(name.ljust(14) + str(round(total_mb * args.repeat / elapsed, 2)).rjust(8) + " MB/sec, " +
+              str(round(identical / max(len(texts), 1) * 100, 2)) + "% of elements identical, boundary precision " +
+              str(round(precision, 4)) + ", recall " + str(round(recall, 4)))
@@ -9,7 +9,9 @@ import matplotlib.gridspec as gridspec
 from multiprocessing import Pool, Lock, Value, cpu_count
 from nltk.tokenize import sent_tokenize
 from numpy import bincount, arange
-from random import sample
+from random import Random
+from statistics.sampler import CorpusIndex, read_rows
+from utils.scheduler import Scheduler, file_sizes
 from utils.utils import mkdir_clean, print_progress_bar, VerifyJsonExtension
 
 class Policy:
@@ -117,22 +119,34 @@ def generate_rule_bar_fig(rule_hits, outfile):
     In:     rule_hits (list of rule names as strings), output file.
     Out:    N/A
     """
+    fig = plt.figure()
     plt.bar(range(len(rule_hits)), list(rule_hits.values()), align="center", color="blue")
     plt.xticks(range(len(rule_hits)), list(rule_hits.keys()), rotation=30, fontsize=8)
     plt.ylabel("# of Sentences in Policy")
-    plt.savefig(outfile)
+    fig.savefig(outfile)
+    plt.close(fig)  # otherwise every policy's bars pile up on the same figure
 
-def extract_sentences(file):
+def extract_sentences(task):
     """
     Reads in csv file from pre-generated parser output and looks at
-    every line to gather sentences from it, then apply the input
-    ruleset on those sentences, and return statistics.
+    every line (or only the sampled lines) to gather sentences from it,
+    then apply the input ruleset on those sentences, and return
+    statistics.
+
+    In:     (paragraphs CSV file, byte spans of the sampled paragraphs
+            from CorpusIndex.spans(), or None to read them all).
+    Out:    Policy object.
     """
+    file, spans = task
     policy_stats = Policy(file, rule_dict)
 
-    with open(parser_output_dir + file, "r") as fp:
-        csv_reader = reader(fp)
-        elements = list(csv_reader)
+    if spans is None:
+        with open(parser_output_dir + file, "r") as fp:
+            csv_reader = reader(fp)
+            next(csv_reader, None)  # headings
+            elements = list(csv_reader)
+    else:
+        elements = read_rows(parser_output_dir + file, spans)
 
     sentence_list = []
     for elem in elements:   # for every possible object
@@ -208,6 +222,7 @@ def generate_rule_hist_figs(files, rule_hits, lengths, num_files, rule_dict, out
         plt.xlabel(name + " Rule Hit Count", figure=standalone_fig)
         plt.ylabel("# of Policies", figure=standalone_fig)
         standalone_fig.savefig(outfile[:-4] + "_" + name + ".pdf")
+        plt.close(standalone_fig)
         subfig = fig.add_subplot(gs[r, c])
         subfig.set_xlabel(name + " Rule Hit Count")
         subfig.set_ylabel("# of Policies")
@@ -229,6 +244,7 @@ def generate_rule_hist_figs(files, rule_hits, lengths, num_files, rule_dict, out
     print_progress_bar(i + 1, len(rule_dict.items()) + 1, prefix = "Rule Histograms Progress:", suffix = "Complete", length = 50)
     fig.tight_layout()
     fig.savefig(outfile)
+    plt.close(fig)
 
 def start_process(i):
     """
@@ -247,6 +263,16 @@ if __name__ == '__main__':
                             default=0,
                             required=False,
                             help="number of files this program should read from the directory.")
+    argparse.add_argument(  "-i", "--sample_items",
+                            type=int,
+                            default=0,
+                            required=False,
+                            help="number of paragraphs to sample from the whole directory instead of whole files.  Overrides -n.")
+    argparse.add_argument(  "-s", "--seed",
+                            type=int,
+                            default=None,
+                            required=False,
+                            help="random seed, for a reproducible sample of files or paragraphs.")
     argparse.add_argument(  "rules",
                             help="json file containing list of sentence rules.",
                             action=VerifyJsonExtension)
@@ -256,22 +282,35 @@ if __name__ == '__main__':
                             default="./sentence_stats_output" + timestamp + "/",
                             required=False,
                             help="directory to dump sentence stats output.  Will be created if does not exist.")
+    argparse.add_argument(  "-c", "--chunksize",
+                            type=int,
+                            default=1,
+                            required=False,
+                            help="files handed to a worker at a time.  Files are dispatched largest first, so small chunks keep every worker busy until the end.")
     args = argparse.parse_args()
     parser_output_dir = args.parser_output_dir
     output_folder = args.output_folder
     rule_dict = build_rule_dict(args.rules)
     mkdir_clean(output_folder)
 
-    files = [name for name in os.listdir(parser_output_dir) if name.endswith("paragraphs.csv")]
-    try:
-        random_files = sample(files, args.num_samples)
-    except ValueError:
-        print("ValueError: args.num_samples > # files in parser_output_dir, defaulting to all files in that directory.")
-        random_files = files
-    if args.num_samples == 0:
-        random_files = files
-
-    print("Tokenizing " + str(len(random_files)) + " files...")
+    if args.sample_items > 0:
+        corpus_index = CorpusIndex(["paragraphs"])
+        corpus_index.update([parser_output_dir])
+        spans = corpus_index.spans(corpus_index.sample(args.sample_items, args.seed))
+        random_files = [(os.path.basename(path), spans[path]) for path in spans]
+        sizes = [sum(end - start for start, end in spans[path]) for path in spans]
+        print("Tokenizing " + str(min(args.sample_items, len(corpus_index))) + " of " + str(len(corpus_index)) + " paragraphs from " +
+              str(len(random_files)) + " files...")
+    else:
+        files = sorted(name for name in os.listdir(parser_output_dir) if name.endswith("paragraphs.csv"))
+        if args.num_samples > 0:
+            try:
+                files = Random(args.seed).sample(files, args.num_samples)
+            except ValueError:
+                print("ValueError: args.num_samples > # files in parser_output_dir, defaulting to all files in that directory.")
+        random_files = [(name, None) for name in files]
+        sizes = file_sizes(parser_output_dir, files)
+        print("Tokenizing " + str(len(random_files)) + " files...")
 
     index = Value("i",0)          # shared val, index of current parsed file
     pool_size = cpu_count() * 2
@@ -281,12 +320,17 @@ if __name__ == '__main__':
         initializer=start_process,
         initargs=[index]
     )
-    policy_list = pool.map(extract_sentences, random_files)    # map keeps domain_list order
+    # keep only the statistics of each policy as it comes back, not its sentences
+    scheduler = Scheduler(args.chunksize)
+    rule_hits = []
+    lengths = []
+    for i, p in scheduler.imap(pool, extract_sentences, random_files, sizes):
+        rule_hits.append(p.rule_hits)
+        lengths.append(p.lengths)
     pool.close()  # no more tasks
     pool.join()   # merge all child processes
+    print(scheduler.report())
 
     # print("Generating last rule histogram...")
-    rule_hits = [p.rule_hits for p in policy_list]
-    lengths = [p.lengths for p in policy_list]
-    generate_rule_hist_figs(random_files, rule_hits, lengths, len(rule_hits), rule_dict, output_folder + "rule_hists.pdf")
+    generate_rule_hist_figs([file for file, spans in random_files], rule_hits, lengths, len(rule_hits), rule_dict, output_folder + "rule_hists.pdf")
     print("Done")
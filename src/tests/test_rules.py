@@ -0,0 +1,34 @@
+import os, re, unittest
+from statistics.rules import PARITY_RULES, PARITY_SENTENCES, RuleEngine, parity_check
+from statistics.sentences import apply_sentence_rules, build_rule_dict
+
+RULES = os.path.join(os.path.dirname(__file__), "..", "..", "data", "inputs", "rules.json")
+
+class RuleEngineTest(unittest.TestCase):
+    def assertParity(self, rule_dict):
+        engine = RuleEngine(rule_dict)
+        masks = engine.evaluate_batch(PARITY_SENTENCES)
+        for sentence, mask in zip(PARITY_SENTENCES, masks):
+            self.assertEqual(engine.names_for(mask), apply_sentence_rules(sentence, rule_dict), sentence)
+        self.assertEqual(parity_check(rule_dict, PARITY_SENTENCES), [])
+
+    def test_parity_with_built_in_rules(self):
+        self.assertParity(PARITY_RULES)
+
+    def test_parity_with_rules_file(self):
+        self.assertParity(build_rule_dict(RULES))
+
+    def test_every_rule_hits_somewhere(self):
+        engine = RuleEngine(PARITY_RULES)
+        counts = engine.count(engine.evaluate_batch(PARITY_SENTENCES))
+        self.assertEqual([name for name, count in counts.items() if count == 0], ["NEVER", "IGNORED", "GOOD"])
+
+    def test_too_many_rules(self):
+        rule_dict = {"R" + str(i): [re.compile(r"x"), "True"] for i in range(RuleEngine.MAX_RULES)}
+        self.assertEqual(len(RuleEngine(rule_dict).names), RuleEngine.MAX_RULES + 1)
+        rule_dict["ONE_MORE"] = [re.compile(r"x"), "True"]
+        with self.assertRaises(ValueError):
+            RuleEngine(rule_dict)
+
+if __name__ == '__main__':
+    unittest.main()
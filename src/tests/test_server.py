@@ -0,0 +1,42 @@
+import json, os, socket, socketserver, tempfile, threading, unittest
+from verification.server import ScoringHandler, ScoringService
+
+DICTIONARY = os.path.join(os.path.dirname(__file__), "..", "..", "data", "inputs", "dictionary.txt")
+
+class ScoringHandlerTest(unittest.TestCase):
+    def setUp(self):
+        self.folder = tempfile.TemporaryDirectory()
+        self.socket_path = os.path.join(self.folder.name, "score.sock")
+        self.server = socketserver.ThreadingUnixStreamServer(self.socket_path, ScoringHandler)
+        self.server.daemon_threads = True
+        self.server.service = ScoringService("we collect your personal information and share it with third parties", DICTIONARY)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(10)
+        sock.connect(self.socket_path)
+        self.connection = sock.makefile("rwb")
+
+    def tearDown(self):
+        self.connection.close()
+        self.server.shutdown()
+        self.server.server_close()
+        self.folder.cleanup()
+
+    def request(self, line):
+        self.connection.write(line.encode("utf-8") + b"\n")
+        self.connection.flush()
+        return json.loads(self.connection.readline())
+
+    def test_non_object_requests_keep_the_connection(self):
+        for line in ("[1]", '"x"', "3", "null"):
+            self.assertEqual(self.request(line)["error"], "request must be a JSON object")
+        self.assertIn("requests", self.request('{"op": "stats"}'))
+
+    def test_bad_requests_get_errors(self):
+        self.assertIn("error", self.request("not json"))
+        self.assertIn("error", self.request('{"op": "score", "texts": [1]}'))
+        self.assertIn("error", self.request('{"op": "nope"}'))
+        self.assertEqual(len(self.request('{"op": "score", "texts": ["we collect personal information"]}')["scores"]), 1)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,69 @@
+"""
+Privacy Policy Project
+broadcast.py
+Read-only inputs shared with every process in a pool.  Passing a large
+object as a task argument pickles it once per task, and leaving it as a
+module global only reaches the workers when they are forked.  Broadcast
+pickles each object once into a multiprocessing.shared_memory block;
+the pool initializer gets only the block names and calls attach(),
+which loads every object once per worker straight out of shared memory.
+Works the same under the fork, spawn and forkserver start methods.
+"""
+
+import pickle
+from multiprocessing import shared_memory
+
+attached = {}   # artifact name -> object, loaded once per process by attach()
+
+class Broadcast():
+    """
+    Parent side.  publish() everything the workers need before creating
+    the pool, pass handles() in its initargs, and close() once the pool
+    has been joined.
+    """
+    def __init__(self):
+        self.blocks = {}    # artifact name -> (SharedMemory, pickled size)
+
+    def publish(self, name, obj):
+        """
+        In:     artifact name, any picklable object.
+        Out:    N/A
+        """
+        data = pickle.dumps(obj, protocol=pickle.HIGHEST_PROTOCOL)
+        block = shared_memory.SharedMemory(create=True, size=max(len(data), 1))
+        block.buf[:len(data)] = data
+        self.blocks[name] = (block, len(data))
+
+    def handles(self):
+        """
+        Out:    dict of artifact name -> (block name, size), small enough
+                to hand to every worker.
+        """
+        return {name: (block.name, size) for name, (block, size) in self.blocks.items()}
+
+    def close(self):
+        """
+        Free every block.  Workers that already attached keep their copy.
+        """
+        for block, size in self.blocks.values():
+            block.close()
+            block.unlink()
+        self.blocks = {}
+
+def attach(handles):
+    """
+    Worker side, called from a pool initializer.  Objects are unpickled
+    directly from the shared block, without copying the pickle first.
+
+    In:     Broadcast.handles() of the parent.
+    Out:    dict of artifact name -> object (also kept in attached).
+    """
+    for name, (block_name, size) in handles.items():
+        block = shared_memory.SharedMemory(name=block_name)
+        try:
+            view = block.buf[:size]
+            attached[name] = pickle.loads(view)
+            view.release()
+        finally:
+            block.close()
+    return attached
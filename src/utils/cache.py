@@ -0,0 +1,213 @@
+"""
+Privacy Policy Project
+cache.py
+Persistent, size-bounded cache keyed by content digests.  Backed by a
+single SQLite file so it survives between runs and can be shared by
+every process in a pool: each process opens its own connection the
+first time it touches the cache.  Least recently used entries are
+evicted once the cache grows past max_entries.  Hits only read: the
+times entries were last used are kept in memory and written in batches
+with the next write, so lookups never contend for the write lock.
+"""
+
+import hashlib, os, pickle, sqlite3, time
+from multiprocessing import Value
+
+def digest(*parts):
+    """
+    SHA-256 hex digest of the given parts.  Strings are UTF-8 encoded
+    first, so a string and its bytes (e.g. the same html read in text
+    or binary mode) give the same digest.
+
+    In:     any number of str/bytes/int parts.
+    Out:    hex digest string.
+    """
+    sha = hashlib.sha256()
+    for part in parts:
+        if not isinstance(part, bytes):
+            part = str(part).encode("utf-8", "surrogatepass")
+        sha.update(str(len(part)).encode() + b":" + part)
+    return sha.hexdigest()
+
+def file_digest(path, chunk_size=1 << 20):
+    """
+    SHA-256 hex digest of a file's bytes, read a chunk at a time so
+    the file never has to fit in memory.
+
+    In:     path to file.
+    Out:    hex digest string.
+    """
+    sha = hashlib.sha256()
+    with open(path, "rb") as fp:
+        for chunk in iter(lambda: fp.read(chunk_size), b""):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+class DigestCache():
+    """
+    Key/value cache stored in SQLite.  Values can be any picklable
+    object.  Hit and miss counters are shared Values, so counts from
+    forked pool workers show up in the parent's stats().
+    """
+    def __init__(self, path, max_entries=20000, evict_every=100):
+        self.path = path
+        self.max_entries = max_entries
+        self.evict_every = evict_every
+        self.touched = {}       # key -> time it was last used, not yet written
+        self.hits = Value("i", 0)
+        self.misses = Value("i", 0)
+        self.connection = None
+        self.pid = None
+        self.puts = 0
+
+    def __getstate__(self):
+        """
+        Connections can't be pickled, e.g. when the cache is handed to
+        spawned pool workers; they open their own.
+        """
+        state = self.__dict__.copy()
+        state["connection"] = None
+        state["pid"] = None
+        state["touched"] = {}
+        return state
+
+    def connect(self):
+        """
+        Open (or reuse) this process's connection to the cache file.
+        Connections are never shared across a fork.
+        """
+        if self.connection is None or self.pid != os.getpid():
+            folder = os.path.dirname(self.path)
+            if folder and not os.path.exists(folder):
+                os.makedirs(folder, exist_ok=True)
+            self.connection = sqlite3.connect(self.path, timeout=60)
+            self.connection.execute("PRAGMA journal_mode=WAL")
+            self.connection.execute("CREATE TABLE IF NOT EXISTS cache (key TEXT PRIMARY KEY, value BLOB, last_used REAL)")
+            self.connection.commit()
+            self.pid = os.getpid()
+            self.puts = 0
+            self.touched = {}
+        return self.connection
+
+    def write_touched(self, connection):
+        """
+        Add the last used times recorded by get() and get_many() to the
+        current transaction.
+        """
+        if self.touched:
+            connection.executemany("UPDATE cache SET last_used = ? WHERE key = ?",
+                                   [(when, key) for key, when in self.touched.items()])
+            self.touched = {}
+
+    def flush(self):
+        """
+        Write the last used times of recent hits now instead of with
+        the next put.
+        """
+        if self.touched:
+            connection = self.connect()
+            self.write_touched(connection)
+            connection.commit()
+
+    def get(self, key):
+        """
+        Look up a key, counting the hit or miss.
+
+        In:     key string (usually from digest()).
+        Out:    cached value, or None if not present.
+        """
+        connection = self.connect()
+        row = connection.execute("SELECT value FROM cache WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            with self.misses.get_lock():
+                self.misses.value += 1
+            return None
+        self.touched[key] = time.time()
+        if len(self.touched) >= self.evict_every:
+            self.flush()
+        with self.hits.get_lock():
+            self.hits.value += 1
+        return pickle.loads(row[0])
+
+    def put(self, key, value):
+        """
+        Store a value, evicting the least recently used entries every
+        evict_every puts if the cache is over max_entries.
+
+        In:     key string, picklable value.
+        Out:    N/A
+        """
+        connection = self.connect()
+        self.write_touched(connection)
+        connection.execute("INSERT OR REPLACE INTO cache VALUES (?, ?, ?)",
+                           (key, pickle.dumps(value, pickle.HIGHEST_PROTOCOL), time.time()))
+        connection.commit()
+        self.puts += 1
+        if self.puts % self.evict_every == 0:
+            self.evict()
+
+    def get_many(self, keys):
+        """
+        Look up many keys in one query, counting a hit or miss for each.
+
+        In:     list of key strings.
+        Out:    dict of key -> cached value, for the keys present.
+        """
+        connection = self.connect()
+        keys = list(dict.fromkeys(keys))
+        found = {}
+        for start in range(0, len(keys), 500):     # stay below SQLite's limit on query parameters
+            chunk = keys[start:start + 500]
+            rows = connection.execute("SELECT key, value FROM cache WHERE key IN (" + ",".join("?" * len(chunk)) + ")", chunk)
+            found.update((key, pickle.loads(value)) for key, value in rows)
+        if found:
+            now = time.time()
+            self.touched.update((key, now) for key in found)
+            if len(self.touched) >= self.evict_every:
+                self.flush()
+        with self.hits.get_lock():
+            self.hits.value += len(found)
+        with self.misses.get_lock():
+            self.misses.value += len(keys) - len(found)
+        return found
+
+    def put_many(self, items):
+        """
+        Store many values in one transaction, evicting like put().
+
+        In:     dict of key string -> picklable value.
+        Out:    N/A
+        """
+        if not items:
+            return
+        connection = self.connect()
+        self.write_touched(connection)
+        now = time.time()
+        connection.executemany("INSERT OR REPLACE INTO cache VALUES (?, ?, ?)",
+                               [(key, pickle.dumps(value, pickle.HIGHEST_PROTOCOL), now) for key, value in items.items()])
+        connection.commit()
+        before = self.puts
+        self.puts += len(items)
+        if self.puts // self.evict_every > before // self.evict_every:
+            self.evict()
+
+    def evict(self):
+        """
+        Trim the cache back down to max_entries.
+        """
+        self.flush()
+        connection = self.connect()
+        count = connection.execute("SELECT COUNT(*) FROM cache").fetchone()[0]
+        if count > self.max_entries:
+            connection.execute("DELETE FROM cache WHERE key IN (SELECT key FROM cache ORDER BY last_used LIMIT ?)",
+                               (count - self.max_entries,))
+            connection.commit()
+
+    def stats(self):
+        """
+        Human readable hit/miss summary.
+        """
+        total = self.hits.value + self.misses.value
+        rate = 0.0 if total == 0 else self.hits.value / total * 100
+        return (str(self.hits.value) + " hits, " + str(self.misses.value) + " misses (" +
+                str(round(rate, 2)) + "% hit rate)")
@@ -0,0 +1,56 @@
+"""
+Privacy Policy Project
+memory.py
+Resident set size of the current process.  ru_maxrss only ever grows,
+so on Linux the peak is reset through /proc/self/clear_refs before each
+document and read back from VmHWM in /proc/self/status, which gives the
+peak of every single document a worker parses.  Where /proc isn't
+available the peak falls back to ru_maxrss, the peak of the whole
+process so far.
+"""
+
+import resource, sys
+
+def status_bytes(field):
+    """
+    In:     field of /proc/self/status given in kB, e.g. "VmRSS".
+    Out:    its value in bytes, or None if it can't be read.
+    """
+    try:
+        with open("/proc/self/status", "r") as fp:
+            for line in fp:
+                if line.startswith(field + ":"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return None
+
+def reset_peak_rss():
+    """
+    Start measuring a new peak from the current RSS.
+
+    Out:    True if the peak was reset, False if it can't be here.
+    """
+    try:
+        with open("/proc/self/clear_refs", "w") as fp:
+            fp.write("5")
+        return True
+    except OSError:
+        return False
+
+def current_rss():
+    """
+    Out:    resident set size in bytes, None if unknown.
+    """
+    return status_bytes("VmRSS")
+
+def peak_rss():
+    """
+    Out:    peak resident set size in bytes since the last
+            reset_peak_rss() (or the start of the process).
+    """
+    peak = status_bytes("VmHWM")
+    if peak is None:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        peak = peak if sys.platform == "darwin" else peak * 1024   # bytes on macOS, kB elsewhere
+    return peak
@@ -0,0 +1,103 @@
+"""
+Privacy Policy Project
+scheduler.py
+Size-aware task scheduling for process pools.  pool.map hands out tasks
+in os.listdir order, in chunks, and only returns once every result is
+in, so a worker that draws a huge policy near the end keeps the run
+going while the rest sit idle.  Scheduler dispatches the largest inputs
+first with imap_unordered, streams each result back as soon as it is
+done, and keeps track of how long every worker was busy so the effect
+on the tail of a run can be seen in report().
+"""
+
+import os, time
+
+def file_sizes(folder, files):
+    """
+    In:     folder (with trailing slash), list of filenames in it.
+    Out:    list of file sizes in bytes, 0 for missing files.
+    """
+    sizes = []
+    for fname in files:
+        try:
+            sizes.append(os.path.getsize(folder + fname))
+        except OSError:
+            sizes.append(0)
+    return sizes
+
+def timed_call(task):
+    """
+    Pool entry point wrapping the real task function.
+
+    In:     (function, task index, item).
+    Out:    (task index, worker pid, start time, end time, result).
+    """
+    function, i, item = task
+    start = time.time()
+    result = function(item)
+    return i, os.getpid(), start, time.time(), result
+
+class Scheduler():
+    """
+    Runs a function over a list of items on a pool, longest first.  With
+    chunksize 1 (the default) a worker only takes its next task once it
+    has finished the last one, so the largest items start early and the
+    small ones fill in the gaps at the end.
+    """
+    def __init__(self, chunksize=1):
+        self.chunksize = chunksize
+        self.busy = {}          # worker pid -> seconds spent in tasks
+        self.tasks = {}         # worker pid -> number of tasks run
+        self.finished = {}      # worker pid -> end time of its last task
+        self.start = None
+        self.end = None
+
+    def imap(self, pool, function, items, sizes=None):
+        """
+        In:     process pool, function of one item, list of items,
+                optional list of their sizes (e.g. from file_sizes).
+        Out:    generator of (item index, result) in completion order.
+        """
+        order = range(len(items))
+        if sizes is not None:
+            order = sorted(order, key=lambda i: sizes[i], reverse=True)
+        self.start = time.time()
+        tasks = [(function, i, items[i]) for i in order]
+        for i, pid, start, end, result in pool.imap_unordered(timed_call, tasks, chunksize=self.chunksize):
+            self.busy[pid] = self.busy.get(pid, 0.0) + (end - start)
+            self.tasks[pid] = self.tasks.get(pid, 0) + 1
+            self.finished[pid] = max(self.finished.get(pid, 0.0), end)
+            yield i, result
+        self.end = time.time()
+
+    def map(self, pool, function, items, sizes=None):
+        """
+        Like pool.map, results in the same order as items, but scheduled
+        like imap.
+        """
+        results = [None] * len(items)
+        for i, result in self.imap(pool, function, items, sizes):
+            results[i] = result
+        return results
+
+    def report(self):
+        """
+        Per-worker busy and idle time of the last run.  Idle time counts
+        from the start of the run to its end, so it includes the tail
+        where a worker had nothing left to do.
+
+        Out:    multi-line string.
+        """
+        if self.start is None or self.end is None:
+            return "Scheduler: nothing was run."
+        wall = self.end - self.start
+        total_busy = sum(self.busy.values())
+        lines = ["Scheduler: " + str(sum(self.tasks.values())) + " tasks on " + str(len(self.busy)) + " workers in " +
+                 str(round(wall, 2)) + " sec, workers busy " +
+                 str(round(total_busy / max(wall * len(self.busy), 1e-9) * 100, 1)) + "% of the time, " +
+                 "first worker ran out of tasks " + str(round(self.end - min(self.finished.values(), default=self.end), 2)) +
+                 " sec before the end."]
+        for pid in sorted(self.busy, key=self.busy.get, reverse=True):
+            lines.append("   worker " + str(pid) + ": " + str(self.tasks[pid]) + " tasks, " + str(round(self.busy[pid], 2)) +
+                         " sec busy, " + str(round(wall - self.busy[pid], 2)) + " sec idle")
+        return "\n".join(lines)
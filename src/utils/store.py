@@ -0,0 +1,109 @@
+"""
+Privacy Policy Project
+store.py
+Single-file output store for the parser-tokenizer.  Instead of up to
+seven small files per policy, every policy's parsed elements, tokenized
+sentences and summary statistics go into three tables of one SQLite
+database.  Each process opens its own connection, and everything for a
+policy is written as one batch in a single transaction, so re-running a
+policy replaces its rows rather than duplicating them.
+"""
+
+import json, os, sqlite3
+
+SCHEMA = [
+    """CREATE TABLE IF NOT EXISTS policies (
+        policy TEXT PRIMARY KEY,
+        success INTEGER,
+        coverage REAL,
+        remaining_text TEXT,
+        good_sentences INTEGER,
+        rule_hits TEXT,
+        sentence_lengths TEXT)""",
+    """CREATE TABLE IF NOT EXISTS elements (
+        policy TEXT,
+        seq_index INTEGER,
+        tag_type TEXT,
+        tag_index INTEGER,
+        preceded_by TEXT,
+        followed_by TEXT,
+        text TEXT)""",
+    """CREATE TABLE IF NOT EXISTS sentences (
+        policy TEXT,
+        seq_index INTEGER,
+        tag TEXT,
+        preceded_by TEXT,
+        followed_by TEXT,
+        sentence_index INTEGER,
+        text TEXT,
+        num_words INTEGER,
+        rule_hits TEXT)""",
+    "CREATE INDEX IF NOT EXISTS elements_policy ON elements (policy)",
+    "CREATE INDEX IF NOT EXISTS sentences_policy ON sentences (policy)",
+]
+
+class OutputStore():
+    """
+    Parser-tokenizer results for a whole run in one SQLite file.  Safe
+    to use from every process in a pool.
+    """
+    def __init__(self, path):
+        self.path = path
+        self.connection = None
+        self.pid = None
+
+    def connect(self):
+        """
+        Open (or reuse) this process's connection to the store, creating
+        the tables the first time.  Connections are never shared across
+        a fork.
+        """
+        if self.connection is None or self.pid != os.getpid():
+            folder = os.path.dirname(self.path)
+            if folder and not os.path.exists(folder):
+                os.makedirs(folder, exist_ok=True)
+            self.connection = sqlite3.connect(self.path, timeout=60)
+            self.connection.execute("PRAGMA journal_mode=WAL")
+            self.connection.execute("PRAGMA synchronous=NORMAL")
+            for statement in SCHEMA:
+                self.connection.execute(statement)
+            self.connection.commit()
+            self.pid = os.getpid()
+        return self.connection
+
+    def write_policy(self, policy, success, coverage, remaining_text, rule_hits, sentence_lengths, elements, sentences):
+        """
+        Replace everything stored for one policy in a single transaction.
+
+        In:     policy name, parse success boolean, coverage ratio,
+                unmatched text, rule_hits dict, list of sentence
+                lengths, element rows (seq_index, tag_type, tag_index,
+                preceded_by, followed_by, text), sentence rows
+                (seq_index, tag, preceded_by, followed_by,
+                sentence_index, text, num_words, rule_hits).
+        Out:    N/A
+        """
+        connection = self.connect()
+        with connection:
+            connection.execute("DELETE FROM elements WHERE policy = ?", (policy,))
+            connection.execute("DELETE FROM sentences WHERE policy = ?", (policy,))
+            connection.execute("INSERT OR REPLACE INTO policies VALUES (?, ?, ?, ?, ?, ?, ?)",
+                               (policy, int(success), coverage, remaining_text, rule_hits.get("GOOD", 0),
+                                json.dumps(rule_hits), json.dumps(sentence_lengths)))
+            connection.executemany("INSERT INTO elements VALUES (?, ?, ?, ?, ?, ?, ?)",
+                                   [(policy,) + tuple(row) for row in elements])
+            connection.executemany("INSERT INTO sentences VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                                   [(policy,) + tuple(row) for row in sentences])
+
+    def policy_stats(self, policies=None):
+        """
+        Rule hits and sentence lengths of every successfully parsed
+        policy, for rendering figures after the fact.
+
+        In:     optional list of policy names to restrict to.
+        Out:    list of (policy, rule_hits dict, sentence lengths list).
+        """
+        rows = self.connect().execute("SELECT policy, rule_hits, sentence_lengths FROM policies WHERE success = 1 ORDER BY policy")
+        wanted = None if policies is None else set(policies)
+        return [(policy, json.loads(rule_hits), json.loads(lengths)) for policy, rule_hits, lengths in rows
+                if wanted is None or policy in wanted]
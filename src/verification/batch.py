@@ -0,0 +1,187 @@
+"""
+Privacy Policy Project
+batch.py
+Batch verification scoring.  verify() fits a fresh TfidfVectorizer on
+the pair [ground_truth, policy] for every document.  With only two
+documents the smoothed idf of a term is 1.0 when it appears in both and
+ln(3/2) + 1 when it appears in one, so the cosine similarity of that fit
+can be computed exactly from raw term counts.  BatchScorer does this for
+a whole chunk of documents at once with a handful of sparse matrix
+products, and streams the scores back out.  Extra reference corpora
+(cookie policies, terms of service, ...) can be scored in the same pass.
+"""
+
+import argparse, itertools, math, os, time
+import numpy as np
+from sklearn.feature_extraction.text import CountVectorizer, HashingVectorizer
+
+ONE_SIDED_IDF = math.log(3 / 2) + 1 # smoothed idf of a term found in only one of two documents
+
+class BatchScorer():
+    """
+    Scores stripped policy texts against a ground truth string.  By
+    default every chunk is counted with its own CountVectorizer whose
+    columns are mapped onto the ground truth vocabulary, which gives
+    exactly the same scores as verify().  Passing n_features switches
+    to a stateless HashingVectorizer instead: memory per chunk is then
+    fixed, at the cost of (rare) hash collisions nudging the scores.
+    Peak memory is controlled by chunk_size in both modes.
+
+    references optionally maps extra class names (e.g. "cookie",
+    "terms") to their own reference corpus strings.  Every text is then
+    vectorized once and scored against the ground truth and all the
+    references with the same sparse matrix products; see score_matrix.
+    """
+    def __init__(self, ground_truth, chunk_size=1000, n_features=None, references=None):
+        self.chunk_size = chunk_size
+        self.n_features = n_features
+        references = references or {}
+        self.labels = ["policy"] + list(references)
+        corpora = [ground_truth] + [references[label] for label in self.labels[1:]]
+        if n_features is None:
+            counter = CountVectorizer()
+            counts = counter.fit_transform(corpora)
+            self.vocabulary = counter.vocabulary_
+        else:
+            self.hasher = HashingVectorizer(n_features=n_features, alternate_sign=False, norm=None)
+            counts = self.hasher.transform(corpora)
+        self.reference_counts = counts.toarray().astype(np.float64)     # one row per label
+        self.reference_sq_totals = (self.reference_counts ** 2).sum(axis=1)
+        self.ground_truth_counts = self.reference_counts[0]
+        self.ground_truth_sq_total = float(self.reference_sq_totals[0])
+
+    def count_chunk(self, texts):
+        """
+        Build the term count matrix for one chunk of texts, plus the
+        reference counts aligned to its columns.
+
+        In:     list of stripped texts.
+        Out:    (sparse count matrix, array of reference counts with
+                one column per label).
+        """
+        if self.n_features is not None:
+            return self.hasher.transform(texts), self.reference_counts.T
+        counter = CountVectorizer()
+        try:
+            counts = counter.fit_transform(texts)
+        except ValueError:
+            return None, None   # empty vocabulary, none of the texts contain a word
+        aligned = np.zeros((counts.shape[1], len(self.labels)))
+        for term, column in counter.vocabulary_.items():
+            reference_column = self.vocabulary.get(term)
+            if reference_column is not None:
+                aligned[column] = self.reference_counts[:, reference_column]
+        return counts, aligned
+
+    def score_matrix(self, texts):
+        """
+        Cosine similarity of every text against every reference, each
+        computed as verify() would for a [reference, text] TF-IDF fit.
+
+        In:     list of stripped texts.
+        Out:    numpy array of scores, one row per text and one column
+                per label (column 0 is the ground truth).
+        """
+        counts, references = self.count_chunk(texts)
+        if counts is None:
+            return np.zeros((len(texts), len(self.labels)))
+        counts = counts.astype(np.float64).tocsr()
+        weight = ONE_SIDED_IDF ** 2
+        squares = counts.multiply(counts).tocsr()
+        shared = (references > 0).astype(np.float64)
+        present = counts.copy()
+        present.data[:] = 1.0
+
+        dot = counts @ references
+        doc_norm = weight * np.asarray(squares.sum(axis=1)) - (weight - 1) * (squares @ shared)
+        reference_norm = weight * self.reference_sq_totals - (weight - 1) * (present @ (references * references))
+        denominator = np.sqrt(doc_norm * reference_norm)
+        scores = np.zeros(dot.shape)
+        nonzero = denominator > 0
+        scores[nonzero] = dot[nonzero] / denominator[nonzero]
+        return scores
+
+    def score_chunk(self, texts):
+        """
+        Ground truth scores for one chunk of texts.
+
+        In:     list of stripped texts.
+        Out:    numpy array of similarity scores.
+        """
+        return self.score_matrix(texts)[:, 0]
+
+    def iter_score_rows(self, texts):
+        """
+        Stream one row of per-label scores for every text, vectorizing
+        chunk_size texts at a time so the iterable is never held in
+        memory.
+
+        In:     iterable of stripped texts.
+        Out:    generator of numpy arrays (one score per label), in
+                input order.
+        """
+        texts = iter(texts)
+        while True:
+            chunk = list(itertools.islice(texts, self.chunk_size))
+            if not chunk:
+                return
+            for row in self.score_matrix(chunk):
+                yield row
+
+    def iter_scores(self, texts):
+        """
+        Stream ground truth scores for an iterable of texts.
+
+        In:     iterable of stripped texts.
+        Out:    generator of similarity scores, in input order.
+        """
+        for row in self.iter_score_rows(texts):
+            yield float(row[0])
+
+    def score(self, texts):
+        """
+        Convenience wrapper around iter_scores returning a list.
+        """
+        return list(self.iter_scores(texts))
+
+if __name__ == '__main__':
+    from sklearn.feature_extraction.text import TfidfVectorizer
+    from sklearn.metrics.pairwise import cosine_similarity
+    from verification.verify import get_ground_truth, remove_company_names, strip_text
+    argparse = argparse.ArgumentParser(description="Compare batch verification scores and speed against per-document TF-IDF fits.")
+    argparse.add_argument(  "ground_truth_html_dir",
+                            help="directory containing html files of verification ground truth vector.")
+    argparse.add_argument(  "policies_html_dir",
+                            help="directory containing html files to score.")
+    argparse.add_argument(  "-c", "--chunk_size",
+                            type=int,
+                            default=1000,
+                            required=False,
+                            help="number of documents vectorized per sparse matrix product.")
+    argparse.add_argument(  "-f", "--n_features",
+                            type=int,
+                            default=None,
+                            required=False,
+                            help="use a HashingVectorizer with this many features instead of an exact vocabulary.")
+    args = argparse.parse_args()
+
+    ground_truth = get_ground_truth(args.ground_truth_html_dir)
+    texts = []
+    for policy in sorted(os.listdir(args.policies_html_dir)):
+        with open(os.path.join(args.policies_html_dir, policy), "r") as fp:
+            texts.append(remove_company_names(strip_text(fp.read()), policy[:-5]) + " ")
+
+    start = time.perf_counter()
+    reference = []
+    for text in texts:
+        sparse_matrix = TfidfVectorizer().fit_transform([ground_truth, text])
+        reference.append(cosine_similarity(sparse_matrix)[0,1])
+    reference_time = time.perf_counter() - start
+    start = time.perf_counter()
+    scores = BatchScorer(ground_truth, args.chunk_size, args.n_features).score(texts)
+    batch_time = time.perf_counter() - start
+
+    print("Documents:          " + str(len(texts)))
+    print("Per-document fits:  " + str(round(reference_time, 3)) + " sec")
+    print("Batch scoring:      " + str(round(batch_time, 3)) + " sec (including ground truth vectorization)")
+    print("Max score diff:     " + str(max(abs(a - b) for a, b in zip(reference, scores))))
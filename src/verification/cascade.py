@@ -0,0 +1,153 @@
+"""
+Privacy Policy Project
+cascade.py
+Cheap-first verification cascade.  Most links the crawler follows are
+cookie banners, login pages or tiny redirect stubs that can be rejected
+long before they reach the english check and TF-IDF scoring.  The
+cascade runs a minimum length check, a privacy keyword density check
+and a sampled english check first, and only hands the survivors to the
+full scoring function.  Rejections and time spent are counted per stage.
+Runnable as a standalone script to check the thresholds against the
+ground truth (which must all survive) and see the rejection statistics
+on a directory of crawled pages.
+"""
+
+import argparse, os, time
+from multiprocessing import Value
+from verification.english import is_english
+
+PRIVACY_KEYWORDS = ["privacy", "personal", "information", "data", "cookie", "collect",
+                    "third part", "third-part", "consent", "shar", "disclos"]
+
+class StageStats():
+    """
+    Counters for one cascade stage, shared across forked workers.
+    """
+    def __init__(self, name):
+        self.name = name
+        self.checked = Value("i", 0)
+        self.rejected = Value("i", 0)
+        self.seconds = Value("d", 0.0)
+
+class VerificationCascade():
+    """
+    Runs the cheap stages in order and the expensive score_fn only on
+    pages that pass all of them.  Rejected pages score 0, the same as a
+    non-english page in verify().
+    """
+    def __init__(self, dictionary, score_fn, min_length=250, min_keyword_density=5.0, language_sample=200):
+        self.dictionary = dictionary
+        self.score_fn = score_fn
+        self.min_length = min_length
+        self.min_keyword_density = min_keyword_density
+        self.language_sample = language_sample
+        self.stages = [(StageStats("length"), self.check_length),
+                       (StageStats("keywords"), self.check_keywords),
+                       (StageStats("language"), self.check_language)]
+        self.scoring = StageStats("score")
+
+    def check_length(self, text):
+        return len(text) >= self.min_length
+
+    def check_keywords(self, text):
+        """
+        Privacy keyword (stem) hits per 1000 words must reach
+        min_keyword_density.
+        """
+        num_words = len(text.split())
+        if num_words == 0:
+            return False
+        lowered = text.lower()
+        hits = sum(lowered.count(keyword) for keyword in PRIVACY_KEYWORDS)
+        return hits * 1000 / num_words >= self.min_keyword_density
+
+    def check_language(self, text):
+        return is_english(self.dictionary, text, sample_size=self.language_sample)
+
+    def run(self, text):
+        """
+        In:     stripped text of the page.
+        Out:    score_fn(text) if the page passes every cheap stage,
+                otherwise 0.
+        """
+        for stats, check in self.stages:
+            start = time.perf_counter()
+            passed = check(text)
+            self.record(stats, time.perf_counter() - start, passed)
+            if not passed:
+                return 0
+        start = time.perf_counter()
+        score = self.score_fn(text)
+        self.record(self.scoring, time.perf_counter() - start, True)
+        return score
+
+    def record(self, stats, seconds, passed):
+        with stats.checked.get_lock():
+            stats.checked.value += 1
+        with stats.seconds.get_lock():
+            stats.seconds.value += seconds
+        if not passed:
+            with stats.rejected.get_lock():
+                stats.rejected.value += 1
+
+    def report(self):
+        """
+        Per-stage summary: pages checked, pages rejected, total and
+        average time.
+
+        Out:    multi-line string.
+        """
+        lines = ["Verification cascade:"]
+        for stats in [stats for stats, check in self.stages] + [self.scoring]:
+            average = 0.0 if stats.checked.value == 0 else stats.seconds.value / stats.checked.value * 1000
+            lines.append("   " + stats.name.ljust(9) + str(stats.checked.value).rjust(7) + " checked " +
+                         str(stats.rejected.value).rjust(7) + " rejected " +
+                         str(round(stats.seconds.value, 3)).rjust(9) + " sec (" + str(round(average, 3)) + " ms each)")
+        return "\n".join(lines)
+
+if __name__ == '__main__':
+    from verification.batch import BatchScorer
+    from verification.verify import get_ground_truth, remove_company_names, strip_text
+    argparse = argparse.ArgumentParser(description="Check cascade thresholds against the ground truth and report rejection statistics.")
+    argparse.add_argument(  "ground_truth_html_dir",
+                            help="directory containing html files of verification ground truth vector.")
+    argparse.add_argument(  "dictionary",
+                            help="txt file containing english-language dictionary.")
+    argparse.add_argument(  "policies_html_dir",
+                            nargs="?",
+                            default=None,
+                            help="optional directory of crawled html files to run the cascade over.")
+    argparse.add_argument(  "--min_length",
+                            type=int,
+                            default=250,
+                            help="minimum number of characters of stripped text.")
+    argparse.add_argument(  "--min_keyword_density",
+                            type=float,
+                            default=5.0,
+                            help="minimum privacy keyword hits per 1000 words.")
+    argparse.add_argument(  "--language_sample",
+                            type=int,
+                            default=200,
+                            help="number of words sampled for the cheap english check.")
+    args = argparse.parse_args()
+
+    def read_dir(html_dir):
+        texts = []
+        for policy in sorted(os.listdir(html_dir)):
+            with open(os.path.join(html_dir, policy), "rb") as fp:
+                texts.append((policy, remove_company_names(strip_text(fp.read()), policy[:-5]) + " "))
+        return texts
+
+    scorer = BatchScorer(get_ground_truth(args.ground_truth_html_dir))
+    score_fn = lambda text: scorer.score([text])[0] if is_english(args.dictionary, text) else 0
+    cascade = VerificationCascade(args.dictionary, score_fn, args.min_length, args.min_keyword_density, args.language_sample)
+    rejected = [policy for policy, text in read_dir(args.ground_truth_html_dir) if cascade.run(text) == 0]
+    if rejected:
+        print("Ground truth rejected by cheap stages: " + ", ".join(rejected))
+    else:
+        print("All ground truth policies pass the cheap stages.")
+    if args.policies_html_dir:
+        cascade = VerificationCascade(args.dictionary, score_fn, args.min_length, args.min_keyword_density, args.language_sample)
+        for policy, text in read_dir(args.policies_html_dir):
+            cascade.run(text)
+        print(cascade.report())
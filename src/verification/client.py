@@ -0,0 +1,78 @@
+"""
+Privacy Policy Project
+client.py
+Thin client for the verification scoring service in server.py.  Only
+uses the standard library, so tools that score through the service
+never pay to import sklearn or build the ground truth themselves.
+"""
+
+import json, os, socket
+
+class ScoringClient():
+    """
+    Connection to a running verification server.  Safe to create
+    before forking a pool: every process opens its own connection the
+    first time it sends a request.
+    """
+    def __init__(self, socket_path, timeout=None):
+        self.socket_path = socket_path
+        self.timeout = timeout
+        self.connection = None
+        self.pid = None
+        self.last_latency_ms = 0.0
+
+    def connect(self):
+        if self.connection is None or self.pid != os.getpid():
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.settimeout(self.timeout)
+            sock.connect(self.socket_path)
+            self.connection = sock.makefile("rwb")
+            self.pid = os.getpid()
+        return self.connection
+
+    def request(self, message):
+        """
+        Send one request and wait for its response.
+
+        In:     dict request (see server.py for the protocol).
+        Out:    dict response.
+        """
+        connection = self.connect()
+        connection.write((json.dumps(message) + "\n").encode("utf-8"))
+        connection.flush()
+        line = connection.readline()
+        if not line:
+            self.connection = None
+            raise ConnectionError("verification server closed the connection")
+        response = json.loads(line)
+        if "error" in response:
+            raise ValueError(response["error"])
+        self.last_latency_ms = response.get("latency_ms", 0.0)
+        return response
+
+    def score(self, texts):
+        """
+        In:     list of stripped policy texts.
+        Out:    list of cosine similarity scores against the ground
+                truth (0 for texts that aren't mostly english).
+        """
+        return self.request({"op": "score", "texts": list(texts)})["scores"]
+
+    def is_duplicate(self, texts, domains):
+        """
+        In:     list of stripped policy texts, list of their domains.
+        Out:    list of booleans, True where the server has already
+                seen that exact text.
+        """
+        return self.request({"op": "dedup", "texts": list(texts), "domains": list(domains)})["duplicates"]
+
+    def stats(self):
+        """
+        Out:    dict of server counters and latency statistics.
+        """
+        return self.request({"op": "stats"})
+
+    def close(self):
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
@@ -0,0 +1,186 @@
+"""
+Privacy Policy Project
+english.py
+English-language detection used by the crawler and verification.
+The dictionary is loaded once per process into a frozenset, and
+non-letter characters are removed with a byte translation table
+rather than one character at a time.  Runnable as a standalone script
+to benchmark throughput against the original implementation and to
+check that accept/reject decisions on a corpus have not changed.
+"""
+
+import argparse, os, string, time
+
+LETTERS_AND_SPACE = string.ascii_letters + " \t\n"
+NONLETTERS = bytes(sorted(set(range(128)) - set(LETTERS_AND_SPACE.encode("ascii"))))
+WORD_PERCENTAGE = 50    # default minimum % of words in the dictionary
+CHAR_PERCENTAGE = 85    # default minimum % of characters that are letters or whitespace
+
+dictionaries = {}   # dictionary path -> frozenset of words, one load per process
+
+def load_dictionary(dictionary):
+    """
+    Read the english dictionary (one upper-case word per line) into a
+    frozenset.  The result is cached for the lifetime of the process,
+    so every call after the first for a given path is free.
+
+    In:     string path to dictionary txt file.
+    Out:    frozenset of dictionary words.
+    """
+    if dictionary not in dictionaries:
+        with open(dictionary, "r") as fp:
+            dictionaries[dictionary] = frozenset(fp.read().split("\n"))
+    return dictionaries[dictionary]
+
+def remove_nonletters(html_contents):
+    """
+    Remove everything that isn't an ASCII letter, space, tab or
+    newline.  Non-ASCII characters are dropped by the encode and the
+    remaining symbols by a single bytes.translate call.
+
+    In:     string of text.
+    Out:    string of text containing only letters and whitespace.
+    """
+    return html_contents.encode("ascii", "ignore").translate(None, NONLETTERS).decode("ascii")
+
+def sample_words(words, sample_size):
+    """
+    Take an evenly spaced, deterministic sample of at most sample_size
+    words so very long documents can be scored in bounded time.
+
+    In:     list of words, maximum number of words to keep (None = all).
+    Out:    list of words.
+    """
+    if sample_size is None or len(words) <= sample_size:
+        return words
+    return [words[i * len(words) // sample_size] for i in range(sample_size)]
+
+def get_english_count(dictionary, html_contents, sample_size=None):
+    """
+    Fraction of the words in the text that appear in the dictionary.
+
+    In:     string path to dictionary, string of text, optional
+            maximum number of words to score.
+    Out:    float between 0.0 and 1.0.
+    """
+    english_words = load_dictionary(dictionary)
+    possible_words = sample_words(remove_nonletters(html_contents.upper()).split(), sample_size)
+    if possible_words == []:
+        return 0.0 # no words at all, so return 0.0
+    matches = sum(map(english_words.__contains__, possible_words))
+    return float(matches) / len(possible_words)
+
+def english_ratios(dictionary, html_contents, sample_size=None):
+    """
+    The two measurements is_english makes, for callers that want to
+    keep them (e.g. the verification score store).
+
+    In:     string path to dictionary, string of text, optional
+            maximum number of words to score.
+    Out:    tuple of (fraction of words in the dictionary, fraction
+            of characters that are letters or whitespace).
+    """
+    words = get_english_count(dictionary, html_contents, sample_size)
+    if len(html_contents) == 0:
+        letters = 0.0
+    else:
+        letters = float(len(remove_nonletters(html_contents))) / len(html_contents)
+    return words, letters
+
+def ratios_are_english(ratios, wordPercentage=WORD_PERCENTAGE, charPercentage=CHAR_PERCENTAGE):
+    """
+    In:     tuple returned by english_ratios, minimum percentages.
+    Out:    boolean of whether the text is mostly english.
+    """
+    words, letters = ratios
+    return words * 100 >= wordPercentage and letters * 100 >= charPercentage
+
+def is_english(dictionary, html_contents, wordPercentage=WORD_PERCENTAGE, charPercentage=CHAR_PERCENTAGE, sample_size=None):
+    """
+    Some policies in the crawl won't be english-language because
+    privacy policies are often written in multiple languages.  None
+    of those should have a high similarity score, but this method of
+    flagging foreign language documents is faster than the full cosine
+    similarity score, so remove these first.  By default, 50% of the
+    words in the document should be in the english dictionary, and 85%
+    of the characters should be letters rather than numbers or symbols.
+
+    In:     string path to dictionary, string representaiton of the
+            text to be verified as english, optional maximum number of
+            words to score against the dictionary.
+    Out:    boolean of whether the text is mostly english
+    """
+    return ratios_are_english(english_ratios(dictionary, html_contents, sample_size), wordPercentage, charPercentage)
+
+def reference_is_english(dictionary, html_contents, wordPercentage=50, charPercentage=85):
+    """
+    The original implementation (dictionary re-read on every call,
+    per-character filtering), kept only so the benchmark below can
+    measure against it and confirm the decisions match.
+    """
+    def load(dictionary):
+        dictionaryFile = open(dictionary)
+        ENGLISH_WORDS = {}
+        for word in dictionaryFile.read().split("\n"):
+            ENGLISH_WORDS[word] = None
+        dictionaryFile.close()
+        return ENGLISH_WORDS
+    def nonletters(text):
+        lettersOnly = []
+        for symbol in text:
+            if symbol in LETTERS_AND_SPACE:
+                lettersOnly.append(symbol)
+        return "".join(lettersOnly)
+    ENGLISH_WORDS = load(dictionary)
+    possibleWords = nonletters(html_contents.upper()).split()
+    if possibleWords == []:
+        count = 0.0
+    else:
+        count = float(sum(1 for word in possibleWords if word in ENGLISH_WORDS)) / len(possibleWords)
+    numLetters = len(nonletters(html_contents))
+    letters = 0 if len(html_contents) == 0 else float(numLetters) / len(html_contents) * 100
+    return count * 100 >= wordPercentage and letters >= charPercentage
+
+if __name__ == '__main__':
+    from verification.verify import remove_company_names, strip_text
+    argparse = argparse.ArgumentParser(description="Benchmark english detection against the original implementation.")
+    argparse.add_argument(  "dictionary",
+                            help="txt file containing english-language dictionary.")
+    argparse.add_argument(  "html_dir",
+                            help="directory containing html files to check (e.g. the ground truth).")
+    argparse.add_argument(  "-r", "--repeat",
+                            type=int,
+                            default=3,
+                            required=False,
+                            help="number of passes over the corpus for each implementation.")
+    argparse.add_argument(  "-s", "--sample_size",
+                            type=int,
+                            default=None,
+                            required=False,
+                            help="only score this many words per document with the new implementation.")
+    args = argparse.parse_args()
+
+    texts = []
+    for policy in sorted(os.listdir(args.html_dir)):
+        with open(os.path.join(args.html_dir, policy), "rb") as fp:
+            texts.append((policy, remove_company_names(strip_text(fp.read()), policy[:-5]) + " "))
+    total_mb = sum(len(text) for name, text in texts) * args.repeat / 1e6
+
+    start = time.perf_counter()
+    for i in range(args.repeat):
+        old = [reference_is_english(args.dictionary, text) for name, text in texts]
+    old_time = time.perf_counter() - start
+    start = time.perf_counter()
+    for i in range(args.repeat):
+        new = [is_english(args.dictionary, text, sample_size=args.sample_size) for name, text in texts]
+    new_time = time.perf_counter() - start
+
+    print("Documents: " + str(len(texts)) + " (" + str(round(total_mb / args.repeat, 2)) + " MB of text)")
+    print("Original:  " + str(round(len(texts) * args.repeat / old_time, 1)) + " docs/sec, " + str(round(total_mb / old_time, 2)) + " MB/sec")
+    print("New:       " + str(round(len(texts) * args.repeat / new_time, 1)) + " docs/sec, " + str(round(total_mb / new_time, 2)) + " MB/sec")
+    print("Speedup:   " + str(round(old_time / new_time, 1)) + "x")
+    mismatches = [name for (name, text), a, b in zip(texts, old, new) if a != b]
+    if mismatches:
+        print("Decisions differ for: " + ", ".join(mismatches))
+    else:
+        print("Decisions identical for all " + str(len(texts)) + " documents (" + str(sum(new)) + " accepted).")
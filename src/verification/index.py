@@ -0,0 +1,238 @@
+"""
+Privacy Policy Project
+index.py
+Nearest-neighbour index over the ground truth.  Instead of one
+concatenated ground truth string, every human-verified policy keeps
+its own hashed term vector, and a query returns the top-k most similar
+verified policies with their cosine similarity.  Documents are hashed,
+so new ground truth files can be added without re-vectorizing the
+existing ones; document frequencies are kept incrementally and the idf
+weighting is applied at query time.  Queries only touch the postings of
+the terms they contain and only score the documents found there, so a
+query costs time in proportion to those postings rather than to the
+number of documents.  max_terms (1000 by default) caps the postings
+each document contributes, dropping its lowest tf-idf terms first, so
+the postings of the most common terms stop growing with the corpus.
+Standalone for now: verify.py and the crawler still score against the
+concatenated ground truth.
+"""
+
+import argparse, os, time
+import numpy as np
+import scipy.sparse as sp
+from sklearn.feature_extraction.text import HashingVectorizer
+
+class GroundTruthIndex():
+    """
+    Sparse top-k cosine similarity index, one row per ground truth
+    document.  Rows hold sublinear term frequencies (1 + log tf).
+    """
+    def __init__(self, n_features=2**20, max_terms=1000):
+        self.n_features = n_features
+        self.max_terms = max_terms
+        self.hasher = HashingVectorizer(n_features=n_features, alternate_sign=False, norm=None)
+        self.names = []
+        self.known = set()  # names, so a document is only ever indexed once
+        self.pending = []   # rows added since the postings were last built
+        self.doc_freq = np.zeros(n_features, dtype=np.int64)
+        self.postings = sp.csc_matrix((0, n_features))
+        self.row_norms = np.zeros(0)
+        self.stale = False
+
+    def vectorize(self, texts):
+        """
+        Hash texts into sublinear term frequency rows.
+
+        In:     list of stripped texts.
+        Out:    CSR matrix, one row per text.
+        """
+        rows = self.hasher.transform(texts).tocsr().astype(np.float64)
+        rows.data = 1 + np.log(rows.data)
+        return rows
+
+    def idf(self):
+        """
+        Smoothed idf for the current document frequencies.
+        """
+        return np.log((1 + len(self.names)) / (1 + self.doc_freq)) + 1
+
+    def prune(self, rows):
+        """
+        Keep only the max_terms highest tf-idf terms of each row.
+        """
+        if self.max_terms is None:
+            return rows
+        idf = self.idf()
+        rows = rows.tolil()
+        for i in range(rows.shape[0]):
+            columns = np.array(rows.rows[i], dtype=np.int64)
+            if len(columns) > self.max_terms:
+                values = np.array(rows.data[i])
+                keep = np.sort(np.argpartition(values * idf[columns], -self.max_terms)[-self.max_terms:])
+                rows.rows[i] = list(columns[keep])
+                rows.data[i] = list(values[keep])
+        return rows.tocsr()
+
+    def add(self, names, texts):
+        """
+        Add ground truth documents to the index.  Only the new texts
+        are vectorized; documents whose name is already in the index
+        are skipped.
+
+        In:     list of document names, list of their stripped texts.
+        Out:    number of documents added.
+        """
+        new = {}
+        for name, text in zip(names, texts):
+            if name not in self.known and name not in new:
+                new[name] = text
+        if not new:
+            return 0
+        rows = self.vectorize(list(new.values()))
+        self.names.extend(new)
+        self.known.update(new)
+        self.doc_freq += np.bincount(rows.indices, minlength=self.n_features)
+        self.pending.append(self.prune(rows))
+        self.stale = True
+        return len(new)
+
+    def refresh(self):
+        """
+        Fold pending rows into the column-major postings and recompute
+        the idf-weighted row norms.  Done lazily by the first query
+        after an add.
+        """
+        if not self.stale:
+            return
+        self.postings = sp.vstack([self.postings.tocsr()] + self.pending).tocsc()
+        self.pending = []
+        weights = self.idf() ** 2
+        squares = self.postings.multiply(self.postings).tocsr()
+        self.row_norms = np.sqrt(squares @ weights)
+        self.stale = False
+
+    def query(self, texts, k=5):
+        """
+        Find the k most similar ground truth documents for each text.
+
+        In:     list of stripped texts, number of neighbours to return.
+        Out:    list (one per text) of up to k [(document name, score),
+                ...] sorted by descending score.  Only documents sharing
+                at least one term with the text are candidates.
+        """
+        self.refresh()
+        if len(self.names) == 0:
+            return [[] for text in texts]
+        idf = self.idf()
+        queries = self.vectorize(texts)
+        results = []
+        for i in range(queries.shape[0]):
+            columns = queries.indices[queries.indptr[i]:queries.indptr[i+1]]
+            weighted = queries.data[queries.indptr[i]:queries.indptr[i+1]] * idf[columns]
+            query_norm = np.sqrt(np.dot(weighted, weighted))
+            if query_norm == 0:
+                results.append([])
+                continue
+            # gather the postings of the query's columns straight from the CSC arrays
+            starts = self.postings.indptr[columns]
+            lengths = self.postings.indptr[columns + 1] - starts
+            if lengths.sum() == 0:
+                results.append([])
+                continue
+            positions = np.repeat(starts - np.cumsum(lengths) + lengths, lengths) + np.arange(lengths.sum())
+            contributions = self.postings.data[positions] * np.repeat(weighted * idf[columns], lengths)
+            candidates, inverse = np.unique(self.postings.indices[positions], return_inverse=True)
+            scores = np.bincount(inverse, weights=contributions) / (self.row_norms[candidates] * query_norm)
+            top = min(k, len(scores))
+            best = np.argpartition(-scores, top - 1)[:top]
+            best = best[np.argsort(-scores[best])]
+            results.append([(self.names[candidates[j]], float(scores[j])) for j in best])
+        return results
+
+    def save(self, path):
+        """
+        Write the index to a numpy .npz file.
+        """
+        self.refresh()
+        postings = self.postings.tocsr()
+        np.savez_compressed(path, data=postings.data, indices=postings.indices, indptr=postings.indptr,
+                            names=np.array(self.names), doc_freq=self.doc_freq,
+                            settings=np.array([self.n_features, -1 if self.max_terms is None else self.max_terms]))
+
+    @classmethod
+    def load(cls, path):
+        """
+        Read an index written by save().
+        """
+        with np.load(path) as stored:
+            n_features, max_terms = [int(v) for v in stored["settings"]]
+            index = cls(n_features, None if max_terms == -1 else max_terms)
+            index.names = [str(name) for name in stored["names"]]
+            index.known = set(index.names)
+            index.doc_freq = stored["doc_freq"]
+            index.pending = [sp.csr_matrix((stored["data"], stored["indices"], stored["indptr"]),
+                                           shape=(len(index.names), n_features))]
+        index.stale = True
+        return index
+
+def read_policies(files):
+    """
+    Strip and clean html files the same way get_ground_truth does.
+
+    In:     list of html file paths.
+    Out:    list of names, list of stripped texts.
+    """
+    from verification.verify import remove_company_names, strip_text
+    names = []
+    texts = []
+    for path in files:
+        with open(path, "rb") as fp:
+            html_contents = fp.read()
+        policy = os.path.basename(path)
+        names.append(policy)
+        texts.append(remove_company_names(strip_text(html_contents), policy[:-5]))
+    return names, texts
+
+if __name__ == '__main__':
+    argparse = argparse.ArgumentParser(description="Build, extend and query a nearest-neighbour index of the ground truth.")
+    argparse.add_argument(  "command",
+                            choices=["build", "add", "query"],
+                            help="build a new index from a directory, add html files to an index, or query it with html files.")
+    argparse.add_argument(  "index_file",
+                            help="npz file holding the index.")
+    argparse.add_argument(  "paths",
+                            nargs="+",
+                            help="ground truth directory (build) or html files (add/query).")
+    argparse.add_argument(  "-k", "--top_k",
+                            type=int,
+                            default=3,
+                            required=False,
+                            help="number of neighbours to report per query.")
+    argparse.add_argument(  "-m", "--max_terms",
+                            type=int,
+                            default=1000,
+                            required=False,
+                            help="maximum number of terms each document keeps in the index, 0 for all of them (build only).")
+    args = argparse.parse_args()
+
+    if args.command == "build":
+        files = [os.path.join(args.paths[0], f) for f in sorted(os.listdir(args.paths[0]))]
+        index = GroundTruthIndex(max_terms=args.max_terms or None)
+        index.add(*read_policies(files))
+        index.save(args.index_file)
+        print("Indexed " + str(len(index.names)) + " documents.")
+    elif args.command == "add":
+        index = GroundTruthIndex.load(args.index_file)
+        added = index.add(*read_policies(args.paths))
+        index.save(args.index_file)
+        print("Added " + str(added) + " documents, index now holds " + str(len(index.names)) + ".")
+    else:
+        index = GroundTruthIndex.load(args.index_file)
+        names, texts = read_policies(args.paths)
+        index.refresh()
+        start = time.perf_counter()
+        results = index.query(texts, args.top_k)
+        elapsed = time.perf_counter() - start
+        for name, neighbours in zip(names, results):
+            print(name + ": " + ", ".join(n + " (" + str(round(s, 2)) + ")" for n, s in neighbours))
+        print(str(round(elapsed / len(texts) * 1000, 2)) + " ms per query over " + str(len(index.names)) + " documents.")
@@ -0,0 +1,144 @@
+"""
+Privacy Policy Project
+progressive.py
+Progressive prefix scoring.  Huge pages are usually clearly a policy
+(or clearly not) long before the end of their text.  ProgressiveScorer
+consumes the stripped text a chunk at a time, keeping running sums
+from which the exact verify()/BatchScorer similarity of the prefix read
+so far can be computed, and stops as soon as the estimate has stayed
+confidently above or below the threshold for a few chunks.  Runnable as
+a standalone script to confirm early decisions match full scoring on a
+directory of html files and see how much text was actually read.
+"""
+
+import argparse, math, os, re
+from sklearn.feature_extraction.text import CountVectorizer
+from verification.batch import ONE_SIDED_IDF
+
+WHITESPACE = re.compile(r"\s")
+
+class ProgressiveResult():
+    def __init__(self, score, accepted, processed, total, early):
+        self.score = score          # similarity of the prefix that was read (full score if not early)
+        self.accepted = accepted    # score >= threshold
+        self.processed = processed  # characters of text read
+        self.total = total          # characters of text available
+        self.early = early          # True if scoring stopped before the end of the text
+
+class ProgressiveScorer():
+    """
+    Incremental version of BatchScorer's exact scoring for one text at
+    a time.  Chunks always end on whitespace so no token is ever split.
+    Scoring stops early once at least min_chars have been read and the
+    estimate has been more than margin away from the threshold, on the
+    same side, for patience consecutive chunks.
+    """
+    def __init__(self, scorer, threshold, chunk_chars=10000, min_chars=20000, margin=0.15, patience=3):
+        if scorer.n_features is not None:
+            raise ValueError("progressive scoring needs an exact (non-hashing) BatchScorer")
+        self.vocabulary = scorer.vocabulary
+        self.ground_truth_counts = scorer.ground_truth_counts
+        self.ground_truth_sq_total = scorer.ground_truth_sq_total
+        self.analyzer = CountVectorizer().build_analyzer()
+        self.threshold = threshold
+        self.chunk_chars = chunk_chars
+        self.min_chars = min_chars
+        self.margin = margin
+        self.patience = patience
+
+    def chunks(self, text):
+        """
+        Split text into chunks of roughly chunk_chars characters, each
+        ending just after a whitespace character (or at the end).
+
+        Out:    generator of (chunk, characters read so far).
+        """
+        start = 0
+        while start < len(text):
+            end = start + self.chunk_chars
+            match = WHITESPACE.search(text, end) if end < len(text) else None
+            end = match.end() if match else len(text)
+            yield text[start:end], end
+            start = end
+
+    def score(self, text):
+        """
+        In:     stripped text of the page.
+        Out:    ProgressiveResult.
+        """
+        weight = ONE_SIDED_IDF ** 2
+        counts = {}
+        dot = 0.0           # sum of gt * doc counts over shared terms
+        doc_sq = 0.0        # sum of squared doc counts
+        shared_doc_sq = 0.0 # ... over terms also in the ground truth
+        shared_gt_sq = 0.0  # sum of squared gt counts over terms seen in the doc
+        streak = 0
+        side = None
+        score = 0.0
+        processed = 0
+        for chunk, processed in self.chunks(text):
+            for term in self.analyzer(chunk):
+                old = counts.get(term, 0)
+                counts[term] = old + 1
+                doc_sq += 2 * old + 1
+                column = self.vocabulary.get(term)
+                gt = 0.0 if column is None else self.ground_truth_counts[column]
+                if gt > 0:     # vocabulary may include terms only found in other references
+                    dot += gt
+                    shared_doc_sq += 2 * old + 1
+                    if old == 0:
+                        shared_gt_sq += gt * gt
+            doc_norm = weight * doc_sq - (weight - 1) * shared_doc_sq
+            gt_norm = weight * self.ground_truth_sq_total - (weight - 1) * shared_gt_sq
+            score = dot / math.sqrt(doc_norm * gt_norm) if doc_norm > 0 else 0.0
+            if processed >= len(text):
+                break
+            if processed >= self.min_chars and abs(score - self.threshold) > self.margin:
+                current = score >= self.threshold
+                streak = streak + 1 if current == side else 1
+                side = current
+                if streak >= self.patience:
+                    return ProgressiveResult(score, current, processed, len(text), True)
+            else:
+                streak = 0
+                side = None
+        return ProgressiveResult(score, score >= self.threshold, processed, len(text), False)
+
+if __name__ == '__main__':
+    from verification.batch import BatchScorer
+    from verification.verify import get_ground_truth, remove_company_names, strip_text
+    argparse = argparse.ArgumentParser(description="Compare progressive prefix scoring with full scoring.")
+    argparse.add_argument(  "cos_sim_threshold",
+                            type=float,
+                            help="minimum cosine similarity to be considered a policy.")
+    argparse.add_argument(  "ground_truth_html_dir",
+                            help="directory containing html files of verification ground truth vector.")
+    argparse.add_argument(  "policies_html_dir",
+                            help="directory containing html files to score.")
+    argparse.add_argument(  "--chunk_chars", type=int, default=10000, help="characters consumed per step.")
+    argparse.add_argument(  "--min_chars", type=int, default=20000, help="characters read before stopping is allowed.")
+    argparse.add_argument(  "--margin", type=float, default=0.15, help="distance from the threshold needed to stop.")
+    argparse.add_argument(  "--patience", type=int, default=3, help="consecutive confident chunks needed to stop.")
+    args = argparse.parse_args()
+
+    scorer = BatchScorer(get_ground_truth(args.ground_truth_html_dir))
+    progressive = ProgressiveScorer(scorer, args.cos_sim_threshold, args.chunk_chars, args.min_chars, args.margin, args.patience)
+    mismatches = []
+    processed = 0
+    total = 0
+    for policy in sorted(os.listdir(args.policies_html_dir)):
+        with open(os.path.join(args.policies_html_dir, policy), "rb") as fp:
+            text = remove_company_names(strip_text(fp.read()), policy[:-5]) + " "
+        full = scorer.score([text])[0]
+        result = progressive.score(text)
+        processed += result.processed
+        total += result.total
+        if result.accepted != (full >= args.cos_sim_threshold):
+            mismatches.append(policy)
+        print(policy + ": full " + str(round(full, 3)) + ", progressive " + str(round(result.score, 3)) +
+              " after " + str(round(result.processed / max(result.total, 1) * 100, 1)) + "% of the text")
+    print("Read " + str(round(processed / max(total, 1) * 100, 1)) + "% of all text.")
+    if mismatches:
+        print("Decisions differ for: " + ", ".join(mismatches))
+    else:
+        print("Decisions match full scoring for every file.")
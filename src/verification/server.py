@@ -0,0 +1,228 @@
+"""
+Privacy Policy Project
+server.py
+Long-lived verification scoring service.  Builds the ground truth and
+loads the english dictionary once, then answers score and dedup
+requests from any number of local clients over a Unix socket (see
+client.py).  Score requests that arrive close together are merged into
+one micro-batch and scored with a single BatchScorer pass.
+
+Protocol: one JSON object per line in each direction.
+    {"op": "score", "texts": [...]}                 -> {"scores": [...]}
+    {"op": "dedup", "texts": [...], "domains": [...]} -> {"duplicates": [...]}
+    {"op": "stats"}                                 -> {"requests": ..., ...}
+Every response also carries "latency_ms" for that request.
+"""
+
+import argparse, json, os, queue, signal, socketserver, threading, time
+from utils.cache import digest
+from verification.batch import BatchScorer
+from verification.english import is_english, load_dictionary
+from verification.verify import get_ground_truth, set_strip_cache
+
+class ScoreJob():
+    def __init__(self, texts):
+        self.texts = texts
+        self.scores = None
+        self.error = None
+        self.done = threading.Event()
+
+class ScoringService():
+    """
+    Holds the model state and the micro-batching thread.  submit() is
+    called from the socket handler threads and blocks until the batch
+    containing its texts has been scored.
+    """
+    def __init__(self, ground_truth, dictionary, batch_size=256, batch_wait=0.005):
+        self.scorer = BatchScorer(ground_truth, chunk_size=batch_size)
+        self.dictionary = dictionary
+        load_dictionary(dictionary)
+        self.batch_size = batch_size
+        self.batch_wait = batch_wait
+        self.jobs = queue.Queue()
+        self.policy_dict = {}           # digest of policy text -> domain it was first seen on
+        self.lock = threading.Lock()    # protects policy_dict and the counters below
+        self.requests = 0
+        self.batches = 0
+        self.texts_scored = 0
+        self.latency_total = 0.0
+        self.latency_max = 0.0
+        threading.Thread(target=self.batch_loop, daemon=True).start()
+
+    def submit(self, texts):
+        """
+        Queue texts for scoring and wait for the result.
+
+        In:     list of stripped texts.
+        Out:    list of similarity scores (0 for non-english texts).
+                Raises ValueError if scoring its batch failed.
+        """
+        job = ScoreJob(texts)
+        self.jobs.put(job)
+        job.done.wait()
+        if job.error is not None:
+            raise ValueError("scoring failed: " + job.error)
+        return job.scores
+
+    def batch_loop(self):
+        """
+        Gather every job that arrives within batch_wait seconds of the
+        first (up to batch_size texts) and score them together.  If
+        scoring fails, every job of the batch gets the error, so no
+        client is left waiting and the thread keeps serving.
+        """
+        while True:
+            batch = [self.jobs.get()]
+            size = len(batch[0].texts)
+            deadline = time.perf_counter() + self.batch_wait
+            while size < self.batch_size:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                try:
+                    job = self.jobs.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                batch.append(job)
+                size += len(job.texts)
+            try:
+                texts = [text for job in batch for text in job.texts]
+                english = [is_english(self.dictionary, text) for text in texts]
+                scores = self.scorer.score([text if ok else "" for text, ok in zip(texts, english)])
+                scores = [score if ok else 0 for score, ok in zip(scores, english)]
+                with self.lock:
+                    self.batches += 1
+                    self.texts_scored += len(texts)
+                for job in batch:
+                    job.scores, scores = scores[:len(job.texts)], scores[len(job.texts):]
+            except Exception as e:
+                for job in batch:
+                    job.error = type(e).__name__ + ": " + str(e)
+            finally:
+                for job in batch:
+                    job.done.set()
+
+    def dedup(self, texts, domains):
+        """
+        Same semantics as verify.is_duplicate_policy, against every
+        policy any client has sent to this service.
+
+        In:     list of stripped texts, list of their domains.
+        Out:    list of booleans, True if the text was already seen.
+        """
+        duplicates = []
+        with self.lock:
+            for text, domain in zip(texts, domains):
+                key = digest(text)
+                duplicates.append(key in self.policy_dict)
+                self.policy_dict.setdefault(key, domain)
+        return duplicates
+
+    def record_latency(self, latency):
+        with self.lock:
+            self.requests += 1
+            self.latency_total += latency
+            self.latency_max = max(self.latency_max, latency)
+
+    def stats(self):
+        with self.lock:
+            return {"requests": self.requests,
+                    "batches": self.batches,
+                    "texts_scored": self.texts_scored,
+                    "policies_seen": len(self.policy_dict),
+                    "latency_avg_ms": 0.0 if self.requests == 0 else self.latency_total / self.requests * 1000,
+                    "latency_max_ms": self.latency_max * 1000}
+
+def text_list(message, key):
+    """
+    In:     request message, key of a list of strings in it.
+    Out:    that list.  Raises TypeError if it isn't a list of strings.
+    """
+    texts = message[key]
+    if not isinstance(texts, list) or not all(isinstance(text, str) for text in texts):
+        raise TypeError('"' + key + '" must be a list of strings')
+    return texts
+
+class ScoringHandler(socketserver.StreamRequestHandler):
+    """
+    Reads newline-delimited JSON requests from one client connection
+    until it disconnects.
+    """
+    def handle(self):
+        service = self.server.service
+        for line in self.rfile:
+            start = time.perf_counter()
+            try:
+                message = json.loads(line)
+                if not isinstance(message, dict):
+                    raise TypeError("request must be a JSON object")
+                op = message.get("op")
+                if op == "score":
+                    response = {"scores": service.submit(text_list(message, "texts"))}
+                elif op == "dedup":
+                    response = {"duplicates": service.dedup(text_list(message, "texts"), text_list(message, "domains"))}
+                elif op == "stats":
+                    response = service.stats()
+                else:
+                    response = {"error": "unknown op " + str(op)}
+            except (ValueError, KeyError, TypeError) as e:
+                response = {"error": str(e)}
+            latency = time.perf_counter() - start
+            service.record_latency(latency)
+            response["latency_ms"] = latency * 1000
+            self.wfile.write((json.dumps(response) + "\n").encode("utf-8"))
+            self.wfile.flush()
+
+def serve(socket_path, service):
+    """
+    Serve requests on socket_path until interrupted.
+
+    In:     path of the Unix socket to create, ScoringService.
+    Out:    N/A
+    """
+    if os.path.exists(socket_path):
+        os.remove(socket_path)
+    server = socketserver.ThreadingUnixStreamServer(socket_path, ScoringHandler)
+    server.daemon_threads = True
+    server.service = service
+    # serve_forever() runs in this thread, so shutdown() can't be called from a handler here: stop it like Ctrl-C instead
+    signal.signal(signal.SIGTERM, signal.default_int_handler)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        os.remove(socket_path)
+
+if __name__ == '__main__':
+    argparse = argparse.ArgumentParser(description="Serve verification scores over a Unix socket.")
+    argparse.add_argument(  "socket_path",
+                            help="path of the Unix socket to listen on.")
+    argparse.add_argument(  "ground_truth_html_dir",
+                            help="directory containing html files of verification ground truth vector.")
+    argparse.add_argument(  "dictionary",
+                            help="txt file containing english-language dictionary.")
+    argparse.add_argument(  "--batch_size",
+                            type=int,
+                            default=256,
+                            required=False,
+                            help="maximum number of texts scored in one micro-batch.")
+    argparse.add_argument(  "--batch_wait",
+                            type=float,
+                            default=0.005,
+                            required=False,
+                            help="seconds to wait for more requests before scoring a micro-batch.")
+    argparse.add_argument(  "--strip_cache",
+                            default=None,
+                            required=False,
+                            help="sqlite file caching stripped text between runs.")
+    args = argparse.parse_args()
+    if args.strip_cache:
+        set_strip_cache(args.strip_cache)
+
+    print("Building ground truth...")
+    service = ScoringService(get_ground_truth(args.ground_truth_html_dir), args.dictionary, args.batch_size, args.batch_wait)
+    print("Listening on " + args.socket_path)
+    serve(args.socket_path, service)
+    print("Done")
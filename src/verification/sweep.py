@@ -0,0 +1,127 @@
+"""
+Privacy Policy Project
+sweep.py
+Score store and offline threshold sweep.  verify.py can save every
+file's similarity score, english ratios and duplicate flag once to a
+compact columnar .npz file (-s/--score_store).  This script then
+evaluates any number of cos_sim_threshold candidates from that file
+without re-parsing or re-scoring anything: acceptance counts, the
+borderline set around each threshold and, given a CSV of labeled
+files, precision and recall.
+"""
+
+import argparse, csv, os
+import numpy as np
+
+def save_scores(path, files, scores, word_ratios, letter_ratios, duplicates):
+    """
+    Write one row per verified file to a compressed .npz score store.
+
+    In:     output path, lists of filenames, similarity scores, english
+            word ratios, letter ratios and duplicate flags (same order).
+    Out:    N/A
+    """
+    np.savez_compressed(path,
+                        files=np.array(files, dtype=str),
+                        scores=np.array(scores, dtype=np.float64),
+                        word_ratios=np.array(word_ratios, dtype=np.float64),
+                        letter_ratios=np.array(letter_ratios, dtype=np.float64),
+                        duplicates=np.array(duplicates, dtype=bool))
+
+def load_scores(path):
+    """
+    In:     path of a score store written by save_scores.
+    Out:    dict of column name -> numpy array.
+    """
+    with np.load(path) as stored:
+        return {name: stored[name] for name in stored.files}
+
+def load_labels(path):
+    """
+    Read labeled files from a CSV of "file,label" rows, where label is
+    1/0 or true/false.  A header row is allowed.
+
+    In:     path to labels CSV.
+    Out:    dict of filename -> boolean (True = is a privacy policy).
+    """
+    labels = {}
+    with open(path, "r") as fp:
+        for row in csv.reader(fp):
+            if len(row) < 2:
+                continue
+            value = row[1].strip().lower()
+            if value in ("1", "true", "yes", "y"):
+                labels[row[0].strip()] = True
+            elif value in ("0", "false", "no", "n"):
+                labels[row[0].strip()] = False
+    return labels
+
+def sweep(store, thresholds, margin=0.05, labels=None):
+    """
+    Evaluate every threshold against the stored scores.  Duplicates are
+    never accepted, matching the crawler.
+
+    In:     score store dict, list of thresholds, borderline margin,
+            optional labels dict.
+    Out:    list of dicts, one per threshold.
+    """
+    scores = store["scores"]
+    candidates = ~store["duplicates"]
+    if labels:
+        labeled = np.array([f in labels for f in store["files"]])
+        truth = np.array([labels.get(f, False) for f in store["files"]])
+    results = []
+    for threshold in thresholds:
+        accepted = candidates & (scores >= threshold)
+        borderline = candidates & (scores > threshold - margin) & (scores < threshold + margin)
+        result = {"threshold": threshold,
+                  "accepted": int(accepted.sum()),
+                  "rejected": int(candidates.sum() - accepted.sum()),
+                  "borderline": list(store["files"][borderline])}
+        if labels:
+            true_pos = int((accepted & truth & labeled).sum())
+            false_pos = int((accepted & ~truth & labeled).sum())
+            false_neg = int((~accepted & truth & labeled).sum())
+            result["precision"] = true_pos / (true_pos + false_pos) if true_pos + false_pos else 0.0
+            result["recall"] = true_pos / (true_pos + false_neg) if true_pos + false_neg else 0.0
+        results.append(result)
+    return results
+
+if __name__ == '__main__':
+    argparse = argparse.ArgumentParser(description="Evaluate cosine similarity thresholds from a saved verification score store.")
+    argparse.add_argument(  "score_store",
+                            help="npz file written by verify.py -s/--score_store.")
+    argparse.add_argument(  "thresholds",
+                            type=float,
+                            nargs="+",
+                            help="cosine similarity thresholds to evaluate.")
+    argparse.add_argument(  "-l", "--labels",
+                            default=None,
+                            required=False,
+                            help="csv of file,label rows (1 = privacy policy) for precision/recall.")
+    argparse.add_argument(  "-m", "--margin",
+                            type=float,
+                            default=0.05,
+                            required=False,
+                            help="distance from the threshold counted as borderline.")
+    argparse.add_argument(  "-o", "--output_folder",
+                            default=None,
+                            required=False,
+                            help="if given, write each threshold's borderline files to this folder.")
+    args = argparse.parse_args()
+
+    store = load_scores(args.score_store)
+    labels = load_labels(args.labels) if args.labels else None
+    results = sweep(store, args.thresholds, args.margin, labels)
+    print("Files: " + str(len(store["files"])) + " (" + str(int(store["duplicates"].sum())) + " duplicates)")
+    for result in results:
+        line = ("threshold " + str(result["threshold"]) + ": " + str(result["accepted"]) + " accepted, " +
+                str(result["rejected"]) + " rejected, " + str(len(result["borderline"])) + " borderline")
+        if labels:
+            line += ", precision " + str(round(result["precision"], 3)) + ", recall " + str(round(result["recall"], 3))
+        print(line)
+        if args.output_folder:
+            if not os.path.exists(args.output_folder):
+                os.makedirs(args.output_folder)
+            with open(os.path.join(args.output_folder, "borderline_" + str(result["threshold"]) + ".txt"), "w") as fp:
+                fp.write("".join(f + "\n" for f in result["borderline"]))
@@ -8,64 +8,23 @@ Currently seems like ~60% is the cutoff.
 """
 
 import argparse, datetime, matplotlib, os, pandas as pd, re, signal
-from multiprocessing import Pool, Value, cpu_count, Manager
+from multiprocessing import Pool, Value, cpu_count, set_start_method, Manager
 import matplotlib.pyplot as plt
 from bs4 import BeautifulSoup, Comment, NavigableString
 from sklearn.feature_extraction.text import CountVectorizer, TfidfVectorizer
 from sklearn.metrics.pairwise import cosine_similarity
+from utils.broadcast import Broadcast, attach
+from utils.cache import DigestCache, digest
+from utils.scheduler import Scheduler, file_sizes
 from utils.utils import mkdir_clean, print_progress_bar, request
+from verification.batch import BatchScorer
+from verification.english import english_ratios, get_english_count, is_english, load_dictionary, ratios_are_english, remove_nonletters
+from verification.sweep import save_scores
 
-def load_dictionary(dictionary):
-    dictionaryFile = open(dictionary)
-    ENGLISH_WORDS = {}
-    for word in dictionaryFile.read().split("\n"):
-        ENGLISH_WORDS[word] = None
-        dictionaryFile.close()
-    return ENGLISH_WORDS
-
-def get_english_count(dictionary, html_contents):
-    ENGLISH_WORDS = load_dictionary(dictionary)
-    html_contents = html_contents.upper()
-    html_contents = remove_nonletters(html_contents)
-    possibleWords = html_contents.split()
-    if possibleWords == []:
-        return 0.0 # no words at all, so return 0.0
-    matches = 0
-    for word in possibleWords:
-        if word in ENGLISH_WORDS:
-            matches += 1
-    return float(matches) / len(possibleWords)
-
-def remove_nonletters(html_contents):
-    UPPERLETTERS = "ABCDEFGHIJKLMNOPQRSTUVWXYZ"
-    LETTERS_AND_SPACE = UPPERLETTERS + UPPERLETTERS.lower() + " \t\n"
-    lettersOnly = []
-    for symbol in html_contents:
-        if symbol in LETTERS_AND_SPACE:
-            lettersOnly.append(symbol)
-    return "".join(lettersOnly)
-
-def is_english(dictionary, html_contents, wordPercentage=50, charPercentage=85):
-    """
-    Some policies in the crawl won't be english-language because
-    privacy policies are often written in multiple languages.  None
-    of those should have a high similarity score, but this method of
-    flagging foreign language documents is faster than the full cosine
-    similarity score, so remove these first.  By default, 50% of the
-    words in the document should be in the english dictionary, and 85%
-    of the characters should be letters rather than numbers or symbols.
-
-    In:     string representaiton of the text to be verified as english
-    Out:    boolean of whether the text is mostly english
-    """
-    wordsMatch = get_english_count(dictionary, html_contents) * 100 >= wordPercentage
-    numLetters = len(remove_nonletters(html_contents))
-    if len(html_contents) == 0:
-        html_contentsLettersPercentage = 0
-    else:
-        html_contentsLettersPercentage = float(numLetters) / len(html_contents) * 100
-    lettersMatch = html_contentsLettersPercentage >= charPercentage
-    return wordsMatch and lettersMatch
+STRIP_RULES_VERSION = 1 # bump whenever remove_bad_tags/strip_text change which text is kept
+BAD_TAGS = ["style", "script", "noscript", "head", "title", "meta",
+            "[document]", "img", "iframe", "header", "footer", "nav"]
+strip_cache = None      # optional DigestCache of stripped text, see set_strip_cache
 
 def remove_bad_tags(soup):
     """
@@ -75,17 +34,49 @@ def remove_bad_tags(soup):
     In:     BeatifulSoup tree object.
     Out:    cleaned version of that BeatifulSoup tree object.
     """
-    bad_tags = ["style", "script", "noscript", "head", "title", "meta", 
-                "[document]", "img", "iframe", "header", "footer", "nav"]
-    for tag in soup(bad_tags):
+    for tag in soup(BAD_TAGS):
         tag.decompose()
     return soup
 
+def set_strip_cache(path, max_entries=20000):
+    """
+    Turn on the persistent stripped text cache for this process (and
+    any pool forked after this call).  Stripped text is keyed by a
+    digest of the HTML and STRIP_RULES_VERSION, so the crawler,
+    get_ground_truth and verify.py can all share one cache file.
+
+    In:     path to the cache file, maximum number of cached documents.
+    Out:    the DigestCache, so callers can report its stats().
+    """
+    global strip_cache
+    strip_cache = DigestCache(path, max_entries)
+    return strip_cache
+
 def strip_text(html):
     """
     This function takes in a html document represented as a string and
     removes all tags known to be irrelevant to the policy text, then
-    returns all the visible text elements in a single string.
+    returns all the visible text elements in a single string.  Uses the
+    stripped text cache if one has been set with set_strip_cache.
+
+    In:     string containing html document bytes
+    Out:    string containing text of visible policy text
+    """
+    if html == "" or strip_cache is None:
+        return strip_text_uncached(html)
+    # bs4 only applies a <meta charset> to bytes, so a str and its bytes
+    # can strip differently and mustn't share an entry
+    key = digest("strip", STRIP_RULES_VERSION, type(html).__name__, html)
+    text = strip_cache.get(key)
+    if text is None:
+        text = strip_text_uncached(html)
+        strip_cache.put(key, text)
+    return text
+
+def strip_text_uncached(html):
+    """
+    Does the actual work of strip_text: parse the html, remove bad
+    tags and join the visible strings.
 
     In:     string containing html document bytes
     Out:    string containing text of visible policy text
@@ -154,6 +145,40 @@ def is_duplicate_policy(link_contents, domain, policy_dict):
         policy_dict[link_contents] = domain
         return False
 
+def prepare_policy(policy):
+    """
+    Read and strip a policy, then run the checks that don't need the
+    ground truth: english-language and duplicate detection.
+
+    In:     policy filename
+    Out:    tuple of (stripped text, status, (word ratio, letter ratio))
+            where status is None if the policy still needs scoring,
+            otherwise the final score (0 for non-english, -2 for
+            duplicates), and the ratios are the english measurements.
+    """
+    if policy == ".DS_Store":
+        return "", 0, (0.0, 0.0)
+
+    with open(policies_html_dir + policy, "r") as fp:
+        html_contents = fp.read()
+    html_contents = remove_company_names(strip_text(html_contents), policy[:-5]) + " "
+
+    # Update progress bar
+    with index.get_lock():
+        index.value += 1
+        print_progress_bar(index.value, len(files), prefix = "Verification Progress:", suffix = "Complete", length = 50)
+
+    # verify majority of the contents are english-language, discard if not
+    ratios = english_ratios(dictionary, html_contents)
+    if not ratios_are_english(ratios):
+        # print(policy + " is not english")
+        return "", 0, ratios
+
+    if is_duplicate_policy(html_contents, policy, policy_dict):
+        # print("this is a duplicate policy")
+        return "", -2, ratios
+    return html_contents, None, ratios
+
 def verify(policy, ground_truth):
     """
     This function will verify that the HTML we scraped is actually a privacy
@@ -167,21 +192,19 @@ def verify(policy, ground_truth):
     In:     policy filename
     Out:    cosine similarity score of ground truth and policy document
     """
-    if policy == ".DS_Store":
-        return 0
-    
-    with open(policies_html_dir + policy, "r") as fp:
-        html_contents = fp.read()
-    html_contents = remove_company_names(strip_text(html_contents), policy[:-5]) + " "
-    
-    # verify majority of the contents are english-language, discard if not
-    if not is_english(dictionary, html_contents):
-        # print(policy + " is not english")
-        return 0
+    return verify_record(policy, ground_truth)[0]
 
-    if is_duplicate_policy(html_contents, policy, policy_dict):
-        # print("this is a duplicate policy")
-        return -2
+def verify_record(policy, ground_truth):
+    """
+    verify() plus the measurements kept in the score store.
+
+    In:     policy filename, ground truth string.
+    Out:    tuple of (score, english word ratio, letter ratio,
+            duplicate flag).
+    """
+    html_contents, status, ratios = prepare_policy(policy)
+    if status is not None:
+        return (status, ratios[0], ratios[1], status == -2)
     
     # Create the Document Term Matrix and pandas dataframe
     # https://www.machinelearningplus.com/nlp/cosine-similarity/
@@ -196,22 +219,55 @@ def verify(policy, ground_truth):
     # calculate cosine similarity of the ground truth and the policy
     # sim[0,1] is the value we actually care about
     sim = cosine_similarity(df, df)
-    
-    # Update progress bar
-    with index.get_lock():
-        index.value += 1
-        print_progress_bar(index.value, len(files), prefix = "Verification Progress:", suffix = "Complete", length = 50)
+    return (sim[0,1], ratios[0], ratios[1], False)
+
+def verify_file(policy):
+    """
+    Pool entry point for non-batch runs: verify_record against the
+    ground truth each worker attached to in start_process, so only the
+    filename travels with each task.
+    """
+    return verify_record(policy, ground_truth)
+
+def verify_batch(pool, scheduler, ground_truth, chunk_size):
+    """
+    Batch version of mapping verify_record over every file.  Workers
+    only do the per-document work (strip, english check, duplicate
+    check); the parent streams their texts through a BatchScorer as
+    they complete, so each chunk of documents is scored with one sparse
+    matrix product instead of one TF-IDF fit per document.
 
-    return sim[0,1]
+    In:     process pool, Scheduler, ground truth string, documents per
+            chunk.
+    Out:    list of verify_record tuples in the same order as files.
+    """
+    prepared = []
+    def texts():
+        sizes = file_sizes(policies_html_dir, files)
+        for i, (html_contents, status, ratios) in scheduler.imap(pool, prepare_policy, files, sizes):
+            prepared.append((i, status, ratios))
+            yield html_contents
+    scores = list(BatchScorer(ground_truth, chunk_size).iter_scores(texts()))
+    records = [None] * len(files)
+    for score, (i, status, ratios) in zip(scores, prepared):
+        records[i] = (score if status is None else status, ratios[0], ratios[1], status == -2)
+    return records
 
-def start_process(i):
+def start_process(i, handles, shared_policy_dict, cache):
     """
-    Set inter-process shared values to global so they can be accessed.
+    Set inter-process shared values to global so they can be accessed,
+    and attach to the read-only inputs broadcast by the parent, so the
+    workers don't depend on globals inherited through fork.
     Ignore SIGINT in child workers, will be handled to enable restart.
     """
     signal.signal(signal.SIGINT, signal.SIG_IGN)
-    global index
+    global index, ground_truth, policies_html_dir, dictionary, files, policy_dict, strip_cache
     index = i
+    artifacts = attach(handles)
+    policies_html_dir, dictionary, files = artifacts["settings"]
+    ground_truth = artifacts.get("ground_truth")
+    policy_dict = shared_policy_dict
+    strip_cache = cache
 
 if __name__ == '__main__':
     timestamp = "_{0:%Y%m%d-%H%M%S}".format(datetime.datetime.now())
@@ -229,7 +285,39 @@ if __name__ == '__main__':
                             default="./verification_output" + timestamp + "/",
                             required=False,
                             help="directory to dump verification output.  Will be created if does not exist.")
+    argparse.add_argument(  "-b", "--batch",
+                            action="store_true",
+                            help="score documents in chunks with one sparse matrix product per chunk instead of one TF-IDF fit per document.")
+    argparse.add_argument(  "-c", "--chunk_size",
+                            type=int,
+                            default=1000,
+                            required=False,
+                            help="number of documents per chunk in batch mode, bounds peak memory.")
+    argparse.add_argument(  "--strip_cache",
+                            default=None,
+                            required=False,
+                            help="sqlite file caching stripped text between runs.  Created if it does not exist.")
+    argparse.add_argument(  "--strip_cache_size",
+                            type=int,
+                            default=20000,
+                            required=False,
+                            help="maximum number of documents kept in the stripped text cache.")
+    argparse.add_argument(  "-s", "--score_store",
+                            default=None,
+                            required=False,
+                            help="npz file to save every file's score, english ratios and duplicate flag to, for python -m verification.sweep.")
+    argparse.add_argument(  "--chunksize",
+                            type=int,
+                            default=1,
+                            required=False,
+                            help="files handed to a worker at a time.  Files are dispatched largest first, so small chunks keep every worker busy until the end.")
+    argparse.add_argument(  "--start_method",
+                            default="fork",
+                            choices=["fork", "spawn", "forkserver"],
+                            required=False,
+                            help="multiprocessing start method for the worker pool.")
     args = argparse.parse_args()
+    set_start_method(args.start_method, force=True)    # before any shared Value or Lock is created
     cos_sim_threshold = args.cos_sim_threshold
     ground_truth_html_dir = args.ground_truth_html_dir
     dictionary = args.dictionary
@@ -237,6 +325,9 @@ if __name__ == '__main__':
     output_folder = args.output_folder
     mkdir_clean(output_folder)
 
+    if args.strip_cache:
+        set_strip_cache(args.strip_cache, args.strip_cache_size)
+
     # get ground truth in one string
     ground_truth = get_ground_truth(ground_truth_html_dir)
     files = [f for f in os.listdir(policies_html_dir) if os.path.isfile(os.path.join(policies_html_dir, f))]
@@ -244,16 +335,34 @@ if __name__ == '__main__':
     policy_dict = shared_manager.dict() # hashmap of all texts to quickly detect duplicates
     
     index = Value("i",0)          # shared val, index of current parsed file
-    pool_size = cpu_count() * 2
-    matplotlib.use("agg")   # don't know why this works, but allows matplotlib to execute in child procs
-    pool = Pool(
-        processes=pool_size,
-        initializer=start_process,
-        initargs=[index]
-    )
-    sim_list = pool.starmap(verify, [(file, ground_truth) for file in files])   # starmap keeps domain_list order
-    pool.close()  # no more tasks
-    pool.join()   # merge all child processes
+    # read-only inputs are published once, tasks only carry a filename
+    broadcast = Broadcast()
+    try:
+        broadcast.publish("settings", (policies_html_dir, dictionary, files))
+        if not args.batch:
+            broadcast.publish("ground_truth", ground_truth)     # batch mode scores in the parent
+        pool_size = cpu_count() * 2
+        matplotlib.use("agg")   # don't know why this works, but allows matplotlib to execute in child procs
+        pool = Pool(
+            processes=pool_size,
+            initializer=start_process,
+            initargs=[index, broadcast.handles(), policy_dict, strip_cache]
+        )
+        scheduler = Scheduler(args.chunksize)
+        if args.batch:
+            records = verify_batch(pool, scheduler, ground_truth, args.chunk_size)  # records keep files order
+        else:
+            records = scheduler.map(pool, verify_file, files, file_sizes(policies_html_dir, files))   # map keeps files order
+        sim_list = [score for score, word_ratio, letter_ratio, duplicate in records]
+        pool.close()  # no more tasks
+        pool.join()   # merge all child processes
+    finally:
+        broadcast.close()   # the shared memory blocks would outlive a failed run otherwise
+    print(scheduler.report())
+    if strip_cache is not None:
+        print("Stripped text cache: " + strip_cache.stats())
+    if args.score_store:
+        save_scores(args.score_store, files, *zip(*records))
 
     # Generate full similarity list & borderline similarity list
     print("Generating full similarity list & borderline similarity list...")